@@ -6,7 +6,7 @@ Handles PDF ingestion, vector operations, and medical chat queries
 import os
 import json
 import warnings
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
@@ -15,11 +15,8 @@ from dotenv import load_dotenv
 from cryptography.utils import CryptographyDeprecationWarning
 warnings.filterwarnings("ignore", category=CryptographyDeprecationWarning)
 
-from services.pdf_ingest import PDFProcessor
-from services.chunker import TextChunker
-from services.embeddings import EmbeddingService
-from services.vector_store import VectorStore
-from services.rag import RAGService
+from services.registry import registry
+from services.rag import RETRIEVAL_OPTIONS, parse_retrieval_options
 
 # Load environment variables
 load_dotenv()
@@ -35,68 +32,29 @@ MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# Initialize services
-pdf_processor = PDFProcessor()
-chunker = TextChunker()
-embedding_service = EmbeddingService()
-vector_store = VectorStore()
-rag_service = RAGService()
+# Services are owned by the registry: one shared, lazily built instance each
 
 def process_storage_pdfs():
     """Process all PDFs in the storage folder on startup"""
     try:
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-            return
-        
-        pdf_files = [f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith('.pdf')]
-        
-        if not pdf_files:
-            print("No PDFs found in storage folder")
-            return
-        
-        print(f"Found {len(pdf_files)} PDFs in storage folder. Processing...")
-
-        # Get already processed filenames from Pinecone
-        # Assuming a default namespace for now. In a multi-user system, this would be user-specific.
-        processed_filenames = vector_store.get_processed_filenames_in_namespace(namespace="default")
-        print(f"Already processed PDFs in Pinecone: {processed_filenames}")
-        
-        for filename in pdf_files:
-            if filename in processed_filenames:
-                print(f"Skipping {filename}: Already processed.")
-                continue
-            
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            try:
-                # Extract text
-                pdf_text = pdf_processor.extract_text(filepath)
-                if not pdf_text:
-                    print(f"Failed to extract text from {filename}")
-                    continue
-                
-                # Chunk the text
-                chunks = chunker.chunk_text(pdf_text, filename)
-                
-                # Generate embeddings
-                embeddings = embedding_service.generate_embeddings([chunk['text'] for chunk in chunks])
-                
-                # Store in vector database
-                vector_store.store_vectors(chunks, embeddings, filename)
-                
-                print(f"✅ Processed {filename} - {len(chunks)} chunks")
-                
-            except Exception as e:
-                print(f"❌ Error processing {filename}: {e}")
-                continue
-        
-        print("Storage PDF processing completed!")
-        
+        registry.ingestion_service.process_directory(UPLOAD_FOLDER)
     except Exception as e:
         print(f"Error processing storage PDFs: {e}")
 
-# Process existing PDFs on startup
-process_storage_pdfs()
+if __name__ == '__mp_main__':
+    # Re-imported as the main module of a spawned embedding worker
+    # (services/parallel_embed.py): skip model loading and startup ingestion
+    pass
+elif os.getenv('RAG_PRELOAD') == '1':
+    # Loaded by the gunicorn master (see gunicorn.conf.py): only load the model
+    # weights here so workers share them copy-on-write. Network clients, warmup
+    # and the one-time startup ingestion happen after fork.
+    registry.embedding_service
+else:
+    # Process existing PDFs on startup, then warm up the query path
+    process_storage_pdfs()
+    if os.getenv('WARMUP_ON_STARTUP', '1') != '0':
+        registry.warmup()
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -108,7 +66,8 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'message': 'RAG Medical Chatbot API is running'
+        'message': 'RAG Medical Chatbot API is running',
+        'services': registry.get_stats()
     })
 
 @app.route('/ingest', methods=['POST'])
@@ -130,29 +89,25 @@ def ingest_pdf():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         
-        # Process PDF
-        pdf_text = pdf_processor.extract_text(filepath)
-        if not pdf_text:
+        # Extract, chunk, embed and store
+        chunk_count = registry.ingestion_service.ingest_file(filepath, filename)
+        if chunk_count is None:
             return jsonify({'error': 'Failed to extract text from PDF'}), 400
         
-        # Chunk the text
-        chunks = chunker.chunk_text(pdf_text, filename)
-        
-        # Generate embeddings
-        embeddings = embedding_service.generate_embeddings([chunk['text'] for chunk in chunks])
-        
-        # Store in vector database
-        vector_store.store_vectors(chunks, embeddings, filename)
-        
         return jsonify({
             'message': f'Successfully processed {filename}',
-            'chunks_created': len(chunks),
+            'chunks_created': chunk_count,
             'filename': filename
         })
         
     except Exception as e:
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
+def format_sse(event: str, payload) -> str:
+    """Encode one server-sent event (JSON data keeps newlines in tokens on one line)"""
+    data = {'text': payload} if event == 'token' else payload
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """Handle chat queries with RAG"""
@@ -165,8 +120,24 @@ def chat():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
+        # Optional per-request retrieval overrides
+        try:
+            retrieval_options = parse_retrieval_options({key: data[key] for key in RETRIEVAL_OPTIONS if key in data})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if data.get('stream'):
+            # Server-sent events: 'token' events as the answer is generated,
+            # then one 'done' event with sources and metadata
+            events = registry.rag_service.query_stream(query, persona, namespace, retrieval_options)
+            return Response(
+                stream_with_context(format_sse(event, payload) for event, payload in events),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
         # Get response from RAG service
-        response = rag_service.query(query, persona, namespace)
+        response = registry.rag_service.query(query, persona, namespace, retrieval_options)
         
         return jsonify(response)
         
@@ -178,7 +149,7 @@ def clear_vectors():
     """Clear all vectors from the database"""
     try:
         namespace = request.json.get('namespace', 'default') if request.is_json else 'default'
-        vector_store.clear_namespace(namespace)
+        registry.ingestion_service.clear_namespace(namespace)
         return jsonify({'message': f'Cleared vectors in namespace: {namespace}'})
     except Exception as e:
         return jsonify({'error': f'Clear failed: {str(e)}'}), 500
@@ -192,6 +163,22 @@ def reprocess_storage():
     except Exception as e:
         return jsonify({'error': f'Reprocessing failed: {str(e)}'}), 500
 
+@app.route('/admin/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get embedding cache hit/miss/eviction counters"""
+    try:
+        return jsonify(registry.embedding_service.get_cache_stats())
+    except Exception as e:
+        return jsonify({'error': f'Failed to get cache stats: {str(e)}'}), 500
+
+@app.route('/admin/answer-cache-stats', methods=['GET'])
+def get_answer_cache_stats():
+    """Get answer cache hit/miss/eviction/invalidation counters"""
+    try:
+        return jsonify(registry.answer_cache.get_stats())
+    except Exception as e:
+        return jsonify({'error': f'Failed to get answer cache stats: {str(e)}'}), 500
+
 @app.route('/admin/storage-info', methods=['GET'])
 def get_storage_info():
     """Get information about PDFs in storage folder"""
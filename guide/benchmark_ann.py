@@ -0,0 +1,67 @@
+"""
+Benchmark the local IVF index against exact search
+Reports recall@k and per-query latency for several nprobe settings
+
+Usage: python guide/benchmark_ann.py [num_vectors] [num_queries]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.local_vector_store import LocalVectorStore
+
+DIMENSION = 384
+TOP_K = 10
+
+def clustered_vectors(n: int, rng, n_topics: int = 500) -> np.ndarray:
+    """Synthetic embeddings with topic structure (uniform noise makes ANN look worse than real data)"""
+    topics = rng.normal(size=(n_topics, DIMENSION)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + 0.6 * rng.normal(size=(n, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def build_store(index_type: str, vectors: np.ndarray) -> LocalVectorStore:
+    """Load vectors into an in-memory local store"""
+    store = LocalVectorStore(index_dir='', dimension=DIMENSION, index_type=index_type)
+    chunks = [{'id': f"doc_{i}", 'text': '', 'filename': 'bench.pdf', 'chunk_id': i, 'token_count': 0}
+              for i in range(len(vectors))]
+    start = time.perf_counter()
+    store.store_vectors(chunks, vectors, 'bench')
+    print(f"  built {index_type} index in {time.perf_counter() - start:.1f}s")
+    return store
+
+def run_queries(store: LocalVectorStore, queries: np.ndarray):
+    """Return result chunk-ID lists and mean latency in ms"""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([match['chunk_id'] for match in store.search_similar(query, TOP_K, 'bench')])
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(n, rng)
+    queries = clustered_vectors(n_queries, rng)
+    print(f"📊 {n} vectors x {DIMENSION} dims, {n_queries} queries, recall@{TOP_K}")
+
+    flat = build_store('flat', vectors)
+    exact, exact_ms = run_queries(flat, queries)
+    print(f"  exact:        {exact_ms:7.3f} ms/query")
+
+    ivf = build_store('ivf', vectors)
+    index = ivf.namespaces['bench'].index
+    print(f"  nlist={len(index.centroids)}")
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        index.nprobe = nprobe
+        approx, approx_ms = run_queries(ivf, queries)
+        recall = np.mean([len(set(a) & set(e)) / TOP_K for a, e in zip(approx, exact)])
+        print(f"  ivf nprobe={nprobe:<3} {approx_ms:7.3f} ms/query  recall@{TOP_K}={recall:.3f}")
+
+if __name__ == "__main__":
+    main()
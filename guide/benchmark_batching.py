@@ -0,0 +1,59 @@
+"""
+Benchmark ingestion embedding throughput: arrival-order vs length-bucketed batches
+Runs on the bundled storage/Disease_Awareness_Guide.pdf by default
+
+Usage: python guide/benchmark_batching.py [path/to/file.pdf]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Measure the model, not the embedding cache
+os.environ['EMBEDDING_CACHE_SIZE'] = '0'
+
+from services.pdf_ingest import PDFProcessor
+from services.chunker import TextChunker
+from services.embeddings import EmbeddingService
+
+DEFAULT_PDF = os.path.join('storage', 'Disease_Awareness_Guide.pdf')
+
+def arrival_order_encode(service: EmbeddingService, texts, batch_size: int = 32):
+    """Previous behaviour: fixed-size slices in arrival order"""
+    for i in range(0, len(texts), batch_size):
+        service.model.encode(texts[i:i + batch_size], batch_size=batch_size, convert_to_tensor=False)
+
+def timed(label: str, fn, n_chunks: int, repeats: int = 3) -> float:
+    """Run fn several times and print the best chunks/sec"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    rate = n_chunks / best
+    print(f"  {label:<28} {best:7.2f} s  {rate:8.1f} chunks/sec")
+    return rate
+
+def main():
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PDF
+    text = PDFProcessor().extract_text(pdf_path)
+    if not text:
+        print(f"❌ Could not extract text from {pdf_path}")
+        return
+
+    chunks = TextChunker().chunk_text(text, os.path.basename(pdf_path))
+    texts = [chunk['text'] for chunk in chunks]
+    service = EmbeddingService()
+    lengths = service.count_tokens(texts)
+    print(f"📄 {pdf_path}: {len(texts)} chunks, model tokens min/avg/max "
+          f"{min(lengths)}/{sum(lengths) // len(lengths)}/{max(lengths)}")
+
+    service.model.encode(texts[:8], convert_to_tensor=False)  # warmup
+    before = timed("arrival order (batch 32)", lambda: arrival_order_encode(service, texts), len(texts))
+    after = timed("length-bucketed", lambda: service.batch_encode(texts), len(texts))
+    print(f"\n⚡ Speedup: {after / before:.2f}x")
+
+if __name__ == "__main__":
+    main()
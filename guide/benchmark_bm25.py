@@ -0,0 +1,54 @@
+"""
+Benchmark the in-memory BM25 index
+Builds an index over synthetic chunks with a Zipf-distributed vocabulary and
+reports build time, memory of the postings and per-query latency
+
+Usage: python guide/benchmark_bm25.py [num_chunks] [num_queries]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.bm25_index import BM25Index
+
+VOCABULARY = 50000
+WORDS_PER_CHUNK = 300
+
+def synthetic_texts(n: int, rng):
+    """Chunks of Zipf-distributed word IDs (rank 1 is the most common word)"""
+    words = np.minimum(rng.zipf(1.2, size=(n, WORDS_PER_CHUNK)), VOCABULARY)
+    for row in words:
+        yield ' '.join(f"w{word}" for word in row.tolist())
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(42)
+    print(f"📊 {n} chunks x {WORDS_PER_CHUNK} words, vocabulary {VOCABULARY}")
+
+    index = BM25Index()
+    start = time.perf_counter()
+    batch = 10000
+    texts = synthetic_texts(n, rng)
+    for offset in range(0, n, batch):
+        index.add((f"doc_{offset + i}", next(texts)) for i in range(min(batch, n - offset)))
+    postings_bytes = sum(p.docs.nbytes + p.tfs.nbytes for p in index.postings.values())
+    print(f"  built in {time.perf_counter() - start:.1f}s, {len(index.postings)} terms, "
+          f"postings {postings_bytes / 1e6:.0f} MB")
+
+    # Queries mix rare (drug-name-like) and mid-frequency terms
+    queries = [' '.join(f"w{word}" for word in rng.integers(20, 5000, 4).tolist()) for _ in range(n_queries)]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, 20)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"  p50 {np.percentile(latencies, 50):.2f} ms  p95 {np.percentile(latencies, 95):.2f} ms per query")
+
+if __name__ == "__main__":
+    main()
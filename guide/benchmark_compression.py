@@ -0,0 +1,77 @@
+"""
+Benchmark compressed local vector storage against uncompressed exact search
+Reports recall@k, per-query latency and resident bytes per vector for int8
+and product-quantized codes (with full-precision re-ranking)
+
+Usage: python guide/benchmark_compression.py [num_vectors] [num_queries]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.local_vector_store import LocalVectorStore
+
+DIMENSION = 384
+TOP_K = 10
+# IVF runs are also bounded by nprobe (see benchmark_ann.py)
+RECALL_TOLERANCE = 0.9
+
+def clustered_vectors(n: int, rng, n_topics: int = 500) -> np.ndarray:
+    """Synthetic embeddings with topic structure"""
+    topics = rng.normal(size=(n_topics, DIMENSION)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + 0.6 * rng.normal(size=(n, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def build_store(index_dir: str, index_type: str, compression: str, vectors: np.ndarray) -> LocalVectorStore:
+    """Load vectors into a local store"""
+    store = LocalVectorStore(index_dir=index_dir, dimension=DIMENSION,
+                             index_type=index_type, compression=compression)
+    chunks = [{'id': f"doc_{i}", 'text': '', 'filename': 'bench.pdf', 'chunk_id': i, 'token_count': 0}
+              for i in range(len(vectors))]
+    start = time.perf_counter()
+    store.store_vectors(chunks, vectors, 'bench')
+    print(f"  built {index_type}/{compression} in {time.perf_counter() - start:.1f}s")
+    return store
+
+def run_queries(store: LocalVectorStore, queries: np.ndarray):
+    """Return result chunk-ID lists and mean latency in ms"""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([match['chunk_id'] for match in store.search_similar(query, TOP_K, 'bench')])
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(n, rng)
+    queries = clustered_vectors(n_queries, rng)
+    print(f"📊 {n} vectors x {DIMENSION} dims, {n_queries} queries, recall@{TOP_K}")
+
+    flat = build_store('', 'flat', 'none', vectors)
+    exact, exact_ms = run_queries(flat, queries)
+    baseline_bytes = flat.get_index_stats()['namespaces']['bench']['resident_bytes']
+    print(f"  {'flat/none':<10} {exact_ms:7.3f} ms/query  {baseline_bytes / n:6.0f} B/vector")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        for index_type in ('flat', 'ivf'):
+            for compression in ('int8', 'pq'):
+                store_dir = os.path.join(index_dir, f"{index_type}_{compression}")
+                store = build_store(store_dir, index_type, compression, vectors)
+                approx, approx_ms = run_queries(store, queries)
+                recall = np.mean([len(set(a) & set(e)) / TOP_K for a, e in zip(approx, exact)])
+                resident = store.get_index_stats()['namespaces']['bench']['resident_bytes']
+                status = "✅" if recall >= RECALL_TOLERANCE else "⚠️"
+                print(f"  {index_type + '/' + compression:<10} {approx_ms:7.3f} ms/query  "
+                      f"{resident / n:6.0f} B/vector ({baseline_bytes / resident:4.1f}x smaller)  "
+                      f"recall@{TOP_K}={recall:.3f} {status}")
+
+if __name__ == "__main__":
+    main()
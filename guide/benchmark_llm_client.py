@@ -0,0 +1,70 @@
+"""
+Benchmark the pooled OpenRouter client against the offline fake server
+Compares a fresh requests.post per call with the shared keep-alive client,
+from several threads at once, and reports latency, connections opened and
+retries (with an optional rate of 429/503 errors)
+
+Usage: python guide/benchmark_llm_client.py [calls] [threads] [latency_ms] [error_rate]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guide.fake_openrouter import serve
+
+PORT = 5092
+
+def run(label: str, call, calls: int, threads: int, server) -> None:
+    connections_before = server.fake.connections
+    requests_before = server.fake.requests
+    failures = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for ok in executor.map(lambda _: call(), range(calls)):
+            failures += not ok
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<14} {elapsed / calls * 1000 * threads:8.1f} ms/call  "
+          f"{server.fake.connections - connections_before:4d} connections  "
+          f"{server.fake.requests - requests_before:4d} requests  {failures} failed")
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+    error_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+
+    server = serve(PORT, latency_ms, error_rate)
+    base_url = f"http://127.0.0.1:{PORT}"
+    from services.llm_client import LLMError, OpenRouterClient
+
+    client = OpenRouterClient(api_key='fake', base_url=base_url, pool_size=threads)
+    payload = client.build_payload("You are a test.", "What is the dose?")
+    print(f"📊 {calls} calls on {threads} threads, {latency_ms} ms/request, {error_rate:.0%} 429/503s")
+
+    def fresh():
+        response = requests.post(client.url, json=payload, timeout=30,
+                                 headers={"Authorization": "Bearer fake"})
+        return response.status_code == 200
+
+    def pooled():
+        try:
+            client.complete("You are a test.", "What is the dose?")
+            return True
+        except LLMError:
+            return False
+
+    run("requests.post", fresh, calls, threads, server)
+    run("pooled client", pooled, calls, threads, server)
+    print(f"  client stats: {client.get_stats()}")
+
+    client.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
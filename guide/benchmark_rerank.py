@@ -0,0 +1,73 @@
+"""
+Benchmark cross-encoder re-ranking on an ingested namespace
+Known-item evaluation: a sentence taken from a random chunk is the query and
+that chunk is the answer. Reports hit rate@k, MRR and added latency with and
+without re-ranking (no latency budget, so every query is fully re-ranked)
+
+Usage: python guide/benchmark_rerank.py [namespace] [num_queries]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from services.registry import registry
+from services.rag import RAGService
+
+def known_item_queries(namespace: str, n: int, rng: random.Random):
+    """(query, chunk ID) pairs from sentences of 8-30 words"""
+    pairs = []
+    for vector_id, text in registry.vector_store.iter_texts(namespace):
+        sentences = [s for s in re.split(r'(?<=[.!?])\s+', text) if 8 <= len(s.split()) <= 30]
+        if sentences:
+            pairs.append((rng.choice(sentences), vector_id))
+    rng.shuffle(pairs)
+    return pairs[:n]
+
+def evaluate(service: RAGService, pairs, top_k: int):
+    """Hit rate@k, MRR@k and p50/p95 retrieval latency in ms"""
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for query, answer_id in pairs:
+        embedding = registry.embedding_service.generate_embedding(query)
+        start = time.perf_counter()
+        results = service._retrieve(query, embedding, namespace=service.namespace)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids = [chunk['id'] for chunk in results[:top_k]]
+        if answer_id in ids:
+            hits += 1
+            reciprocal_ranks.append(1.0 / (ids.index(answer_id) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+    return hits / len(pairs), float(np.mean(reciprocal_ranks)), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+def main():
+    load_dotenv()
+    namespace = sys.argv[1] if len(sys.argv) > 1 else 'default'
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    pairs = known_item_queries(namespace, n_queries, random.Random(42))
+    if not pairs:
+        print(f"No chunks in namespace '{namespace}': ingest some PDFs first")
+        return
+
+    baseline = RAGService(registry.embedding_service, registry.vector_store, registry.lexical_index)
+    reranked = RAGService(registry.embedding_service, registry.vector_store, registry.lexical_index,
+                          reranker=registry.reranker)
+    registry.reranker.warmup()
+    print(f"📊 {len(pairs)} known-item queries, {reranked.rerank_candidates} candidates, "
+          f"model {registry.reranker.model_name}")
+    for name, service in (('retrieval only', baseline), ('re-ranked', reranked)):
+        service.namespace = namespace
+        hit_rate, mrr, p50, p95 = evaluate(service, pairs, service.top_k)
+        print(f"  {name:<15} hit@{service.top_k}={hit_rate:.3f}  MRR={mrr:.3f}  "
+              f"p50 {p50:.1f} ms  p95 {p95:.1f} ms")
+
+if __name__ == "__main__":
+    main()
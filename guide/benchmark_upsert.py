@@ -0,0 +1,58 @@
+"""
+Benchmark Pinecone upsert throughput against the offline fake server
+Compares vectors/sec for several PINECONE_UPSERT_CONCURRENCY settings,
+with uneven chunk texts and an optional rate of retried 429 errors
+
+Usage: python guide/benchmark_upsert.py [num_vectors] [latency_ms] [error_rate]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guide.fake_pinecone import serve
+
+DIMENSION = 384
+PORT = 5091
+
+def make_chunks(n: int, rng):
+    """Chunks whose text length varies like real PDF chunks (a few hundred to a few thousand chars)"""
+    lengths = rng.integers(200, 3000, n)
+    return [{'id': f"bench.pdf_{i}", 'text': 'x' * int(length), 'filename': 'bench.pdf',
+             'chunk_id': i, 'token_count': int(length) // 4} for i, length in enumerate(lengths)]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    server = serve(PORT, latency_ms, error_rate)
+    os.environ['PINECONE_HOST'] = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault('PINECONE_API_KEY', 'fake')
+    os.environ.setdefault('CHUNK_TEXT_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'chunk_texts.sqlite3'))
+    from services.vector_store import PineconeVectorStore
+
+    rng = np.random.default_rng(42)
+    chunks = make_chunks(n, rng)
+    embeddings = rng.normal(size=(n, DIMENSION)).astype(np.float32)
+    print(f"📊 {n} vectors, {latency_ms} ms/request, {error_rate:.0%} 429s")
+
+    store = PineconeVectorStore()
+    for concurrency in (1, 2, 4, 8, 16):
+        os.environ['PINECONE_UPSERT_CONCURRENCY'] = str(concurrency)
+        requests_before = server.fake.requests
+        start = time.perf_counter()
+        ok = store.store_vectors(chunks, embeddings, f"bench-{concurrency}")
+        elapsed = time.perf_counter() - start
+        print(f"  concurrency={concurrency:<3} {n / elapsed:9.0f} vectors/s  "
+              f"{server.fake.requests - requests_before} requests  {'ok' if ok else 'FAILED'}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
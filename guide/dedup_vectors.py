@@ -0,0 +1,30 @@
+"""
+Remove duplicate-text vectors from a namespace
+One-shot cleanup for namespaces filled while every re-ingest of a file added
+a new copy of its vectors under random IDs
+
+Usage: python guide/dedup_vectors.py [namespace] [--dry-run]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from services.registry import registry
+
+def main():
+    load_dotenv()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    namespace = args[0] if args else 'default'
+    dry_run = '--dry-run' in sys.argv
+
+    before = registry.vector_store.get_vector_count(namespace)
+    removed = registry.ingestion_service.deduplicate_namespace(namespace, dry_run=dry_run)
+    action = "Would remove" if dry_run else "Removed"
+    print(f"🧹 {action} {removed} of {before} vectors in namespace '{namespace}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Fake OpenRouter server for offline LLM client tests
+Implements /chat/completions with a fixed per-request latency (the time to the
+first token when streaming), a per-token delay for "stream": true requests and
+an optional rate of 429/503 errors, speaks HTTP/1.1 keep-alive, and counts the
+TCP connections clients open
+
+Usage: python guide/fake_openrouter.py [port] [latency_ms] [error_rate] [token_ms]
+Then run the backend with OPENROUTER_BASE_URL=http://localhost:<port>
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeOpenRouter:
+    """Canned chat completions with configurable latency and failures"""
+
+    def __init__(self, latency_ms: float = 200.0, error_rate: float = 0.0, token_ms: float = 20.0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.token_ms = token_ms
+        self.requests = 0
+        self.rejected = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def answer(self, body: dict) -> str:
+        """Deterministic answer text echoing the question"""
+        question = body.get('messages', [{}])[-1].get('content', '')
+        return f"Stand-in answer ({len(question)} prompt chars) [1]."
+
+    def stream_events(self, body: dict):
+        """Server-sent event lines of a streamed answer, one word per event, paced by token_ms"""
+        yield b": OPENROUTER PROCESSING\n\n"
+        words = self.answer(body).split(' ')
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_ms / 1000)
+            delta = {'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}}]}
+            yield f"data: {json.dumps(delta)}\n\n".encode('utf-8')
+        yield b"data: [DONE]\n\n"
+
+    def handle(self, path: str, body: dict):
+        """Return (status, response body) for a request"""
+        time.sleep(self.latency_ms / 1000)
+        with self.lock:
+            self.requests += 1
+            if random.random() < self.error_rate:
+                self.rejected += 1
+                return random.choice([429, 503]), {'error': {'message': 'Overloaded'}}
+        if path.rstrip('/').endswith('/chat/completions'):
+            return 200, {
+                'id': f"fake-{self.requests}",
+                'model': body.get('model', 'fake'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': self.answer(body)}}]
+            }
+        return 404, {'error': {'message': f'Unknown path {path}'}}
+
+def serve(port: int = 5082, latency_ms: float = 200.0, error_rate: float = 0.0,
+          token_ms: float = 20.0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread"""
+    fake = FakeOpenRouter(latency_ms, error_rate, token_ms)
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keeps connections open between requests
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            # Headers and body are separate writes; without this, Nagle plus
+            # delayed ACKs stall every reused connection by ~40 ms
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with fake.lock:
+                fake.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            status, response = fake.handle(self.path, body)
+            if status == 200 and body.get('stream'):
+                # Chunked transfer encoding, one chunk per event, as the real API sends
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for event in fake.stream_events(body):
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+                return
+            payload = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            if status == 429:
+                self.send_header('Retry-After', '0.1')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5082
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    token_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 20.0
+    server = serve(port, latency_ms, error_rate, token_ms)
+    print(f"🧪 Fake OpenRouter on http://localhost:{port} ({latency_ms} ms/request, "
+          f"{token_ms} ms/streamed token, {error_rate:.0%} 429/503s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Fake Pinecone data-plane server for offline upsert benchmarks
+Implements /vectors/upsert, /vectors/delete and /describe_index_stats in
+memory, with a fixed per-request latency and an optional rate of 429 errors
+
+Usage: python guide/fake_pinecone.py [port] [latency_ms] [error_rate]
+Then run the backend with PINECONE_HOST=http://localhost:<port>
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakePinecone:
+    """In-memory vector counts per namespace behind a Pinecone-like HTTP API"""
+
+    def __init__(self, latency_ms: float = 20.0, error_rate: float = 0.0, dimension: int = 384):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.dimension = dimension
+        self.namespaces = {}
+        self.requests = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def handle(self, path: str, body: dict):
+        """Return (status, response body) for a request"""
+        time.sleep(self.latency_ms / 1000)
+        with self.lock:
+            self.requests += 1
+            if random.random() < self.error_rate:
+                self.rejected += 1
+                return 429, {'code': 8, 'message': 'Too many requests'}
+            if path == '/vectors/upsert':
+                ids = self.namespaces.setdefault(body.get('namespace', ''), set())
+                ids.update(vector['id'] for vector in body['vectors'])
+                return 200, {'upsertedCount': len(body['vectors'])}
+            if path == '/vectors/delete':
+                namespace = body.get('namespace', '')
+                if body.get('deleteAll'):
+                    self.namespaces.pop(namespace, None)
+                else:
+                    self.namespaces.get(namespace, set()).difference_update(body.get('ids', []))
+                return 200, {}
+            if path == '/describe_index_stats':
+                namespaces = {name: {'vectorCount': len(ids)} for name, ids in self.namespaces.items()}
+                return 200, {'namespaces': namespaces, 'dimension': self.dimension, 'indexFullness': 0.0,
+                             'totalVectorCount': sum(len(ids) for ids in self.namespaces.values())}
+        return 404, {'message': f'Unknown path {path}'}
+
+def serve(port: int = 5081, latency_ms: float = 20.0, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread"""
+    fake = FakePinecone(latency_ms, error_rate)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            status, response = fake.handle(self.path, body)
+            payload = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5081
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server = serve(port, latency_ms, error_rate)
+    print(f"🧪 Fake Pinecone on http://localhost:{port} ({latency_ms} ms/request, {error_rate:.0%} 429s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
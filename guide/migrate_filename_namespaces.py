@@ -0,0 +1,57 @@
+"""
+Move PDFs out of per-filename namespaces
+Before the ingestion manifest, startup and /ingest stored each PDF in a
+namespace named after the file, which /chat (namespace 'default') never
+searched. This ingests every PDF in the storage folder into the target
+namespace, then clears the old namespace of each file it found there. Old
+namespaces whose PDF is no longer in storage are listed and kept; clear them
+with POST /admin/clear if they are not needed.
+
+Usage: python guide/migrate_filename_namespaces.py [namespace] [--dry-run]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from services.registry import registry
+
+def main():
+    load_dotenv()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    target = args[0] if args else 'default'
+    dry_run = '--dry-run' in sys.argv
+    folder = os.getenv('PDF_STORAGE_DIR', 'storage/pdfs')
+
+    namespaces = registry.vector_store.get_index_stats().get('namespaces', {})
+    legacy = sorted(name for name in namespaces if name != target and name.lower().endswith('.pdf'))
+    if not legacy:
+        print("✅ No per-filename namespaces found")
+        return
+
+    stored = set(os.listdir(folder)) if os.path.isdir(folder) else set()
+    movable = [name for name in legacy if name in stored]
+    orphaned = [name for name in legacy if name not in stored]
+
+    if dry_run:
+        for name in movable:
+            print(f"Would re-ingest {name} into '{target}' and clear namespace '{name}' "
+                  f"({namespaces[name]['vector_count']} vectors)")
+    else:
+        # Skips files already in the target namespace
+        registry.ingestion_service.process_directory(folder, target)
+        for name in movable:
+            if registry.ingestion_service.needs_ingest(os.path.join(folder, name), name, target):
+                print(f"❌ {name} is not in '{target}' yet; keeping namespace '{name}'")
+                continue
+            registry.ingestion_service.clear_namespace(name)
+            print(f"🧹 Cleared namespace '{name}' ({namespaces[name]['vector_count']} vectors)")
+
+    for name in orphaned:
+        print(f"⚠️  Kept namespace '{name}': {name} is not in {folder}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Export the embedding model to ONNX and compare it with the PyTorch backend
+Checks vector parity and reports p50 query-embedding latency for both
+
+Usage: python guide/onnx_parity.py [--fp32]
+"""
+
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.onnx_encoder import OnnxSentenceEncoder, check_parity
+
+SAMPLE_TEXTS = [
+    "What are the symptoms of diabetes and how is it managed?",
+    "How can I prevent heart disease through lifestyle changes?",
+    "What are the treatment options for high blood pressure?",
+    "How do I recognize the signs of a stroke?",
+    "Malaria is transmitted through the bite of infected Anopheles mosquitoes.",
+    "Tuberculosis spreads through the air when people with active TB cough or sneeze.",
+    "Vaccination remains the most effective way to prevent measles outbreaks.",
+    "Hand washing with soap reduces the risk of diarrhoeal disease."
+]
+
+def p50_latency(encode, runs: int = 50) -> float:
+    """Median single-query latency in milliseconds"""
+    encode(SAMPLE_TEXTS[0])  # warmup
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        encode(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    model_name = os.getenv('HF_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    onnx_dir = os.getenv('EMBEDDING_ONNX_DIR', 'storage/onnx')
+    quantize = '--fp32' not in sys.argv
+
+    print(f"🔍 Parity check for {model_name} (int8={quantize})...")
+    parity = check_parity(model_name, SAMPLE_TEXTS, onnx_dir=onnx_dir, quantize=quantize)
+    for key, value in parity.items():
+        print(f"  {key}: {value}")
+    if parity['min_cosine'] < 0.98:
+        print("  ❌ ONNX vectors diverge from PyTorch (min cosine < 0.98)")
+    else:
+        print("  ✅ ONNX vectors match PyTorch")
+
+    print("\n⏱️ Query-embedding latency (p50)...")
+    from sentence_transformers import SentenceTransformer
+    torch_model = SentenceTransformer(model_name, device='cpu')
+    onnx_model = OnnxSentenceEncoder(model_name, onnx_dir=onnx_dir, quantize=quantize)
+    print(f"  PyTorch: {p50_latency(torch_model.encode):.2f} ms")
+    print(f"  ONNX:    {p50_latency(onnx_model.encode):.2f} ms")
+
+if __name__ == "__main__":
+    main()
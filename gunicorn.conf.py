@@ -0,0 +1,57 @@
+"""
+Gunicorn configuration for the RAG backend
+Preloads the embedding model in the master so workers share its weights
+copy-on-write; Pinecone clients are created post-fork and startup ingestion
+runs once, in the first worker
+"""
+
+import os
+import gc
+import threading
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+if preload_app:
+    # Read by app.py at import time, which happens before any hook below runs
+    os.environ['RAG_PRELOAD'] = '1'
+
+
+def when_ready(server):
+    """Freeze preloaded objects so the GC does not dirty shared pages in workers"""
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """Give each worker its own clients, warm it up and run startup ingestion once"""
+    if not preload_app:
+        return
+
+    from services.registry import registry
+
+    registry.reset_clients()
+    torch_threads = int(os.getenv('EMBEDDING_TORCH_THREADS', 0))
+    if torch_threads:
+        registry.embedding_service.set_num_threads(torch_threads)
+
+    # Worker ages start at 1 and only grow, so respawned workers never re-ingest
+    run_ingestion = worker.age == 1 and os.getenv('STARTUP_INGEST', '1') != '0'
+    threading.Thread(
+        target=_worker_startup, args=(run_ingestion,),
+        name="worker-startup", daemon=True
+    ).start()
+
+
+def _worker_startup(run_ingestion: bool):
+    """Background startup so the worker can answer health checks meanwhile"""
+    from app import process_storage_pdfs
+    from services.registry import registry
+
+    if run_ingestion:
+        process_storage_pdfs()
+    if os.getenv('WARMUP_ON_STARTUP', '1') != '0':
+        registry.warmup()
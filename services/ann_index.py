@@ -0,0 +1,208 @@
+"""
+Approximate nearest neighbour index
+Inverted-file (IVF) index with a spherical k-means coarse quantizer for the
+local vector store: queries only score the vectors in the nprobe closest
+clusters instead of the whole namespace
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 15,
+                     seed: int = 0, block_size: int = 8192) -> np.ndarray:
+    """
+    Cluster L2-normalized vectors by cosine similarity
+
+    Args:
+        vectors: (n, dim) normalized float32 training vectors
+        k: Number of clusters
+        iterations: Lloyd iterations
+        seed: Random seed for initialization
+        block_size: Rows assigned per matrix product (bounds memory)
+
+    Returns:
+        (k, dim) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = assign_clusters(vectors, centroids, block_size)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=k)
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+
+        sums = np.zeros_like(centroids)
+        sums[non_empty] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+    return centroids
+
+
+def assign_clusters(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each vector"""
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        assign[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+    return assign
+
+
+class IVFIndex:
+    """Inverted-file ANN index over the rows of a namespace's vector matrix"""
+
+    def __init__(self, dimension: int, nlist: int = 0, nprobe: int = 16,
+                 min_train_size: int = 10000, max_train_sample: int = 65536):
+        """
+        Initialize IVF index
+
+        Args:
+            dimension: Embedding dimension
+            nlist: Number of clusters (0 picks ~4 * sqrt(n) at training time)
+            nprobe: Clusters scanned per query (higher = better recall, slower)
+            min_train_size: Namespace size at which the index is trained
+            max_train_sample: Maximum number of vectors used for k-means
+        """
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.max_train_sample = max_train_sample
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self.lists: List[List[int]] = []
+        self.row_list: Dict[int, int] = {}
+        self._list_arrays: Dict[int, np.ndarray] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def needs_training(self, size: int) -> bool:
+        """Train once the namespace is big enough, retrain after it grew 4x"""
+        if not self.is_trained:
+            return size >= self.min_train_size
+        return size >= 4 * self.trained_size
+
+    def train(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> None:
+        """
+        (Re)build the index over all rows
+
+        Args:
+            vectors: (n, dim) normalized vectors; row i is indexed as i
+            centroids: Previously trained centroids to reuse instead of running k-means
+        """
+        if centroids is None:
+            nlist = self.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+            sample = vectors
+            if len(vectors) > self.max_train_sample:
+                rng = np.random.default_rng(0)
+                sample = vectors[np.sort(rng.choice(len(vectors), self.max_train_sample, replace=False))]
+            centroids = spherical_kmeans(np.ascontiguousarray(sample, dtype=np.float32), nlist)
+
+        self.restore(centroids, len(vectors))
+        self.add(np.arange(len(vectors)), vectors)
+
+    def restore(self, centroids: np.ndarray, trained_size: int) -> None:
+        """Install trained centroids with empty lists (rows are added separately)"""
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = trained_size
+        self.lists = [[] for _ in range(len(self.centroids))]
+        self.row_list = {}
+        self._list_arrays = {}
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Assign rows to their nearest cluster (re-assigning rows already present)"""
+        if not self.is_trained or len(rows) == 0:
+            return
+        self.add_assigned(rows, assign_clusters(vectors, self.centroids))
+
+    def add_assigned(self, rows: np.ndarray, clusters: np.ndarray) -> None:
+        """Add rows whose clusters are already known (e.g. saved assignments)"""
+        self.remove(rows)
+        for row, cluster in zip(np.asarray(rows).tolist(), np.asarray(clusters).tolist()):
+            self.lists[cluster].append(row)
+            self.row_list[row] = cluster
+            self._list_arrays.pop(cluster, None)
+
+    def clusters_of(self, rows: np.ndarray) -> np.ndarray:
+        """Cluster of each row (-1 for rows not in the index)"""
+        return np.fromiter((self.row_list.get(row, -1) for row in np.asarray(rows).tolist()),
+                           dtype=np.int32, count=len(rows))
+
+    def remove(self, rows) -> None:
+        """Drop rows from the index"""
+        for row in np.asarray(rows).tolist():
+            cluster = self.row_list.pop(row, None)
+            if cluster is not None:
+                self.lists[cluster].remove(row)
+                self._list_arrays.pop(cluster, None)
+
+    def remap(self, old_to_new: np.ndarray) -> None:
+        """Renumber rows after compaction (rows mapped to -1 are dropped)"""
+        self.lists = [[int(old_to_new[row]) for row in members if old_to_new[row] >= 0]
+                      for members in self.lists]
+        self.row_list = {row: cluster for cluster, members in enumerate(self.lists) for row in members}
+        self._list_arrays = {}
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Rows in the nprobe clusters closest to the query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        if nprobe < len(centroid_scores):
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(centroid_scores))
+
+        arrays = []
+        for cluster in probe.tolist():
+            array = self._list_arrays.get(cluster)
+            if array is None:
+                array = np.fromiter(self.lists[cluster], dtype=np.int64, count=len(self.lists[cluster]))
+                self._list_arrays[cluster] = array
+            arrays.append(array)
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+
+    def search(self, query: np.ndarray, vectors: np.ndarray, top_k: int,
+               mask: Optional[np.ndarray] = None,
+               nprobe: Optional[int] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Approximate top-k search
+
+        Args:
+            query: Normalized query vector
+            vectors: The namespace's vector matrix
+            top_k: Number of results
+            mask: Optional boolean row mask from a metadata filter
+            nprobe: Override the configured number of probed clusters
+
+        Returns:
+            (rows, scores) best first, or None if the caller should search exactly
+            (index untrained, or too few filtered candidates)
+        """
+        if not self.is_trained:
+            return None
+
+        rows = self.candidates(query, nprobe)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if len(rows) < top_k:
+            return None
+
+        scores = vectors[rows] @ query
+        if top_k < len(scores):
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return rows[best], scores[best]
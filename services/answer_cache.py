@@ -0,0 +1,225 @@
+"""
+Semantic answer cache
+Reuses LLM answers for rephrasings of a question already answered: a stored
+answer is returned when a new query's embedding is close enough to the cached
+query's and retrieval produced the same chunks
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class _Entry:
+    __slots__ = ('key', 'embedding', 'chunk_ids', 'response', 'expires')
+
+    def __init__(self, key: Tuple[str, str], embedding: np.ndarray, chunk_ids: Tuple[str, ...],
+                 response: Dict[str, Any], expires: float):
+        self.key = key
+        self.embedding = embedding
+        self.chunk_ids = chunk_ids
+        self.response = response
+        self.expires = expires
+
+
+class SemanticAnswerCache:
+    """LRU cache of answers keyed by (namespace, persona), matched by query similarity"""
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None,
+                 similarity_threshold: float = None,
+                 version_source: Optional[Callable[[str], int]] = None):
+        """
+        Initialize answer cache
+
+        Args:
+            max_entries: Maximum cached answers across namespaces (defaults to
+                ANSWER_CACHE_SIZE; 0 disables the cache)
+            ttl_seconds: Lifetime of an answer (defaults to ANSWER_CACHE_TTL_SECONDS)
+            similarity_threshold: Cosine similarity a query needs to reuse a
+                cached query's answer (defaults to ANSWER_CACHE_SIMILARITY)
+            version_source: Returns a namespace's content version shared by all
+                processes (IngestionManifest.namespace_version); a namespace's
+                answers are dropped once its version changes, so ingestion in
+                another worker invalidates this one's answers too
+        """
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('ANSWER_CACHE_SIZE', 1000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600))
+        self.similarity_threshold = similarity_threshold or float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
+        # Entry number -> entry, least recently used first
+        self._entries: 'OrderedDict[int, _Entry]' = OrderedDict()
+        # (namespace, persona) -> entry numbers and their stacked embeddings (built on lookup)
+        self._buckets: Dict[Tuple[str, str], List[int]] = {}
+        self._matrices: Dict[Tuple[str, str], np.ndarray] = {}
+        self._next_number = 0
+        self.version_source = version_source
+        # Namespace -> content version its cached answers were computed under
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0,
+                       'stale_puts': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _unit(embedding: Union[np.ndarray, List[float]]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, namespace: str, persona: str, query_embedding: Union[np.ndarray, List[float]],
+            chunk_ids: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """
+        Look up an answer for a query
+
+        Args:
+            namespace: Vector store namespace
+            persona: AI persona
+            query_embedding: Embedding of the new query
+            chunk_ids: IDs of the chunks retrieved for it, in order
+
+        Returns:
+            Copy of the cached response, or None
+        """
+        if not self.enabled:
+            return None
+        key = (namespace, persona)
+        chunk_ids = tuple(chunk_ids)
+        query = self._unit(query_embedding)
+        version = self._current_version(namespace)
+        now = time.time()
+
+        with self._lock:
+            self._check_version(namespace, version)
+            numbers = self._buckets.get(key)
+            hit = None
+            if numbers:
+                matrix = self._matrices.get(key)
+                if matrix is None:
+                    matrix = self._matrices[key] = np.stack([self._entries[n].embedding for n in numbers])
+                similarities = matrix.dot(query)
+                # Most similar first; the first live entry with the same chunks wins
+                expired = []
+                for position in np.argsort(-similarities).tolist():
+                    if similarities[position] < self.similarity_threshold:
+                        break
+                    number = numbers[position]
+                    entry = self._entries[number]
+                    if entry.expires <= now:
+                        expired.append(number)
+                        continue
+                    if entry.chunk_ids == chunk_ids:
+                        self._entries.move_to_end(number)
+                        hit = dict(entry.response)
+                        break
+                # Expired answers are dropped when a lookup meets them; LRU eviction removes the rest
+                for number in expired:
+                    self._drop(number)
+                self._stats['expirations'] += len(expired)
+            self._stats['hits' if hit is not None else 'misses'] += 1
+            return hit
+
+    def put(self, namespace: str, persona: str, query_embedding: Union[np.ndarray, List[float]],
+            chunk_ids: Sequence[str], response: Dict[str, Any],
+            retrieved_version: Optional[int] = None) -> None:
+        """
+        Cache an answer
+
+        Args:
+            namespace: Vector store namespace
+            persona: AI persona
+            query_embedding: Embedding of the answered query
+            chunk_ids: IDs of the chunks the answer was generated from, in order
+            response: Response dictionary to return on later hits
+            retrieved_version: Namespace version (from version()) read before
+                the chunks were retrieved; the answer is not stored if the
+                namespace changed since, as it may be built from replaced chunks
+        """
+        if not self.enabled:
+            return
+        key = (namespace, persona)
+        entry = _Entry(key, self._unit(query_embedding), tuple(chunk_ids), dict(response),
+                       time.time() + self.ttl_seconds)
+        version = self._current_version(namespace)
+        with self._lock:
+            if retrieved_version is not None and version is not None and version != retrieved_version:
+                self._stats['stale_puts'] += 1
+                return
+            self._check_version(namespace, version)
+            number = self._next_number
+            self._next_number += 1
+            self._entries[number] = entry
+            self._buckets.setdefault(key, []).append(number)
+            self._matrices.pop(key, None)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = next(iter(self._entries.items()))
+                self._drop(oldest)
+                self._stats['evictions'] += 1
+
+    def version(self, namespace: str) -> Optional[int]:
+        """Current content version of a namespace, to pass to put() (None without a version source)"""
+        return self._current_version(namespace)
+
+    def invalidate_namespace(self, namespace: str) -> None:
+        """Forget every answer of a namespace in this process (its documents changed)"""
+        with self._lock:
+            self._invalidate(namespace)
+
+    def clear(self) -> None:
+        """Forget every answer"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._matrices.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache counters and size"""
+        with self._lock:
+            total = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': round(self._stats['hits'] / total, 3) if total else 0.0
+            }
+
+    def _current_version(self, namespace: str) -> Optional[int]:
+        """Namespace content version from version_source (None if there is none or it failed)"""
+        if self.version_source is None:
+            return None
+        try:
+            return self.version_source(namespace)
+        except Exception as e:
+            print(f"Error reading namespace version: {e}")
+            return None
+
+    def _check_version(self, namespace: str, version: Optional[int]) -> None:
+        """Drop a namespace's answers if its content version moved on (caller holds the lock)"""
+        if version is None:
+            return
+        if self._versions.get(namespace, version) != version:
+            self._invalidate(namespace)
+        self._versions[namespace] = version
+
+    def _invalidate(self, namespace: str) -> None:
+        """Remove every entry of a namespace (caller holds the lock)"""
+        keys = [key for key in self._buckets if key[0] == namespace]
+        for key in keys:
+            for number in self._buckets.pop(key):
+                del self._entries[number]
+            self._matrices.pop(key, None)
+        if keys:
+            self._stats['invalidations'] += 1
+
+    def _drop(self, number: int) -> None:
+        """Remove one entry (caller holds the lock)"""
+        entry = self._entries.pop(number)
+        numbers = self._buckets[entry.key]
+        numbers.remove(number)
+        if not numbers:
+            del self._buckets[entry.key]
+        self._matrices.pop(entry.key, None)
@@ -0,0 +1,383 @@
+"""
+BM25 lexical index
+In-memory inverted index over chunk texts for exact-term retrieval (drug and
+disease names that dense embeddings blur). Postings are growable NumPy arrays
+and scoring is vectorized, so a query costs a few array operations per term.
+"""
+
+import re
+import math
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+# Very common English words: near-zero IDF but the longest postings lists
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its
+me my no not of on or our she so such that the their them then there these they
+this to was we were what when where which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens without stopwords
+
+    Hyphenated and apostrophe words stay whole ('covid-19', "alzheimer's").
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of tokens
+    """
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class _Postings:
+    """Document numbers and term frequencies of one term (capacity doubles as it grows)"""
+
+    __slots__ = ('docs', 'tfs', 'size')
+
+    def __init__(self):
+        self.docs = np.zeros(4, dtype=np.int32)
+        self.tfs = np.zeros(4, dtype=np.float32)
+        self.size = 0
+
+    def extend(self, docs: np.ndarray, tfs: np.ndarray) -> None:
+        end = self.size + len(docs)
+        if end > len(self.docs):
+            capacity = max(end, 2 * len(self.docs))
+            self.docs = np.resize(self.docs, capacity)
+            self.tfs = np.resize(self.tfs, capacity)
+        self.docs[self.size:end] = docs
+        self.tfs[self.size:end] = tfs
+        self.size = end
+
+
+class BM25Index:
+    """
+    BM25 (Okapi) index of one namespace
+
+    Deletes only mark documents dead; document frequencies keep counting them
+    until the dead share exceeds compact_dead_ratio and the postings are
+    rewritten, as in Lucene.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, compact_dead_ratio: float = 0.25):
+        """
+        Initialize BM25 index
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+            compact_dead_ratio: Share of deleted documents that triggers compaction
+        """
+        self.k1 = k1
+        self.b = b
+        self.compact_dead_ratio = compact_dead_ratio
+        self.postings: Dict[str, _Postings] = {}
+        self.ids: List[str] = []
+        self.id_to_doc: Dict[str, int] = {}
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.n_docs = 0
+        self.n_live = 0
+        self.total_length = 0.0
+        self._norm = None
+
+    def __len__(self) -> int:
+        return self.n_live
+
+    def add(self, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        Index (or re-index) documents
+
+        Args:
+            items: (vector ID, chunk text) pairs
+        """
+        items = list(items)
+        self.remove([vector_id for vector_id, _ in items if vector_id in self.id_to_doc])
+
+        term_docs: Dict[str, List[int]] = {}
+        term_tfs: Dict[str, List[int]] = {}
+        lengths = []
+        for vector_id, text in items:
+            doc = self.n_docs + len(lengths)
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_docs.setdefault(term, []).append(doc)
+                term_tfs.setdefault(term, []).append(tf)
+            self.ids.append(vector_id)
+            self.id_to_doc[vector_id] = doc
+
+        for term, docs in term_docs.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            postings.extend(np.asarray(docs, dtype=np.int32), np.asarray(term_tfs[term], dtype=np.float32))
+
+        self.lengths = np.concatenate([self.lengths, np.asarray(lengths, dtype=np.float32)])
+        self.alive = np.concatenate([self.alive, np.ones(len(lengths), dtype=bool)])
+        self.n_docs += len(lengths)
+        self.n_live += len(lengths)
+        self.total_length += float(sum(lengths))
+        self._norm = None
+
+    def remove(self, vector_ids: Iterable[str]) -> int:
+        """
+        Delete documents by vector ID
+
+        Args:
+            vector_ids: Vector IDs
+
+        Returns:
+            Number of documents deleted
+        """
+        removed = 0
+        for vector_id in vector_ids:
+            doc = self.id_to_doc.pop(vector_id, None)
+            if doc is None:
+                continue
+            self.alive[doc] = False
+            self.n_live -= 1
+            self.total_length -= float(self.lengths[doc])
+            removed += 1
+        if removed:
+            self._norm = None
+            if self.n_docs - self.n_live > self.compact_dead_ratio * self.n_docs:
+                self.compact()
+        return removed
+
+    def compact(self) -> None:
+        """Drop deleted documents from every postings list and renumber the rest"""
+        new_number = np.cumsum(self.alive) - 1
+        for term in list(self.postings):
+            postings = self.postings[term]
+            docs, tfs = postings.docs[:postings.size], postings.tfs[:postings.size]
+            keep = self.alive[docs]
+            if not keep.any():
+                del self.postings[term]
+                continue
+            fresh = _Postings()
+            fresh.extend(new_number[docs[keep]].astype(np.int32), tfs[keep])
+            self.postings[term] = fresh
+
+        live = np.flatnonzero(self.alive)
+        self.ids = [self.ids[doc] for doc in live.tolist()]
+        self.id_to_doc = {vector_id: doc for doc, vector_id in enumerate(self.ids)}
+        self.lengths = self.lengths[live]
+        self.alive = np.ones(len(live), dtype=bool)
+        self.n_docs = len(live)
+        self._norm = None
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank documents by BM25 score
+
+        Args:
+            query: Query text
+            top_k: Number of results
+
+        Returns:
+            (vector ID, score) pairs, best first
+        """
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not terms or self.n_live == 0 or top_k <= 0:
+            return []
+
+        if self._norm is None:
+            # Per-document length normalization, recomputed only after changes
+            average = self.total_length / self.n_live if self.n_live else 1.0
+            self._norm = self.k1 * (1 - self.b + self.b * self.lengths / max(average, 1e-9))
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in terms:
+            postings = self.postings[term]
+            docs, tfs = postings.docs[:postings.size], postings.tfs[:postings.size]
+            df = postings.size
+            # Deleted documents still in df can push it past n_live until compaction
+            idf = max(0.0, math.log(1 + (self.n_live - df + 0.5) / (df + 0.5)))
+            # A term occurs once per postings list entry, so plain fancy-index += is exact
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[docs])
+
+        if self.n_live < self.n_docs:
+            scores[~self.alive] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return []
+        top_k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(self.ids[doc], float(scores[doc])) for doc in best.tolist()]
+
+
+class LexicalIndex:
+    """
+    BM25 indexes per namespace, built lazily from the vector store's chunk texts
+
+    Each namespace has its own lock, so a search waits only for changes to
+    its own namespace. (Re)builds load and tokenize the texts without any
+    lock and swap the finished index in; the previous index keeps answering
+    meanwhile, and changes made during the build are replayed onto the new one.
+    """
+
+    def __init__(self, load_texts: Callable[[str], Iterable[Tuple[str, str]]],
+                 version_source: Optional[Callable[[str], int]] = None):
+        """
+        Initialize lexical index
+
+        Args:
+            load_texts: Returns the (vector ID, text) pairs of a namespace; used
+                on its first search and whenever it is rebuilt
+            version_source: Returns a namespace's content version shared by all
+                processes (IngestionManifest.namespace_version); a namespace's
+                index is rebuilt once its version moves past the one it was
+                built at, so chunks ingested by another worker are picked up
+        """
+        self.load_texts = load_texts
+        self.version_source = version_source
+        self.namespaces: Dict[str, BM25Index] = {}
+        # Namespace -> content version its index reflects
+        self.versions: Dict[str, Optional[int]] = {}
+        # Guards the tables above and below; held only briefly
+        self._lock = threading.Lock()
+        # Namespace -> lock held while its index is searched or changed
+        self._locks: Dict[str, threading.Lock] = {}
+        # Namespace -> lock held while its index is (re)built
+        self._build_locks: Dict[str, threading.Lock] = {}
+        # Namespace being built -> changes to replay onto the new index
+        self._pending: Dict[str, List[Tuple[str, object]]] = {}
+
+    def _namespace_lock(self, namespace: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(namespace, threading.Lock())
+
+    def _get(self, namespace: str) -> BM25Index:
+        version = self._current_version(namespace)
+        with self._lock:
+            index = self.namespaces.get(namespace)
+            if index is not None and not self._stale(namespace, version):
+                return index
+            build_lock = self._build_locks.setdefault(namespace, threading.Lock())
+        if index is not None and not build_lock.acquire(blocking=False):
+            # Another thread is rebuilding it: answer from the current index
+            return index
+        if index is None:
+            build_lock.acquire()
+        try:
+            lock = self._namespace_lock(namespace)
+            with lock:
+                index = self.namespaces.get(namespace)
+                if index is not None and not self._stale(namespace, version):
+                    return index
+                rebuilt = index is not None
+                self._pending[namespace] = []
+            try:
+                fresh = BM25Index()
+                # The version is read before the texts, so a change made
+                # while they load triggers another rebuild
+                fresh.add(self.load_texts(namespace))
+            except Exception:
+                with lock:
+                    self._pending.pop(namespace, None)
+                raise
+            with lock:
+                for op, arg in self._pending.pop(namespace):
+                    if op == 'clear':
+                        fresh = BM25Index()
+                    else:
+                        getattr(fresh, op)(arg)
+                with self._lock:
+                    self.namespaces[namespace] = fresh
+                    self.versions[namespace] = version
+            print(f"{'Rebuilt' if rebuilt else 'Built'} BM25 index for namespace "
+                  f"'{namespace}' ({len(fresh)} chunks)")
+            return fresh
+        finally:
+            build_lock.release()
+
+    def _current_version(self, namespace: str) -> Optional[int]:
+        """Namespace content version from version_source (None if there is none or it failed)"""
+        if self.version_source is None:
+            return None
+        try:
+            return self.version_source(namespace)
+        except Exception as e:
+            print(f"Error reading namespace version: {e}")
+            return None
+
+    def _stale(self, namespace: str, version: Optional[int]) -> bool:
+        """Whether a built namespace's index is behind the given content version"""
+        if version is None:
+            return False
+        built = self.versions.get(namespace)
+        # Versions only grow, so an older reading (taken before an in-process
+        # update advanced the index) does not force a rebuild
+        return built is None or built < version
+
+    def search(self, query: str, top_k: int = 10, namespace: str = "default") -> List[Tuple[str, float]]:
+        """
+        Rank a namespace's chunks by BM25 score
+
+        Args:
+            query: Query text
+            top_k: Number of results
+            namespace: Namespace to search in
+
+        Returns:
+            (vector ID, score) pairs, best first
+        """
+        index = self._get(namespace)
+        with self._namespace_lock(namespace):
+            return index.search(query, top_k)
+
+    def add(self, namespace: str, items: Iterable[Tuple[str, str]]) -> None:
+        """Index stored chunks (namespaces not built yet pick them up when they are)"""
+        self._change(namespace, 'add', list(items))
+
+    def remove(self, namespace: str, vector_ids: Iterable[str]) -> None:
+        """Forget deleted chunks"""
+        self._change(namespace, 'remove', list(vector_ids))
+
+    def clear_namespace(self, namespace: str) -> None:
+        """Forget a cleared namespace (rebuilt empty on its next search)"""
+        with self._namespace_lock(namespace):
+            if namespace in self._pending:
+                self._pending[namespace].append(('clear', None))
+            with self._lock:
+                self.namespaces.pop(namespace, None)
+                self.versions.pop(namespace, None)
+
+    def _change(self, namespace: str, op: str, arg: list) -> None:
+        """Apply add/remove to a namespace's index and to the one being built for it"""
+        with self._namespace_lock(namespace):
+            if namespace in self._pending:
+                self._pending[namespace].append((op, arg))
+            index = self.namespaces.get(namespace)
+            if index is not None:
+                getattr(index, op)(arg)
+
+    def advance(self, namespace: str, version: int) -> None:
+        """
+        Mark a namespace's index current after this process applied the change
+        that took its content to version
+
+        Only a step from the version the index reflects counts: if another
+        process changed the namespace in between, the next search rebuilds it.
+        """
+        with self._namespace_lock(namespace), self._lock:
+            built = self.versions.get(namespace)
+            if namespace in self.namespaces and built is not None and built == version - 1:
+                self.versions[namespace] = version
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Documents and terms per built namespace"""
+        with self._lock:
+            return {name: {'chunks': len(index), 'terms': len(index.postings)}
+                    for name, index in self.namespaces.items()}
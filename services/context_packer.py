@@ -0,0 +1,224 @@
+"""
+Context packing service
+Fits retrieved chunks into a token budget for the LLM prompt: best chunks
+first, neighbouring chunks of the same file merged without their overlap, and
+the last chunk that only partly fits trimmed at a sentence boundary
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+_SENTENCE_END_RE = re.compile(r'[.!?](?=\s|$)')
+
+
+class ContextPacker:
+    """Greedy, relevance-ordered packing of chunks into a prompt token budget"""
+
+    def __init__(self, encoding, max_tokens: int = None, min_trim_tokens: int = None):
+        """
+        Initialize context packer
+
+        Args:
+            encoding: tiktoken encoding to count tokens with (TextChunker.encoding)
+            max_tokens: Context token budget (defaults to CONTEXT_TOKEN_BUDGET)
+            min_trim_tokens: Smallest remainder worth filling with a trimmed
+                chunk (defaults to CONTEXT_MIN_TRIM_TOKENS)
+        """
+        self.encoding = encoding
+        self.max_tokens = max_tokens or int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+        self.min_trim_tokens = min_trim_tokens or int(os.getenv('CONTEXT_MIN_TRIM_TOKENS', 64))
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens in text"""
+        return len(self.encoding.encode(text))
+
+    def pack(self, chunks: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Build a cited context within the token budget
+
+        Chunks are taken in the given (relevance) order. A chunk whose
+        neighbour (same file, chunk_id one apart, sharing its overlap
+        sentences) is already packed joins that passage and costs only the
+        tokens not shared through chunk overlap; a chunk between two packed
+        passages joins them into one. Chunks without a shared sentence
+        boundary are packed as separate passages.
+        Chunks that do not fit are skipped, except that one may be trimmed to
+        fill a remainder of at least min_trim_tokens.
+
+        Args:
+            chunks: Retrieved chunks, best first
+            max_tokens: Budget for this call (defaults to self.max_tokens)
+
+        Returns:
+            Dictionary with 'context', 'sources' (one per citation),
+            'tokens_used', 'chunks_used' and 'chunks_dropped'
+        """
+        budget = max_tokens or self.max_tokens
+        # Citation markers and separators cost a few tokens per passage
+        marker_tokens = self.count_tokens("[10] ") + self.count_tokens("\n\n")
+
+        passages: List[Dict[str, Any]] = []
+        # Vector ID of every packed chunk
+        placed = set()
+        # (filename, chunk_id) -> passage holding that chunk, to find neighbours
+        positions: Dict[tuple, Dict[str, Any]] = {}
+        used = 0
+        chunks_used = 0
+        trimmed = False
+
+        for chunk in chunks:
+            text = chunk.get('text', '')
+            if not text:
+                continue
+            filename = chunk.get('filename', 'Unknown')
+            chunk_id = chunk.get('chunk_id', 0)
+            key = chunk.get('id') or (filename, chunk_id)
+            if key in placed:
+                continue
+
+            # Only a passage ending (or starting) right next to this chunk, whose
+            # text it actually overlaps, is a neighbour; a trimmed passage cannot
+            # be extended
+            before = positions.get((filename, chunk_id - 1))
+            if before is not None and (before['truncated'] or before['chunk_ids'][-1] != chunk_id - 1
+                                       or not self._overlap(before['texts'][-1], text)):
+                before = None
+            after = positions.get((filename, chunk_id + 1))
+            if after is not None and (after['truncated'] or after['chunk_ids'][0] != chunk_id + 1
+                                      or not self._overlap(text, after['texts'][0])):
+                after = None
+            if before is not None or after is not None:
+                if before is not None:
+                    addition = self._strip_overlap(before['texts'][-1], text)
+                    cost = self.count_tokens(addition) + 1
+                    if after is not None:
+                        # Bridging chunk: after's first chunk loses its overlap
+                        # with this one, and one citation marker goes away
+                        head = self._strip_overlap(text, after['texts'][0])
+                        cost += self.count_tokens(head) - self.count_tokens(after['texts'][0]) - marker_tokens
+                else:
+                    addition = self._strip_overlap(text, after['texts'][0], keep='head')
+                    cost = self.count_tokens(addition) + 1
+                if used + cost > budget:
+                    continue
+                if before is not None:
+                    passage = before
+                    passage['texts'].append(addition)
+                    passage['chunk_ids'].append(chunk_id)
+                    if after is not None:
+                        passage['texts'].extend([head] + after['texts'][1:])
+                        passage['chunk_ids'].extend(after['chunk_ids'])
+                        passage['score'] = max(passage['score'], after['score'])
+                        passages.remove(after)
+                        for other_id in after['chunk_ids']:
+                            positions[(filename, other_id)] = passage
+                else:
+                    passage = after
+                    passage['texts'].insert(0, addition)
+                    passage['chunk_ids'].insert(0, chunk_id)
+                passage['score'] = max(passage['score'], chunk.get('score', 0.0))
+                placed.add(key)
+                positions[(filename, chunk_id)] = passage
+                used += cost
+                chunks_used += 1
+                continue
+
+            cost = self.count_tokens(text) + marker_tokens
+            truncated = False
+            if used + cost > budget:
+                remaining = budget - used - marker_tokens
+                if trimmed or remaining < self.min_trim_tokens:
+                    continue
+                text = self._trim(text, remaining)
+                cost = self.count_tokens(text) + marker_tokens
+                truncated = trimmed = True
+
+            passage = {
+                'filename': filename,
+                'chunk_ids': [chunk_id],
+                'texts': [text],
+                'score': chunk.get('score', 0.0),
+                'truncated': truncated
+            }
+            passages.append(passage)
+            placed.add(key)
+            positions[(filename, chunk_id)] = passage
+            used += cost
+            chunks_used += 1
+
+        context_parts = []
+        sources = []
+        for i, passage in enumerate(passages, 1):
+            citation = f"[{i}]"
+            text = ' '.join(part for part in passage['texts'] if part)
+            source_info = {
+                'citation': citation,
+                'filename': passage['filename'],
+                'chunk_id': passage['chunk_ids'][0],
+                'relevance_score': round(passage['score'], 3),
+                'text_preview': text[:200] + "..." if len(text) > 200 else text
+            }
+            if len(passage['chunk_ids']) > 1:
+                source_info['chunk_ids'] = passage['chunk_ids']
+            if passage['truncated']:
+                source_info['truncated'] = True
+            sources.append(source_info)
+            context_parts.append(f"{citation} {text}")
+
+        context = "\n\n".join(context_parts)
+        return {
+            'context': context,
+            'sources': sources,
+            'tokens_used': self.count_tokens(context),
+            'chunks_used': chunks_used,
+            'chunks_dropped': sum(1 for chunk in chunks if chunk.get('text')) - chunks_used
+        }
+
+    @staticmethod
+    def _overlap(first: str, second: str) -> int:
+        """
+        Length of the text two consecutive chunks share
+
+        The chunker starts each chunk with the last sentences of the previous
+        one, so the overlap is the longest suffix of first that is a prefix of
+        second and ends at a sentence end (0 if there is none).
+        """
+        overlap = 0
+        for match in _SENTENCE_END_RE.finditer(second):
+            end = match.end()
+            if end > len(first):
+                break
+            if first.endswith(second[:end]):
+                overlap = end
+        return overlap
+
+    @classmethod
+    def _strip_overlap(cls, first: str, second: str, keep: str = 'tail') -> str:
+        """
+        Remove the text two consecutive chunks share
+
+        Args:
+            first: Earlier chunk text
+            second: Later chunk text
+            keep: 'tail' returns second without the overlap, 'head' returns
+                first without it
+
+        Returns:
+            The requested non-overlapping part
+        """
+        overlap = cls._overlap(first, second)
+        if keep == 'tail':
+            return second[overlap:].lstrip()
+        return first[:len(first) - overlap].rstrip() if overlap else first
+
+    def _trim(self, text: str, max_tokens: int) -> str:
+        """Cut text to max_tokens, at the last sentence end if one falls in the second half"""
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        head = self.encoding.decode(tokens[:max(1, max_tokens - 1)])
+        ends = [match.end() for match in _SENTENCE_END_RE.finditer(head)]
+        if ends and ends[-1] >= len(head) // 2:
+            return head[:ends[-1]]
+        return head.rstrip() + "..."
@@ -0,0 +1,118 @@
+"""
+Result diversification
+Near-duplicate suppression and maximal marginal relevance (MMR) selection over
+retrieved chunks, so the context sent to the LLM is not several copies of the
+same passage (repeated boilerplate, overlapping chunks, re-issued guidelines)
+"""
+
+import re
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def text_fingerprint(text: str) -> str:
+    """Hash of a chunk text with case and whitespace normalized"""
+    normalized = _WHITESPACE_RE.sub(' ', text.lower()).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _stack_values(chunks: Sequence[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Unit-normalized (n, dim) matrix of the chunks' 'values', or None if any lacks them"""
+    if not chunks or any(chunk.get('values') is None for chunk in chunks):
+        return None
+    return _unit_rows(np.stack([np.asarray(chunk['values'], dtype=np.float32) for chunk in chunks]))
+
+
+def suppress_duplicates(chunks: List[Dict[str, Any]],
+                        similarity_threshold: float = 0.95) -> List[Dict[str, Any]]:
+    """
+    Drop chunks that repeat a better-ranked one
+
+    A chunk is a duplicate if its normalized text hashes like a kept chunk's,
+    or (when every chunk carries 'values') its cosine similarity to a kept
+    chunk reaches similarity_threshold.
+
+    Args:
+        chunks: Retrieved chunks, best first
+        similarity_threshold: Cosine similarity counted as a near-duplicate (> 1 disables)
+
+    Returns:
+        Kept chunks, in their original order
+    """
+    vectors = _stack_values(chunks) if similarity_threshold <= 1.0 else None
+    # Pairwise similarities of the whole pool in one product; pools are small
+    similarity = vectors.dot(vectors.T) if vectors is not None else None
+
+    seen = set()
+    kept: List[int] = []
+    for i, chunk in enumerate(chunks):
+        fingerprint = text_fingerprint(chunk.get('text', ''))
+        if fingerprint in seen:
+            continue
+        if similarity is not None and kept and similarity[i, kept].max() >= similarity_threshold:
+            continue
+        seen.add(fingerprint)
+        kept.append(i)
+    return [chunks[i] for i in kept]
+
+
+def mmr_select(query_embedding: Union[np.ndarray, List[float]],
+               chunks: List[Dict[str, Any]],
+               top_k: int,
+               lambda_mult: float = 0.7,
+               relevance: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    """
+    Pick top_k chunks by maximal marginal relevance
+
+    Each step takes the chunk maximizing
+    lambda_mult * relevance - (1 - lambda_mult) * max similarity to the picked ones.
+    The pairwise similarities are one matrix product and every step is a
+    vector update, so selection costs O(n^2 * dim) once plus O(n) per pick.
+
+    Args:
+        query_embedding: Query vector
+        chunks: Candidate chunks carrying 'values'
+        top_k: Number of chunks to pick
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by diversity only
+        relevance: Per-chunk relevance (defaults to cosine similarity to the query)
+
+    Returns:
+        Picked chunks in selection order (chunks[:top_k] if any lacks 'values')
+    """
+    if top_k <= 0:
+        return []
+    vectors = _stack_values(chunks)
+    if vectors is None or len(chunks) <= 1:
+        return chunks[:top_k]
+
+    if relevance is None:
+        query = _unit_rows(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+        relevance = vectors.dot(query)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = vectors.dot(vectors.T)
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    available = np.ones(len(chunks), dtype=bool)
+    available[first] = False
+    # Highest similarity of each candidate to anything picked so far
+    redundancy = similarity[first].copy()
+
+    for _ in range(min(top_k, len(chunks)) - 1):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+
+    return [chunks[i] for i in selected]
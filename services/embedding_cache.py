@@ -0,0 +1,323 @@
+"""
+Embedding cache service
+Content-addressed cache for text embeddings with an in-memory LRU tier
+and a persistent, memory-mapped on-disk tier
+"""
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class EmbeddingCache:
+    """Caches embeddings keyed by (model name, normalized text hash)"""
+
+    def __init__(self, model_name: str, dimension: int,
+                 max_entries: int = 10000,
+                 cache_dir: Optional[str] = None,
+                 max_disk_entries: int = 200000):
+        """
+        Initialize embedding cache
+
+        Args:
+            model_name: Name of the model producing the embeddings
+            dimension: Embedding dimension
+            max_entries: Maximum number of embeddings held in memory
+            cache_dir: Directory for the persistent tier (None disables it)
+            max_disk_entries: Maximum number of embeddings kept on disk; when full,
+                the persistent tier rolls over to a new, empty generation (0 = unbounded)
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0,
+                       'disk_evictions': 0}
+
+        # Persistent tier: raw float32 rows plus an append-only "key<TAB>row" index,
+        # both belonging to the generation named in the "generation" file
+        self.cache_dir = None
+        self._generation = 0
+        self._disk_index: Dict[str, int] = {}
+        self._index_offset = 0
+        self._vectors = None
+        self._vectors_rows = 0
+
+        if cache_dir:
+            safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+            self.cache_dir = os.path.join(cache_dir, f"{safe_name}_{dimension}")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._generation_path = os.path.join(self.cache_dir, 'generation')
+            self._set_generation(self._read_generation())
+            self._lock_path = os.path.join(self.cache_dir, '.lock')
+            self._refresh_disk_index()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normalize text before hashing (collapse whitespace)"""
+        return ' '.join(text.split())
+
+    def make_key(self, text: str) -> str:
+        """Build the content-addressed cache key for a text"""
+        payload = f"{self.model_name}\x00{self.normalize_text(text)}".encode('utf-8')
+        return hashlib.sha1(payload).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        Look up a single embedding
+
+        Args:
+            text: Input text
+
+        Returns:
+            Cached float32 embedding (read-only) or None on miss
+        """
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for several texts
+
+        Args:
+            texts: Input texts
+
+        Returns:
+            List aligned with texts, holding read-only embeddings or None for misses
+        """
+        results = []
+        with self._lock:
+            for text in texts:
+                key = self.make_key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    results.append(vector)
+                    continue
+
+                vector = self._read_disk(key)
+                if vector is not None:
+                    self._stats['disk_hits'] += 1
+                    self._remember(key, vector)
+                else:
+                    self._stats['misses'] += 1
+                results.append(vector)
+        return results
+
+    def put(self, text: str, embedding, persist: bool = True) -> None:
+        """Store a single embedding"""
+        self.put_many([text], [embedding], persist=persist)
+
+    def put_many(self, texts: List[str], embeddings, persist: bool = True) -> None:
+        """
+        Store embeddings for several texts
+
+        Args:
+            texts: Input texts
+            embeddings: Embeddings aligned with texts
+            persist: Also write them to the persistent tier (False keeps them in memory only)
+        """
+        if not texts:
+            return
+
+        with self._lock:
+            new_rows = []
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(text)
+                # A copy, so the caller's array and the cached one never alias
+                vector = np.array(embedding, dtype=np.float32).reshape(-1)
+                if vector.shape[0] != self.dimension:
+                    continue
+                self._remember(key, vector)
+                if persist and self.cache_dir and key not in self._disk_index:
+                    new_rows.append((key, vector))
+
+            if new_rows:
+                self._append_disk(new_rows)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get cache counters for sizing
+
+        Returns:
+            Dictionary with hit/miss/eviction counters and tier sizes
+        """
+        with self._lock:
+            lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hits = self._stats['memory_hits'] + self._stats['disk_hits']
+            return {
+                **self._stats,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_entries': len(self._disk_index),
+                'max_disk_entries': self.max_disk_entries,
+                'disk_generation': self._generation,
+                'cache_dir': self.cache_dir
+            }
+
+    def clear_memory(self) -> None:
+        """Drop the in-memory tier (the persistent tier is kept)"""
+        with self._lock:
+            self._memory.clear()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert into the LRU tier, evicting the oldest entries if full"""
+        if self.max_entries <= 0:
+            return
+        # Entries are handed out directly on hits: make them immutable
+        vector.setflags(write=False)
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _read_disk(self, key: str) -> Optional[np.ndarray]:
+        """Read an embedding from the persistent tier"""
+        if not self.cache_dir:
+            return None
+
+        row = self._disk_index.get(key)
+        if row is None:
+            # Another worker may have appended since we last looked
+            self._refresh_disk_index()
+            row = self._disk_index.get(key)
+            if row is None:
+                return None
+
+        if self._vectors is None or row >= self._vectors_rows:
+            self._map_vectors()
+            if row >= self._vectors_rows:
+                return None
+
+        return np.array(self._vectors[row], dtype=np.float32)
+
+    def _map_vectors(self) -> None:
+        """(Re)open the vectors file as a read-only memory map"""
+        row_bytes = self.dimension * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = size // row_bytes
+        if rows == 0:
+            self._vectors = None
+            self._vectors_rows = 0
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                  shape=(rows, self.dimension))
+        self._vectors_rows = rows
+
+    def _read_generation(self) -> int:
+        """Read the current persistent-tier generation (0 if never rolled over)"""
+        try:
+            with open(self._generation_path, 'r', encoding='utf-8') as f:
+                value = f.read().strip()
+            return int(value) if value.isdigit() else 0
+        except FileNotFoundError:
+            return 0
+
+    def _set_generation(self, generation: int) -> None:
+        """Point the persistent tier at a generation's files and forget the old index"""
+        self._generation = generation
+        # Generation 0 keeps the original file names, so existing caches stay valid
+        suffix = f".{generation}" if generation else ''
+        self._vectors_path = os.path.join(self.cache_dir, f"vectors{suffix}.f32")
+        self._index_path = os.path.join(self.cache_dir, f"index{suffix}.tsv")
+        self._disk_index = {}
+        self._index_offset = 0
+        self._vectors = None
+        self._vectors_rows = 0
+
+    def _roll_over(self) -> None:
+        """Start a new, empty generation (caller holds the file lock)"""
+        old_paths = (self._vectors_path, self._index_path)
+        self._stats['disk_evictions'] += len(self._disk_index)
+        generation = self._generation + 1
+
+        tmp_path = f"{self._generation_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"{generation}\n")
+        os.replace(tmp_path, self._generation_path)
+        self._set_generation(generation)
+
+        # Other workers notice the new generation on their next refresh; their
+        # memory maps of the old vectors stay readable until then
+        for path in old_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        print(f"Embedding cache reached {self.max_disk_entries} entries on disk; "
+              f"started generation {generation}")
+
+    def _refresh_disk_index(self) -> None:
+        """Read index entries appended since the last refresh"""
+        try:
+            generation = self._read_generation()
+            if generation != self._generation:
+                self._set_generation(generation)
+            if not os.path.exists(self._index_path):
+                return
+            if os.path.getsize(self._index_path) <= self._index_offset:
+                return
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                f.seek(self._index_offset)
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Partially written line, pick it up next time
+                    key, _, row = line.rstrip('\n').partition('\t')
+                    if row.isdigit():
+                        self._disk_index[key] = int(row)
+                    self._index_offset += len(line.encode('utf-8'))
+        except FileNotFoundError:
+            pass  # Rolled over by another worker; the next refresh switches generation
+        except Exception as e:
+            print(f"Error reading embedding cache index: {e}")
+
+    def _append_disk(self, rows) -> None:
+        """Append new embeddings to the persistent tier"""
+        try:
+            with open(self._lock_path, 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh_disk_index()
+                    rows = [(key, vector) for key, vector in rows if key not in self._disk_index]
+                    if not rows:
+                        return
+
+                    if self.max_disk_entries > 0:
+                        rows = rows[-self.max_disk_entries:]
+                        if len(self._disk_index) + len(rows) > self.max_disk_entries:
+                            self._roll_over()
+
+                    row_bytes = self.dimension * 4
+                    size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+                    start = size // row_bytes
+
+                    with open(self._vectors_path, 'ab') as f:
+                        if size % row_bytes:
+                            # Drop a torn row left by an interrupted writer
+                            f.truncate(start * row_bytes)
+                        f.write(np.stack([vector for _, vector in rows]).astype(np.float32).tobytes())
+
+                    lines = ''.join(f"{key}\t{start + i}\n" for i, (key, _) in enumerate(rows))
+                    with open(self._index_path, 'a', encoding='utf-8') as f:
+                        f.write(lines)
+                    self._refresh_disk_index()
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
@@ -4,9 +4,111 @@ Handles text embedding generation for vector storage
 """
 
 import os
-from sentence_transformers import SentenceTransformer
-from typing import List, Union
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List, Union, Callable
 import numpy as np
+from services.embedding_cache import EmbeddingCache
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into batched encodes
+
+    Only useful when a process serves several requests at once (threaded
+    gunicorn workers or Flask's threaded dev server); with one request at a
+    time every query just waits out max_wait_ms alone.
+    """
+    
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_wait_ms: float = 5.0,
+                 max_batch_size: int = 32):
+        """
+        Initialize micro-batcher
+        
+        Args:
+            encode_fn: Function encoding a list of texts into an (n, dim) array
+            max_wait_ms: How long to hold the first request waiting for company
+            max_batch_size: Maximum number of texts per encode call
+        """
+        self.encode_fn = encode_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.requests = 0
+    
+    def submit(self, text: str) -> np.ndarray:
+        """
+        Embed a single text, sharing a forward pass with concurrent callers
+        
+        Args:
+            text: Input text to embed
+            
+        Returns:
+            Embedding vector for the text
+        """
+        future = Future()
+        self._ensure_worker().put((text, future))
+        return future.result()
+    
+    def get_stats(self) -> dict:
+        """Get batching counters"""
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_batch_size': self.max_batch_size
+        }
+    
+    def _ensure_worker(self) -> queue.Queue:
+        """Start the batching thread (again, if we are in a forked child)"""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,),
+                    name="embedding-micro-batcher", daemon=True
+                )
+                self._thread.start()
+            return self._queue
+    
+    def _run(self, requests_queue: queue.Queue):
+        """Collect requests for up to max_wait and encode them together"""
+        while True:
+            batch = [requests_queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(requests_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.encode_fn(texts)
+                if len(embeddings) != len(batch):
+                    # zip() would leave the unmatched callers waiting forever
+                    raise RuntimeError(f"Encoder returned {len(embeddings)} embeddings for {len(batch)} texts")
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            
+            self.batches += 1
+            self.requests += len(batch)
 
 class EmbeddingService:
     """Handles text embedding generation using Hugging Face models"""
@@ -19,11 +121,25 @@ class EmbeddingService:
             model_name: Hugging Face model name for embeddings
         """
         self.model_name = model_name or os.getenv('HF_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+        self.backend = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
         self.model = None
+        self.cache = None
+        self.batcher = None
         self._load_model()
+        self._init_cache()
+        self._init_batcher()
     
     def _load_model(self):
         """Load the sentence transformer model"""
+        if self.backend == 'onnx':
+            try:
+                self._load_onnx_model()
+                return
+            except Exception as e:
+                print(f"Error loading ONNX backend for {self.model_name}: {e}. Falling back to PyTorch.")
+                self.backend = 'torch'
+        
+        from sentence_transformers import SentenceTransformer
         try:
             print(f"Loading embedding model: {self.model_name}")
             self.model = SentenceTransformer(self.model_name)
@@ -37,7 +153,51 @@ class EmbeddingService:
             except Exception as fallback_error:
                 raise Exception(f"Failed to load any embedding model: {fallback_error}")
     
-    def generate_embedding(self, text: str) -> List[float]:
+    def _load_onnx_model(self):
+        """Load the model through onnxruntime (int8-quantized unless EMBEDDING_ONNX_QUANTIZE=0)"""
+        from services.onnx_encoder import OnnxSentenceEncoder
+        
+        quantize = os.getenv('EMBEDDING_ONNX_QUANTIZE', '1') != '0'
+        threads = int(os.getenv('EMBEDDING_ONNX_THREADS', 0)) or None
+        print(f"Loading ONNX embedding model: {self.model_name} (int8={quantize})")
+        self.model = OnnxSentenceEncoder(
+            self.model_name,
+            onnx_dir=os.getenv('EMBEDDING_ONNX_DIR', 'storage/onnx'),
+            quantize=quantize,
+            num_threads=threads
+        )
+        if quantize:
+            self.backend = 'onnx-int8'
+        print(f"Model loaded successfully. Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
+    
+    def _init_cache(self):
+        """Set up the embedding cache (EMBEDDING_CACHE_SIZE=0 disables it)"""
+        max_entries = int(os.getenv('EMBEDDING_CACHE_SIZE', 10000))
+        if max_entries <= 0:
+            return
+        cache_dir = os.getenv('EMBEDDING_CACHE_DIR', 'storage/embedding_cache') or None
+        # Backends produce slightly different vectors, so they must not share entries
+        cache_model_name = self.model_name if self.backend == 'torch' else f"{self.model_name}@{self.backend}"
+        self.cache = EmbeddingCache(
+            model_name=cache_model_name,
+            dimension=self.model.get_sentence_embedding_dimension(),
+            max_entries=max_entries,
+            cache_dir=cache_dir,
+            max_disk_entries=int(os.getenv('EMBEDDING_DISK_CACHE_MAX_ENTRIES', 200000))
+        )
+    
+    def _init_batcher(self):
+        """Enable query micro-batching when EMBEDDING_BATCH_MAX_WAIT_MS > 0"""
+        max_wait_ms = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 0))
+        if max_wait_ms <= 0:
+            return
+        self.batcher = MicroBatcher(
+            encode_fn=lambda texts: self.model.encode(texts, convert_to_tensor=False),
+            max_wait_ms=max_wait_ms,
+            max_batch_size=int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32))
+        )
+    
+    def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text
         
@@ -45,58 +205,136 @@ class EmbeddingService:
             text: Input text to embed
             
         Returns:
-            List of embedding values
+            float32 embedding vector of shape (dim,)
         """
         if not text.strip():
-            return [0.0] * self.model.get_sentence_embedding_dimension()
+            return np.zeros(self.get_embedding_dimension(), dtype=np.float32)
+        
+        if self.cache:
+            cached = self.cache.get(text)
+            if cached is not None:
+                # Callers own the result; the cached array stays untouched
+                return cached.copy()
         
         try:
-            embedding = self.model.encode(text, convert_to_tensor=False)
-            return embedding.tolist()
+            if self.batcher:
+                embedding = self.batcher.submit(text)
+            else:
+                embedding = self.model.encode(text, convert_to_tensor=False)
+            embedding = np.asarray(embedding, dtype=np.float32)
+            if self.cache:
+                # Queries are rarely repeated across restarts: keep them out of the disk tier
+                self.cache.put(text, embedding, persist=False)
+            return embedding
         except Exception as e:
             print(f"Error generating embedding: {e}")
             # Return zero vector as fallback
-            return [0.0] * self.model.get_sentence_embedding_dimension()
+            return np.zeros(self.get_embedding_dimension(), dtype=np.float32)
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """
         Generate embeddings for multiple texts
         
         Args:
             texts: List of input texts to embed
+            batch_size: Number of texts per forward pass inside the model
             
         Returns:
-            List of embedding vectors
+            Contiguous float32 array of shape (len(texts), dim); empty texts get zero rows
         """
+        dimension = self.get_embedding_dimension()
         if not texts:
-            return []
+            return np.zeros((0, dimension), dtype=np.float32)
         
         # Filter out empty texts
-        valid_texts = [text for text in texts if text.strip()]
-        if not valid_texts:
-            return [[0.0] * self.model.get_sentence_embedding_dimension()] * len(texts)
+        valid_positions = [i for i, text in enumerate(texts) if text.strip()]
+        result = np.zeros((len(texts), dimension), dtype=np.float32)
+        if not valid_positions:
+            return result
         
         try:
-            embeddings = self.model.encode(valid_texts, convert_to_tensor=False)
+            embeddings = self._encode_with_cache([texts[i] for i in valid_positions], batch_size)
             
             # Handle case where some texts were empty
-            if len(valid_texts) != len(texts):
-                result = []
-                valid_idx = 0
-                for text in texts:
-                    if text.strip():
-                        result.append(embeddings[valid_idx].tolist())
-                        valid_idx += 1
-                    else:
-                        result.append([0.0] * self.model.get_sentence_embedding_dimension())
+            if len(valid_positions) != len(texts):
+                result[valid_positions] = embeddings
                 return result
-            else:
-                return embeddings.tolist()
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
                 
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             # Return zero vectors as fallback
-            return [[0.0] * self.model.get_sentence_embedding_dimension()] * len(texts)
+            return result
+    
+    def _encode_with_cache(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode texts, serving cached embeddings and encoding only the misses
+        
+        Args:
+            texts: Non-empty input texts
+            batch_size: Number of texts per forward pass inside the model
+            
+        Returns:
+            float32 array of embeddings aligned with texts
+        """
+        if not self.cache:
+            return np.asarray(self.model.encode(texts, batch_size=batch_size, convert_to_tensor=False),
+                              dtype=np.float32)
+        
+        cached = self.cache.get_many(texts)
+        result = np.empty((len(texts), self.get_embedding_dimension()), dtype=np.float32)
+        
+        missing = {}
+        for i, (text, vector) in enumerate(zip(texts, cached)):
+            if vector is None:
+                missing.setdefault(text, []).append(i)
+            else:
+                result[i] = vector
+        
+        if missing:
+            missing_texts = list(missing)
+            missing_embeddings = np.asarray(
+                self.model.encode(missing_texts, batch_size=batch_size, convert_to_tensor=False),
+                dtype=np.float32
+            )
+            self.cache.put_many(missing_texts, missing_embeddings)
+            for text, embedding in zip(missing_texts, missing_embeddings):
+                result[missing[text]] = embedding
+        
+        return result
+    
+    def set_num_threads(self, num_threads: int) -> None:
+        """
+        Limit intra-op threads of the PyTorch backend (avoids oversubscription
+        when several worker processes share the same cores)
+        
+        Args:
+            num_threads: Threads per process
+        """
+        if num_threads <= 0 or self.backend != 'torch':
+            return
+        try:
+            import torch
+            torch.set_num_threads(num_threads)
+        except Exception as e:
+            print(f"Error setting embedding threads: {e}")
+    
+    def warmup(self) -> None:
+        """Run a throwaway encode (bypassing the cache) so lazy model init happens now"""
+        try:
+            self.model.encode(["warmup query", "warmup passage for the embedding model"],
+                              convert_to_tensor=False)
+        except Exception as e:
+            print(f"Error warming up embedding model: {e}")
+    
+    def get_cache_stats(self) -> dict:
+        """
+        Get embedding cache counters
+        
+        Returns:
+            Dictionary with cache statistics (empty if caching is disabled)
+        """
+        return self.cache.get_stats() if self.cache else {}
     
     def get_embedding_dimension(self) -> int:
         """
@@ -116,34 +354,73 @@ class EmbeddingService:
         """
         return {
             'model_name': self.model_name,
+            'backend': self.backend,
             'embedding_dimension': self.get_embedding_dimension(),
             'max_seq_length': getattr(self.model, 'max_seq_length', 'unknown')
         }
     
-    def batch_encode(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+    def count_tokens(self, texts: List[str]) -> List[int]:
         """
-        Generate embeddings in batches for large datasets
+        Count model tokens per text (truncated to the model's max sequence length)
+        
+        Args:
+            texts: List of input texts
+            
+        Returns:
+            Token count for each text
+        """
+        max_length = getattr(self.model, 'max_seq_length', None) or 512
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        if tokenizer is not None:
+            try:
+                encoded = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)
+                return [len(ids) for ids in encoded['input_ids']]
+            except Exception as e:
+                print(f"Error counting tokens, using word counts: {e}")
+        # Rough estimate: ~1.3 word pieces per whitespace-separated word
+        return [min(max_length, int(len(text.split()) * 1.3) + 2) for text in texts]
+    
+    def batch_encode(self, texts: List[str], batch_size: int = None,
+                     token_budget: int = None) -> np.ndarray:
+        """
+        Generate embeddings in length-bucketed batches for large datasets
+        
+        Texts are sorted by token length so each batch pads to a similar
+        length, and the batch size adapts so every forward pass processes
+        roughly token_budget (padded) tokens. Output keeps the input order.
         
         Args:
             texts: List of input texts
-            batch_size: Number of texts to process at once
+            batch_size: Maximum number of texts per batch
+            token_budget: Target padded tokens per batch
             
         Returns:
-            List of embedding vectors
+            float32 array of shape (len(texts), dim)
         """
+        max_batch_size = batch_size or int(os.getenv('EMBEDDING_MAX_BATCH_SIZE', 128))
+        token_budget = token_budget or int(os.getenv('EMBEDDING_TOKEN_BUDGET', 8192))
+        all_embeddings = np.zeros((len(texts), self.get_embedding_dimension()), dtype=np.float32)
         if not texts:
-            return []
+            return all_embeddings
         
-        all_embeddings = []
+        lengths = self.count_tokens(texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self.generate_embeddings(batch)
-            all_embeddings.extend(batch_embeddings)
+        start = 0
+        while start < len(order):
+            # The first (longest) text decides how much padding the batch pays for
+            longest = max(1, lengths[order[start]])
+            size = max(1, min(max_batch_size, token_budget // longest))
+            positions = order[start:start + size]
+            all_embeddings[positions] = self.generate_embeddings(
+                [texts[i] for i in positions], batch_size=len(positions)
+            )
+            start += size
         
         return all_embeddings
     
-    def similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+    def similarity(self, embedding1: Union[np.ndarray, List[float]],
+                   embedding2: Union[np.ndarray, List[float]]) -> float:
         """
         Calculate cosine similarity between two embeddings
         
@@ -156,8 +433,8 @@ class EmbeddingService:
         """
         try:
             # Convert to numpy arrays
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
+            vec1 = np.asarray(embedding1, dtype=np.float32)
+            vec2 = np.asarray(embedding2, dtype=np.float32)
             
             # Calculate cosine similarity
             dot_product = np.dot(vec1, vec2)
@@ -167,7 +444,7 @@ class EmbeddingService:
             if norm1 == 0 or norm2 == 0:
                 return 0.0
             
-            return dot_product / (norm1 * norm2)
+            return float(dot_product / (norm1 * norm2))
             
         except Exception as e:
             print(f"Error calculating similarity: {e}")
@@ -0,0 +1,435 @@
+"""
+Ingestion service
+Runs PDFs through extraction, chunking, embedding and vector storage, and
+records each ingested file in the ingestion manifest. Re-ingesting a file only
+embeds chunks whose text is not already stored for it
+"""
+
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.pdf_ingest import PDFProcessor
+from services.chunker import TextChunker
+from services.embeddings import EmbeddingService
+from services.manifest import IngestionManifest, chunk_hash, file_hash
+from services.bm25_index import LexicalIndex
+from services.answer_cache import SemanticAnswerCache
+
+
+class IngestionService:
+    """Coordinates PDF ingestion into the vector store"""
+
+    def __init__(self, pdf_processor: PDFProcessor,
+                 chunker: TextChunker,
+                 embedding_service: EmbeddingService,
+                 vector_store,
+                 manifest: Optional[IngestionManifest] = None,
+                 lexical_index: Optional[LexicalIndex] = None,
+                 answer_cache: Optional[SemanticAnswerCache] = None):
+        """
+        Initialize ingestion service
+
+        Args:
+            pdf_processor: PDF text extractor
+            chunker: Text chunker
+            embedding_service: Embedding service used for in-process embedding
+            vector_store: Vector store receiving the chunks
+            manifest: Record of ingested files (defaults to INGEST_MANIFEST_PATH)
+            lexical_index: BM25 index kept in step with stored and deleted chunks
+            answer_cache: Answer cache invalidated when a namespace's chunks change
+        """
+        self.pdf_processor = pdf_processor
+        self.chunker = chunker
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.manifest = manifest or IngestionManifest()
+        self.lexical_index = lexical_index
+        self.answer_cache = answer_cache
+        # EMBEDDING_WORKERS > 1 spreads directory ingestion over a process pool
+        self.embedding_workers = int(os.getenv('EMBEDDING_WORKERS', 1))
+        # Chunks embedded per step of in-process ingestion; upserts of one step
+        # run while the next is embedded
+        self.embed_slice_size = int(os.getenv('INGEST_EMBED_SLICE_SIZE', 512))
+
+    def load_chunks(self, filepath: str, filename: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Extract and chunk a PDF
+
+        Args:
+            filepath: Path to the PDF file
+            filename: Filename recorded in chunk metadata
+
+        Returns:
+            List of chunks, or None if no text could be extracted
+        """
+        pdf_text = self.pdf_processor.extract_text(filepath)
+        if not pdf_text:
+            return None
+        return self.chunker.chunk_text(pdf_text, filename)
+
+    def ingest_file(self, filepath: str, filename: str, namespace: str = "default") -> Optional[int]:
+        """
+        Ingest a single PDF in-process, updating the vectors of an earlier ingest of it
+
+        Only chunks whose text was not stored for this file before are embedded
+        and upserted; vectors of chunks that disappeared are deleted.
+
+        Args:
+            filepath: Path to the PDF file
+            filename: Filename recorded in chunk metadata
+            namespace: Namespace to store the vectors in
+
+        Returns:
+            Number of chunks stored, or None if no text could be extracted
+        """
+        file_state = self._file_state(filepath)
+        chunks = self.load_chunks(filepath, filename)
+        if chunks is None:
+            return None
+
+        plan = self._plan_chunks(namespace, filename, chunks)
+        new_texts = [chunks[i]['text'] for i in self._new_chunk_indices(plan)]
+        # Embed slice by slice so each slice's upsert overlaps embedding of the next
+        embedded_slices = (
+            self.embedding_service.batch_encode(new_texts[start:start + self.embed_slice_size])
+            for start in range(0, len(new_texts), self.embed_slice_size)
+        )
+        self._store_file(filename, chunks, embedded_slices, namespace, file_state, plan)
+        return len(chunks)
+
+    def needs_ingest(self, filepath: str, filename: str, namespace: str = "default") -> bool:
+        """
+        Check the manifest for whether a file must be (re-)ingested
+
+        Unchanged size and mtime skip without reading the file; otherwise the
+        content hash decides. A different embedding model always re-ingests.
+
+        Args:
+            filepath: Path to the PDF file
+            filename: Filename recorded in chunk metadata
+            namespace: Namespace the file belongs to
+
+        Returns:
+            True if the file is new, changed or embedded with another model
+        """
+        record = self.manifest.get(namespace, filename)
+        if record is None or record['model_name'] != self.embedding_service.model_name:
+            return True
+        stat = os.stat(filepath)
+        if record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+            return False
+        if file_hash(filepath) == record['content_hash']:
+            # Touched but not modified: remember the new mtime so the hash is skipped next time
+            self.manifest.touch(namespace, filename, stat.st_size, stat.st_mtime)
+            return False
+        return True
+
+    def process_directory(self, folder: str, namespace: str = "default") -> None:
+        """
+        Ingest all PDFs in a folder that are new or changed since they were ingested,
+        or whose vectors lost their chunk texts
+
+        Args:
+            folder: Folder containing PDF files
+            namespace: Namespace to store the vectors in
+        """
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+            return
+
+        pdf_files = [f for f in os.listdir(folder) if f.lower().endswith('.pdf')]
+
+        lost = self.find_lost_texts(namespace)
+        for filename in sorted(set(lost) - set(pdf_files)):
+            print(f"⚠️ {filename}: {len(lost[filename])} vectors in namespace '{namespace}' have no chunk text "
+                  f"and the PDF is not in {folder}; upload it again to restore them")
+
+        if not pdf_files:
+            print("No PDFs found in storage folder")
+            return
+
+        print(f"Found {len(pdf_files)} PDFs in storage folder. Processing...")
+
+        pending_files = []
+        for filename in pdf_files:
+            try:
+                if filename not in lost and not self.needs_ingest(os.path.join(folder, filename), filename, namespace):
+                    print(f"Skipping {filename}: Already processed.")
+                    continue
+            except OSError as e:
+                print(f"❌ Error reading {filename}: {e}")
+                continue
+            pending_files.append(filename)
+
+        if self.embedding_workers > 1 and len(pending_files) > 0:
+            self._process_parallel(folder, pending_files, namespace)
+        else:
+            for filename in pending_files:
+                try:
+                    chunk_count = self.ingest_file(os.path.join(folder, filename), filename, namespace)
+                    if chunk_count is None:
+                        print(f"Failed to extract text from {filename}")
+                        continue
+                    print(f"✅ Processed {filename} - {chunk_count} chunks")
+                except Exception as e:
+                    print(f"❌ Error processing {filename}: {e}")
+                    continue
+
+        print("Storage PDF processing completed!")
+
+    def find_lost_texts(self, namespace: str = "default") -> Dict[str, List[str]]:
+        """
+        Find recorded files whose vectors lost their chunk text
+
+        The Pinecone backend keeps chunk texts on local disk; after that disk
+        was lost (e.g. a container restart) the vectors are still searchable
+        but every match would be skipped. Startup ingestion re-ingests these
+        files so their texts are stored again.
+
+        Args:
+            namespace: Namespace to check
+
+        Returns:
+            Dictionary of filename to the IDs of its vectors without a text
+        """
+        lost = {}
+        for record in self.manifest.list_files(namespace):
+            missing = self.vector_store.missing_texts(record['vector_ids'], namespace)
+            if missing:
+                lost[record['filename']] = missing
+        if lost:
+            print(f"⚠️ Chunk texts of {sum(len(ids) for ids in lost.values())} vectors in {len(lost)} files "
+                  f"of namespace '{namespace}' are missing; re-ingesting those files")
+        elif self.manifest.count(namespace) == 0 and self.vector_store.get_vector_count(namespace) > 0:
+            print(f"⚠️ Namespace '{namespace}' has vectors but no ingestion manifest; PDFs in storage are "
+                  f"re-ingested, vectors of other files may have lost their chunk texts")
+        return lost
+
+    def clear_namespace(self, namespace: str = "default") -> bool:
+        """
+        Delete a namespace's vectors and forget its files in the manifest
+
+        Args:
+            namespace: Namespace to clear
+
+        Returns:
+            True if the vector store was cleared
+        """
+        cleared = self.vector_store.clear_namespace(namespace)
+        if cleared:
+            self.manifest.clear_namespace(namespace)
+            if self.lexical_index is not None:
+                self.lexical_index.clear_namespace(namespace)
+            self._chunks_changed(namespace)
+        return cleared
+
+    def deduplicate_namespace(self, namespace: str = "default", dry_run: bool = False) -> int:
+        """
+        Delete vectors that repeat the text of another vector of the same file
+
+        Cleans up namespaces filled before vector IDs were deterministic, when
+        every re-ingest added a full copy of a file. Of each group of
+        duplicates the vector recorded in the manifest is kept (else the first
+        one listed).
+
+        Args:
+            namespace: Namespace to scan
+            dry_run: Only count the duplicates
+
+        Returns:
+            Number of duplicate vectors found
+        """
+        recorded = set()
+        for record in self.manifest.list_files(namespace):
+            recorded.update(record['vector_ids'])
+
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for vector_id, metadata in self.vector_store.iter_vectors(namespace):
+            key = (metadata.get('filename', ''), chunk_hash(metadata.get('text', '')))
+            groups.setdefault(key, []).append(vector_id)
+
+        duplicates = []
+        for vector_ids in groups.values():
+            if len(vector_ids) < 2:
+                continue
+            keep = next((vector_id for vector_id in vector_ids if vector_id in recorded), vector_ids[0])
+            duplicates.extend(vector_id for vector_id in vector_ids if vector_id != keep)
+
+        print(f"Found {len(duplicates)} duplicate vectors in namespace '{namespace}'")
+        if duplicates and not dry_run:
+            if not self.vector_store.delete_vectors(duplicates, namespace):
+                raise RuntimeError(f"Failed to delete duplicate vectors in namespace '{namespace}'")
+            if self.lexical_index is not None:
+                self.lexical_index.remove(namespace, duplicates)
+            self._chunks_changed(namespace)
+        return len(duplicates)
+
+    def _chunks_changed(self, namespace: str) -> None:
+        """Invalidate a namespace's cached answers and BM25 index here and, via the manifest's version, in other processes"""
+        version = self.manifest.bump_namespace_version(namespace)
+        if self.lexical_index is not None:
+            # This process already applied the change to its BM25 index
+            self.lexical_index.advance(namespace, version)
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_namespace(namespace)
+
+    @staticmethod
+    def _file_state(filepath: str) -> Tuple[str, int, float]:
+        """Content hash, size and mtime of a file, taken before it is read for ingestion"""
+        stat = os.stat(filepath)
+        return file_hash(filepath), stat.st_size, stat.st_mtime
+
+    def _plan_chunks(self, namespace: str, filename: str,
+                     chunks: List[Dict[str, Any]]) -> Tuple[List[str], List[Optional[str]], List[str], Dict[str, int]]:
+        """
+        Diff a file's chunks against its previous ingest
+
+        Chunks are matched by the hash of their text, so unchanged chunks keep
+        their stored vector even if an edit earlier in the file shifted their
+        position; those get their chunk_id metadata rewritten instead. Chunks
+        whose stored text is missing are embedded and stored again.
+
+        Args:
+            namespace: Namespace the file is ingested into
+            filename: Filename
+            chunks: The file's current chunks
+
+        Returns:
+            Tuple of (chunk hashes, reused vector ID or None per chunk,
+            vector IDs of chunks that no longer exist, new chunk_id of each
+            reused vector whose position changed)
+        """
+        hashes = [chunk_hash(chunk['text']) for chunk in chunks]
+        previous = self.manifest.get(namespace, filename)
+        if previous is None:
+            return hashes, [None] * len(chunks), [], {}
+        if previous['model_name'] != self.embedding_service.model_name:
+            return hashes, [None] * len(chunks), previous['vector_ids'], {}
+
+        stored: Dict[str, List[str]] = {}
+        for hash_, vector_id in zip(previous['chunk_hashes'], previous['vector_ids']):
+            stored.setdefault(hash_, []).append(vector_id)
+        reused = [stored[hash_].pop(0) if stored.get(hash_) else None for hash_ in hashes]
+        # A vector whose chunk text was lost is stored again rather than reused
+        lost = set(self.vector_store.missing_texts([vector_id for vector_id in reused if vector_id], namespace))
+        if lost:
+            reused = [None if vector_id in lost else vector_id for vector_id in reused]
+        kept = {vector_id for vector_id in reused if vector_id is not None}
+        stale = [vector_id for vector_id in previous['vector_ids'] if vector_id not in kept]
+        # A vector's chunk_id is its position in the manifest's vector ID list
+        positions = {vector_id: i for i, vector_id in enumerate(previous['vector_ids'])}
+        moved = {vector_id: i for i, vector_id in enumerate(reused)
+                 if vector_id is not None and positions[vector_id] != i}
+        return hashes, reused, stale, moved
+
+    @staticmethod
+    def _new_chunk_indices(plan: Tuple[List[str], List[Optional[str]], List[str], Dict[str, int]]) -> List[int]:
+        """Indices of the chunks that have no stored vector and must be embedded"""
+        return [i for i, vector_id in enumerate(plan[1]) if vector_id is None]
+
+    def _store_file(self, filename: str, chunks: List[Dict[str, Any]], embedded_slices: Iterable,
+                    namespace: str, file_state: Tuple[str, int, float],
+                    plan: Tuple[List[str], List[Optional[str]], List[str], Dict[str, int]]) -> None:
+        """
+        Upsert a file's new chunks, renumber its moved ones, delete its vanished ones and record it
+
+        Args:
+            filename: Filename
+            chunks: The file's current chunks
+            embedded_slices: Embeddings of the new chunks (in order) as consecutive
+                arrays; a lazy generator overlaps embedding with upserts
+            namespace: Namespace the file is ingested into
+            file_state: Content hash, size and mtime of the file
+            plan: Result of _plan_chunks
+        """
+        hashes, reused, stale, moved = plan
+        new_indices = self._new_chunk_indices(plan)
+        vector_ids = list(reused)
+        if new_indices:
+            all_ids = self.vector_store.make_vector_ids(chunks, namespace)
+            for i in new_indices:
+                vector_ids[i] = all_ids[i]
+
+            def batches():
+                start = 0
+                for embeddings in embedded_slices:
+                    end = start + len(embeddings)
+                    yield ([chunks[i] for i in new_indices[start:end]], embeddings,
+                           [vector_ids[i] for i in new_indices[start:end]])
+                    start = end
+
+            if not self.vector_store.store_vector_batches(batches(), namespace):
+                raise RuntimeError(f"Failed to store vectors for {filename}")
+            if self.lexical_index is not None:
+                self.lexical_index.add(namespace, [(vector_ids[i], chunks[i]['text']) for i in new_indices])
+
+        # Citations and neighbour merging rely on chunk_id being the chunk's position
+        if moved and not self.vector_store.update_metadata(
+                {vector_id: {'chunk_id': chunk_id} for vector_id, chunk_id in moved.items()}, namespace):
+            if new_indices:
+                self._chunks_changed(namespace)
+            raise RuntimeError(f"Failed to renumber moved chunks of {filename}")
+
+        # Deterministic IDs: a re-embedded chunk (e.g. after a model change) may reuse a stale ID
+        current = set(vector_ids)
+        stale = [vector_id for vector_id in stale if vector_id not in current]
+        if stale:
+            # Not recording the file keeps the stale IDs in the manifest for the next attempt
+            if not self.vector_store.delete_vectors(stale, namespace):
+                if new_indices or moved:
+                    self._chunks_changed(namespace)
+                raise RuntimeError(f"Failed to delete removed chunks of {filename}")
+            if self.lexical_index is not None:
+                self.lexical_index.remove(namespace, stale)
+        if new_indices or stale or moved:
+            self._chunks_changed(namespace)
+
+        content_hash, size, mtime = file_state
+        self.manifest.record(namespace, filename, content_hash, size, mtime, len(chunks),
+                             self.embedding_service.model_name, vector_ids, hashes)
+        print(f"{filename}: {len(new_indices)} chunks embedded, "
+              f"{len(chunks) - len(new_indices)} reused ({len(moved)} renumbered), {len(stale)} removed")
+
+    def _process_parallel(self, folder: str, filenames: List[str], namespace: str) -> None:
+        """Embed files on a process pool, storing each file as its embeddings arrive in order"""
+        from services.parallel_embed import ParallelEmbedder
+
+        pending: Dict[str, Tuple[List[Dict[str, Any]], Tuple[str, int, float], Tuple]] = {}
+
+        def chunk_stream() -> Iterator[Tuple[str, List[str]]]:
+            # Extraction/chunking runs here while the pool embeds earlier files
+            for filename in filenames:
+                filepath = os.path.join(folder, filename)
+                try:
+                    file_state = self._file_state(filepath)
+                    chunks = self.load_chunks(filepath, filename)
+                except Exception as e:
+                    print(f"❌ Error processing {filename}: {e}")
+                    continue
+                if not chunks:
+                    print(f"Failed to extract text from {filename}")
+                    continue
+                plan = self._plan_chunks(namespace, filename, chunks)
+                new_texts = [chunks[i]['text'] for i in self._new_chunk_indices(plan)]
+                if not new_texts:
+                    # Nothing to embed (chunks only removed or reordered): update in place
+                    try:
+                        self._store_file(filename, chunks, [], namespace, file_state, plan)
+                        print(f"✅ Processed {filename} - {len(chunks)} chunks")
+                    except Exception as e:
+                        print(f"❌ Error processing {filename}: {e}")
+                    continue
+                pending[filename] = (chunks, file_state, plan)
+                yield filename, new_texts
+
+        with ParallelEmbedder(num_workers=self.embedding_workers) as embedder:
+            for filename, embeddings in embedder.embed_stream(chunk_stream()):
+                chunks, file_state, plan = pending.pop(filename)
+                if embeddings is None:
+                    print(f"❌ Error processing {filename}: embedding failed")
+                    continue
+                try:
+                    self._store_file(filename, chunks, [embeddings], namespace, file_state, plan)
+                    print(f"✅ Processed {filename} - {len(chunks)} chunks")
+                except Exception as e:
+                    print(f"❌ Error processing {filename}: {e}")
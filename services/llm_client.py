@@ -0,0 +1,257 @@
+"""
+LLM client
+Shared OpenRouter chat-completions client: one keep-alive connection pool per
+process, separate connect and read timeouts, and jittered exponential-backoff
+retries on rate limiting and server errors
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A chat completion that failed for good"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class OpenRouterClient:
+    """Chat completions over a pooled requests.Session (create one per process, after fork)"""
+
+    def __init__(self, api_key: str = None,
+                 model: str = None,
+                 base_url: str = None,
+                 pool_size: int = None,
+                 connect_timeout: float = None,
+                 read_timeout: float = None,
+                 max_retries: int = None,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0):
+        """
+        Initialize OpenRouter client
+
+        Args:
+            api_key: API key (defaults to OPENROUTER_API_KEY)
+            model: Model name (defaults to OPENROUTER_MODEL)
+            base_url: API root (defaults to OPENROUTER_BASE_URL; point it at a
+                local stand-in server for offline tests)
+            pool_size: Kept-alive connections (defaults to OPENROUTER_POOL_SIZE,
+                else GUNICORN_THREADS: one per request a worker serves at once)
+            connect_timeout: Seconds to establish a connection (defaults to OPENROUTER_CONNECT_TIMEOUT)
+            read_timeout: Seconds to wait between response bytes (defaults to OPENROUTER_READ_TIMEOUT)
+            max_retries: Retries after 429/5xx responses or connection failures
+                (defaults to OPENROUTER_RETRIES)
+            backoff_base: First retry delay in seconds, doubled on each retry
+            backoff_max: Upper bound on a retry delay in seconds
+        """
+        self.api_key = api_key or os.getenv('OPENROUTER_API_KEY')
+        self.model = model or os.getenv('OPENROUTER_MODEL', 'openrouter/auto')
+        self.base_url = (base_url or os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')).rstrip('/')
+        self.url = f"{self.base_url}/chat/completions"
+        self.pool_size = pool_size or int(os.getenv('OPENROUTER_POOL_SIZE', 0)) or int(os.getenv('GUNICORN_THREADS', 1))
+        self.connect_timeout = connect_timeout or float(os.getenv('OPENROUTER_CONNECT_TIMEOUT', 5))
+        self.read_timeout = read_timeout or float(os.getenv('OPENROUTER_READ_TIMEOUT', 30))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OPENROUTER_RETRIES', 2))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        # Retries are done here (with Retry-After and jitter), not by urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, self.pool_size),
+                              max_retries=0, pool_block=False)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": os.getenv('OPENROUTER_REFERER', 'http://localhost:8000'),
+            "X-Title": os.getenv('OPENROUTER_APP_TITLE', 'RAG Medical Chatbot')
+        })
+
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def build_payload(self, system_prompt: str, user_prompt: str,
+                      temperature: float = 0.3, max_tokens: int = 200, **extra) -> Dict[str, Any]:
+        """Chat-completions request body for a system and a user message"""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **extra
+        }
+
+    def complete(self, system_prompt: str, user_prompt: str,
+                 temperature: float = 0.3, max_tokens: int = 200,
+                 title: Optional[str] = None) -> str:
+        """
+        Get a chat completion
+
+        Args:
+            system_prompt: System message
+            user_prompt: User message
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens in the answer
+            title: X-Title OpenRouter attributes the request to (defaults to OPENROUTER_APP_TITLE)
+
+        Returns:
+            Content of the first choice
+
+        Raises:
+            LLMError: On a non-200 response after retries, a connection
+                failure after retries, a read timeout or a malformed body
+        """
+        response = self.post(self.build_payload(system_prompt, user_prompt, temperature, max_tokens), title=title)
+        try:
+            return response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Malformed OpenRouter response: {e}", response.status_code)
+
+    def stream(self, system_prompt: str, user_prompt: str,
+               temperature: float = 0.3, max_tokens: int = 200,
+               title: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream a chat completion as server-sent events
+
+        Args:
+            system_prompt: System message
+            user_prompt: User message
+            temperature: Sampling temperature
+            max_tokens: Maximum tokens in the answer
+            title: X-Title OpenRouter attributes the request to (defaults to OPENROUTER_APP_TITLE)
+
+        Yields:
+            Pieces of the answer as they arrive
+
+        Raises:
+            LLMError: If the request fails (retried only before the first
+                byte), or the stream breaks off or reports an error
+        """
+        payload = self.build_payload(system_prompt, user_prompt, temperature, max_tokens, stream=True)
+        response = self.post(payload, stream=True, title=title)
+        try:
+            # chunk_size=None hands over each transfer chunk as it arrives
+            for line in response.iter_lines(chunk_size=None, decode_unicode=False):
+                # Skips blank lines between events and ':' keep-alive comments
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    # Keep reading to the end of the body so the connection returns to the pool
+                    continue
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                if 'error' in event:
+                    raise LLMError(f"OpenRouter stream error: {event['error']}")
+                choices = event.get('choices') or [{}]
+                content = (choices[0].get('delta') or {}).get('content')
+                if content:
+                    yield content
+        except requests.exceptions.RequestException as e:
+            self._count_failure()
+            raise LLMError(f"OpenRouter stream failed: {e}")
+        finally:
+            response.close()
+
+    def post(self, payload: Dict[str, Any], stream: bool = False,
+             title: Optional[str] = None) -> requests.Response:
+        """
+        Send a chat-completions request, retrying transient failures
+
+        Args:
+            payload: Request body
+            stream: Return before the body is read (for streamed responses)
+            title: X-Title header for this request (defaults to the session's)
+
+        Returns:
+            A 200 response
+
+        Raises:
+            LLMError: If no attempt succeeded
+        """
+        headers = {"X-Title": title} if title else None
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests_sent += 1
+            try:
+                response = self.session.post(self.url, json=payload, stream=stream, headers=headers,
+                                             timeout=(self.connect_timeout, self.read_timeout))
+            except requests.exceptions.ConnectionError as e:
+                # Includes connect timeouts; read timeouts are not retried, as
+                # the full read timeout has already been spent
+                if attempt >= self.max_retries:
+                    self._count_failure()
+                    raise LLMError(f"OpenRouter connection failed: {e}")
+                self._sleep(attempt)
+                attempt += 1
+                continue
+            except requests.exceptions.RequestException as e:
+                self._count_failure()
+                raise LLMError(f"OpenRouter request failed: {e}")
+
+            if response.status_code == 200:
+                return response
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                self._count_failure()
+                message = f"OpenRouter API error: {response.status_code} - {response.text}"
+                response.close()
+                raise LLMError(message, response.status_code)
+            retry_after = response.headers.get('Retry-After')
+            response.close()
+            self._sleep(attempt, retry_after)
+            attempt += 1
+
+    def _sleep(self, attempt: int, retry_after: Optional[str] = None) -> None:
+        """Wait before a retry: the server's Retry-After if given, else jittered exponential backoff"""
+        with self._lock:
+            self.retries += 1
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        if retry_after:
+            try:
+                delay = min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+    def _count_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def close(self) -> None:
+        """Close the pooled connections"""
+        self.session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request counters and pool settings"""
+        return {
+            'model': self.model,
+            'pool_size': self.pool_size,
+            'requests': self.requests_sent,
+            'retries': self.retries,
+            'failures': self.failures
+        }
@@ -0,0 +1,1140 @@
+"""
+Local vector store
+In-process vector index: normalized float32 vectors per namespace, exact cosine
+top-k via matrix products (or an IVF approximate index for large
+namespaces), optional int8 / product-quantized compression with full-precision
+re-ranking, Pinecone-style metadata filters and append-only, memory-mapped
+segment persistence that several processes can share. Runs offline and
+answers small-corpus queries in sub-millisecond time.
+"""
+
+import os
+import re
+import json
+import bisect
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from services.vector_store import BaseVectorStore
+from services.ann_index import IVFIndex
+from services.quantization import create_quantizer
+from services.segment_store import Segment, SegmentStore, SegmentedVectors
+
+
+def matches_filter(metadata: Dict[str, Any], filter_dict: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a Pinecone-style metadata filter
+
+    Supports plain equality, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin,
+    $exists, and the $and / $or combinators.
+
+    Args:
+        metadata: Vector metadata
+        filter_dict: Filter expression
+
+    Returns:
+        True if the metadata satisfies the filter
+    """
+    if not filter_dict:
+        return True
+
+    for key, condition in filter_dict.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        present = key in metadata
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+
+        for op, operand in condition.items():
+            if op == '$eq':
+                ok = present and value == operand
+            elif op == '$ne':
+                ok = value != operand
+            elif op == '$in':
+                ok = present and value in operand
+            elif op == '$nin':
+                ok = value not in operand
+            elif op == '$exists':
+                ok = present == bool(operand)
+            elif op in ('$gt', '$gte', '$lt', '$lte'):
+                if not present or not isinstance(value, (int, float)):
+                    return False
+                ok = {'$gt': value > operand, '$gte': value >= operand,
+                      '$lt': value < operand, '$lte': value <= operand}[op]
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if not ok:
+                return False
+
+    return True
+
+
+class _ReadWriteLock:
+    """Any number of readers or one (re-entrant) writer; a waiting writer holds off new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def reading(self):
+        """Hold the lock shared (the writing thread may also read)"""
+        with self._cond:
+            if self._writer == threading.get_ident():
+                nested = True
+            else:
+                nested = False
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if self._readers == 0:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        """Hold the lock exclusively"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class _Namespace:
+    """
+    Vectors, IDs and metadata of one namespace
+
+    Rows are append-only: an upsert adds a segment (tombstoning the rows it
+    replaces), a delete only tombstones, and compaction rewrites the live rows
+    into one segment. With a SegmentStore every change is written to disk as
+    it happens, under the store's file lock and after sync(). Searches hold
+    lock shared and changes hold it exclusively, so queries on one namespace
+    run in parallel.
+    """
+
+    def __init__(self, dimension: int, index: Optional[IVFIndex] = None,
+                 quantizer=None, store: Optional[SegmentStore] = None):
+        self.dimension = dimension
+        self.segments: List[Segment] = []
+        self.starts: List[int] = []
+        self.vectors = SegmentedVectors([], dimension)
+        self.n_rows = 0
+        self.size = 0
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.index = index
+        # With compression, searches scan the codes and only re-read a
+        # shortlist of full-precision rows (memory-mapped on disk)
+        self.quantizer = quantizer
+        self.codes = np.zeros((0, quantizer.code_size if quantizer else 0), dtype=np.uint8)
+        self.store = store
+        self.lock = _ReadWriteLock()
+
+    def add_segment(self, segment: Segment, ids: List[str], metadata: List[Dict[str, Any]]) -> np.ndarray:
+        """Append a segment's rows as live rows, returning their row numbers"""
+        start = self.n_rows
+        self.segments.append(segment)
+        self.starts.append(start)
+        self.n_rows += len(segment)
+        self.size += len(segment)
+        self.vectors = SegmentedVectors([seg.vectors for seg in self.segments], self.dimension)
+        self._reserve(self.n_rows)
+        self.alive[start:self.n_rows] = True
+        self.ids.extend(ids)
+        self.metadata.extend(metadata)
+        for row, vector_id in enumerate(ids, start):
+            self.id_to_row[vector_id] = row
+        return np.arange(start, self.n_rows)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, metadata: List[Dict[str, Any]]) -> None:
+        """Append rows as a new segment, replacing rows with the same IDs"""
+        # The last occurrence of a repeated ID wins
+        keep = sorted({vector_id: i for i, vector_id in enumerate(ids)}.values())
+        ids = [ids[i] for i in keep]
+        vectors = np.ascontiguousarray(vectors[keep], dtype=np.float32)
+        metadata = [dict(metadata[i]) for i in keep]
+        texts = [meta.pop('text', '') for meta in metadata]
+        replaced = [vector_id for vector_id in ids if vector_id in self.id_to_row]
+
+        if self.store is not None:
+            seq = self.store.allocate_seq()
+            segment = self.store.write_segment(seq, [vectors], len(vectors), ids, metadata, texts)
+            self.store.commit([seg.seq for seg in self.segments] + [seq])
+        else:
+            segment = Segment(vectors, texts=texts)
+
+        # Tombstone replaced rows only after the new segment is committed
+        self.delete(replaced)
+        rows = self.add_segment(segment, ids, metadata)
+        if self.index is not None:
+            self.index.add(rows, vectors)
+        if self.quantizer is not None and self.quantizer.is_trained:
+            self.codes[rows] = self.quantizer.encode(vectors)
+        self.save_side_files([segment])
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstone rows by ID"""
+        tombstones: Dict[int, List[int]] = {}
+        for vector_id in ids:
+            row = self.id_to_row.pop(vector_id, None)
+            if row is None:
+                continue
+            self.alive[row] = False
+            self.size -= 1
+            if self.index is not None:
+                self.index.remove([row])
+            part = bisect.bisect_right(self.starts, row) - 1
+            tombstones.setdefault(self.segments[part].seq, []).append(row - self.starts[part])
+        if self.store is not None and tombstones:
+            self.store.append_tombstones(tombstones)
+        return sum(len(rows) for rows in tombstones.values())
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Metadata of a row with its chunk text read back from the segment"""
+        part = bisect.bisect_right(self.starts, row) - 1
+        return {**self.metadata[row], 'text': self.segments[part].text(row - self.starts[part])}
+
+    def live_rows(self) -> np.ndarray:
+        """Row numbers that are not tombstoned"""
+        return np.flatnonzero(self.alive[:self.n_rows])
+
+    def row_mask(self, filter_dict: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Boolean mask of live rows matching a metadata filter (None means all rows)"""
+        if not filter_dict:
+            return None if self.size == self.n_rows else self.alive[:self.n_rows]
+        mask = np.fromiter((matches_filter(meta, filter_dict) for meta in self.metadata),
+                           dtype=bool, count=self.n_rows)
+        return mask & self.alive[:self.n_rows]
+
+    def encode_all(self) -> None:
+        """(Re)compute the codes of every row after the quantizer was trained"""
+        block_size = 65536
+        for start in range(0, self.n_rows, block_size):
+            stop = min(start + block_size, self.n_rows)
+            self.codes[start:stop] = self.quantizer.encode(self.vectors[start:stop])
+
+    def save_side_files(self, segments: List[Segment]) -> None:
+        """Persist per-segment codes and IVF assignments so a restart need not recompute them"""
+        if self.store is None:
+            return
+        for segment in segments:
+            part = self.segments.index(segment)
+            rows = np.arange(self.starts[part], self.starts[part] + len(segment))
+            if self.quantizer is not None and self.quantizer.is_trained:
+                self.store.save_array(f"seg_{segment.seq:06d}.codes.npy", self.codes[rows])
+            if self.index is not None and self.index.is_trained:
+                self.store.save_array(f"seg_{segment.seq:06d}.ivf.npy", self.index.clusters_of(rows))
+
+    def load_side_files(self, segments: List[Segment]) -> None:
+        """Restore codes and IVF assignments saved with save_side_files, recomputing missing ones"""
+        for segment in segments:
+            start = self.starts[self.segments.index(segment)]
+            rows = np.arange(start, start + len(segment))
+            if self.quantizer is not None and self.quantizer.is_trained:
+                codes = self.store.load_array(f"seg_{segment.seq:06d}.codes.npy")
+                if codes is None or codes.shape != (len(segment), self.quantizer.code_size):
+                    codes = self.quantizer.encode(self.vectors[rows])
+                self.codes[rows] = codes
+            if self.index is not None and self.index.is_trained:
+                clusters = self.store.load_array(f"seg_{segment.seq:06d}.ivf.npy")
+                if clusters is None or len(clusters) != len(segment) or (clusters < 0).any():
+                    self.index.add(rows, self.vectors[rows])
+                else:
+                    self.index.add_assigned(rows, clusters)
+        if self.index is not None:
+            self.index.remove(np.flatnonzero(~self.alive[:self.n_rows]))
+
+    def restore_training(self) -> None:
+        """Install the quantizer and IVF state saved in the store (by this or another process)"""
+        state = self.store.load_array('quantizer.npz')
+        if self.quantizer is not None and state is not None and str(state['kind']) == self.quantizer.kind:
+            try:
+                self.quantizer.set_state(state)
+            except ValueError as e:
+                print(f"Ignoring saved quantizer: {e}")
+        state = self.store.load_array('ivf.npz')
+        if self.index is not None and state is not None:
+            self.index.restore(state['centroids'], int(state['trained_size']))
+
+    def sync(self) -> bool:
+        """
+        Catch up with segments, tombstones and training that other processes
+        committed to the store (caller holds the store lock)
+
+        Returns:
+            False if the namespace was compacted or cleared elsewhere and must be reopened
+        """
+        seqs = self.store.refresh()
+        if seqs is None:
+            return False
+        added = []
+        for seq in seqs:
+            segment, ids, metadata = self.store.open_segment(seq)
+            self.add_segment(segment, ids, metadata)
+            added.append(segment)
+
+        if self.store.has_changed(self.store.TRAINING_FILES):
+            # Retrained elsewhere: codes and IVF lists must use the shared state
+            self.restore_training()
+            if self.quantizer is not None and self.quantizer.is_trained:
+                self.encode_all()
+            if self.index is not None and self.index.is_trained:
+                live = self.live_rows()
+                self.index.add(live, self.vectors[live])
+        elif added:
+            self.load_side_files(added)
+
+        alive = self.alive[:self.n_rows].copy()
+        self.apply_tombstones(self.store.read_tombstones())
+        if self.index is not None:
+            self.index.remove(np.flatnonzero(alive & ~self.alive[:self.n_rows]))
+        return True
+
+    def apply_tombstones(self, tombstones: Dict[int, List[int]]) -> None:
+        """Mark rows dead from tombstone log entries (and older copies of re-upserted IDs)"""
+        for part, segment in enumerate(self.segments):
+            rows = np.asarray(tombstones.get(segment.seq, []), dtype=np.int64) + self.starts[part]
+            self.alive[rows] = False
+        # A crash between committing a segment and logging the rows it replaced
+        # leaves both copies; the newest wins
+        for row, vector_id in enumerate(self.ids):
+            if self.id_to_row.get(vector_id) != row:
+                self.alive[row] = False
+        for row in np.flatnonzero(~self.alive[:self.n_rows]).tolist():
+            if self.id_to_row.get(self.ids[row]) == row:
+                del self.id_to_row[self.ids[row]]
+        self.size = int(self.alive[:self.n_rows].sum())
+
+    def needs_compaction(self, max_segments: int, max_dead_ratio: float) -> bool:
+        """Too many segments, or too many tombstoned rows"""
+        if self.n_rows == 0:
+            return False
+        return len(self.segments) > max_segments or (self.n_rows - self.size) > max_dead_ratio * self.n_rows
+
+    def plan_compaction(self) -> Tuple[int, List[Segment], np.ndarray, Optional[int]]:
+        """Snapshot what compaction will merge: (row count, segments, live rows, new segment seq)"""
+        seq = self.store.allocate_seq() if self.store is not None else None
+        return self.n_rows, list(self.segments), self.live_rows(), seq
+
+    def build_compacted(self, plan) -> Segment:
+        """
+        Write the planned live rows as one segment. Safe without the store lock:
+        segments are immutable and rows below the planned count never change
+        """
+        n_rows, segments, keep, seq = plan
+        if not len(keep):
+            return Segment(np.zeros((0, self.dimension), dtype=np.float32), texts=[], seq=seq)
+        vectors = SegmentedVectors([seg.vectors for seg in segments], self.dimension)
+        starts = [self.starts[i] for i in range(len(segments))]
+        ids = [self.ids[row] for row in keep.tolist()]
+        metadata = [self.metadata[row] for row in keep.tolist()]
+        texts = []
+        for row in keep.tolist():
+            part = bisect.bisect_right(starts, row) - 1
+            texts.append(segments[part].text(row - starts[part]))
+
+        block_size = 65536
+        blocks = (vectors[keep[i:i + block_size]] for i in range(0, len(keep), block_size))
+        if self.store is not None:
+            return self.store.write_segment(seq, blocks, len(keep), ids, metadata, texts)
+        return Segment(np.concatenate(list(blocks)), texts=texts)
+
+    def swap_compacted(self, plan, merged: Segment) -> None:
+        """Replace the planned segments with the compacted one, renumbering rows"""
+        n_rows, segments, keep, _ = plan
+        old_to_new = np.full(self.n_rows, -1, dtype=np.int64)
+        old_to_new[keep] = np.arange(len(keep))
+        old_to_new[n_rows:] = len(keep) + np.arange(self.n_rows - n_rows)
+        survivors = np.flatnonzero(old_to_new >= 0)
+
+        # Rows deleted while the merged segment was being written stay tombstoned
+        self.alive = self.alive[survivors]
+        self.codes = self.codes[survivors]
+        self.ids = [self.ids[row] for row in survivors.tolist()]
+        self.metadata = [self.metadata[row] for row in survivors.tolist()]
+        self.id_to_row = {self.ids[row]: row for row in np.flatnonzero(self.alive).tolist()}
+        self.n_rows = len(survivors)
+
+        self.segments = ([merged] if len(merged) else []) + self.segments[len(segments):]
+        self.starts = np.cumsum([0] + [len(seg) for seg in self.segments])[:-1].tolist()
+        self.vectors = SegmentedVectors([seg.vectors for seg in self.segments], self.dimension)
+        if self.index is not None:
+            self.index.remap(old_to_new)
+
+        if self.store is not None:
+            tombstones: Dict[int, List[int]] = {}
+            for row in np.flatnonzero(~self.alive).tolist():
+                part = bisect.bisect_right(self.starts, row) - 1
+                tombstones.setdefault(self.segments[part].seq, []).append(row - self.starts[part])
+            self.store.commit_compaction([seg.seq for seg in self.segments], tombstones,
+                                         [seg.seq for seg in segments])
+            if len(merged):
+                self.save_side_files([merged])
+
+    def resident_bytes(self) -> int:
+        """Approximate RAM held by vectors and codes (memory-mapped segments excluded)"""
+        vector_bytes = sum(seg.vectors.nbytes for seg in self.segments
+                           if not isinstance(seg.vectors, np.memmap))
+        return vector_bytes + self.n_rows * self.codes.shape[1]
+
+    def _reserve(self, capacity: int) -> None:
+        """Grow the per-row arrays geometrically"""
+        if capacity <= len(self.alive):
+            return
+        new_capacity = max(capacity, len(self.alive) * 2, 64)
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        codes = np.zeros((new_capacity, self.codes.shape[1]), dtype=np.uint8)
+        codes[:len(self.codes)] = self.codes
+        self.codes = codes
+
+
+class LocalVectorStore(BaseVectorStore):
+    """Handles vector operations with an in-process index"""
+
+    def __init__(self, index_dir: Optional[str] = None, dimension: Optional[int] = None,
+                 index_type: Optional[str] = None, compression: Optional[str] = None):
+        """
+        Initialize local vector store
+
+        Args:
+            index_dir: Directory to persist namespaces in (None keeps everything in memory)
+            dimension: Embedding dimension (inferred from the first stored vectors if omitted)
+            index_type: 'flat' for exact search or 'ivf' for approximate search
+            compression: 'none', 'int8' or 'pq' codes searched before full-precision re-ranking
+        """
+        if index_dir is None:
+            index_dir = os.getenv('LOCAL_INDEX_DIR', 'storage/vector_index') or None
+        self.index_dir = index_dir
+        self.dimension = dimension or int(os.getenv('LOCAL_INDEX_DIMENSION', 0)) or None
+        self.index_type = (index_type or os.getenv('LOCAL_INDEX_TYPE', 'flat')).lower()
+        self.ivf_nlist = int(os.getenv('LOCAL_IVF_NLIST', 0))
+        self.ivf_nprobe = int(os.getenv('LOCAL_IVF_NPROBE', 16))
+        self.ivf_min_train_size = int(os.getenv('LOCAL_IVF_MIN_TRAIN', 10000))
+        self.compression = (compression or os.getenv('LOCAL_INDEX_COMPRESSION', 'none')).lower()
+        self.pq_m = int(os.getenv('LOCAL_PQ_M', 0))
+        self.quantize_min_train_size = int(os.getenv('LOCAL_QUANTIZE_MIN_TRAIN', 1000))
+        # Shortlist of top_k * rerank_factor code matches re-scored at full precision
+        self.rerank_factor = int(os.getenv('LOCAL_RERANK_FACTOR', 10))
+        # Background compaction merges segments once either threshold is exceeded
+        self.compact_max_segments = int(os.getenv('LOCAL_COMPACT_MAX_SEGMENTS', 16))
+        self.compact_dead_ratio = float(os.getenv('LOCAL_COMPACT_DEAD_RATIO', 0.2))
+        self.namespaces: Dict[str, _Namespace] = {}
+        # Guards the namespace table, dimension and compaction set only; it is
+        # never held while waiting for a namespace's lock or file lock
+        self._lock = threading.RLock()
+        self._compacting: set = set()
+
+        if self.index_dir:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._load()
+        print(f"Using local vector index ({self.index_dir or 'in-memory'})")
+
+    def store_vectors(self, chunks: List[Dict[str, Any]],
+                     embeddings: Union[np.ndarray, List[List[float]]],
+                     namespace: str = "default",
+                     vector_ids: Optional[List[str]] = None) -> bool:
+        """
+        Store text chunks and their embeddings
+
+        Args:
+            chunks: List of chunk dictionaries with metadata
+            embeddings: (n, dim) float32 array (or list) of embedding vectors
+            namespace: Namespace for organization
+            vector_ids: Optional vector ID per chunk (generated if omitted)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            if not chunks or len(embeddings) == 0:
+                print("No chunks or embeddings to store")
+                return False
+
+            if len(chunks) != len(embeddings):
+                print(f"Mismatch: {len(chunks)} chunks vs {len(embeddings)} embeddings")
+                return False
+
+            vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            with self._writing(namespace, vectors.shape[1]) as ns:
+                ns.upsert(
+                    vector_ids or self.make_vector_ids(chunks, namespace),
+                    vectors,
+                    # The text goes to the segment's text file, not the row metadata
+                    [{**self.build_vector_metadata(chunk), 'text': chunk['text']} for chunk in chunks]
+                )
+                self._maybe_train(ns)
+            self._schedule_compaction(namespace)
+
+            print(f"Successfully stored {len(chunks)} vectors in namespace '{namespace}'")
+            return True
+
+        except Exception as e:
+            print(f"Error storing vectors: {e}")
+            return False
+
+    def search_similar(self, query_embedding: Union[np.ndarray, List[float]],
+                      top_k: int = 8,
+                      namespace: str = "default",
+                      filter_dict: Dict[str, Any] = None,
+                      include_values: bool = False) -> List[Dict[str, Any]]:
+        """
+        Search for similar vectors using query embedding
+
+        Args:
+            query_embedding: Query vector to search with
+            top_k: Number of similar vectors to return
+            namespace: Namespace to search in
+            filter_dict: Optional metadata filter
+            include_values: Add each (normalized) stored vector as a float32 array under 'values'
+
+        Returns:
+            List of similar vectors with metadata, best first
+        """
+        try:
+            with self._reading(namespace) as ns:
+                if not ns or ns.size == 0 or top_k <= 0:
+                    return []
+
+                query = self._normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+
+                mask = ns.row_mask(filter_dict)
+                top_k = self._limit_top_k(ns, top_k, mask)
+                if top_k == 0:
+                    return []
+
+                found = self._search_approximate(ns, query, top_k, mask)
+                if found is None:
+                    scores = ns.vectors.dot(query)
+                    if mask is not None:
+                        scores = np.where(mask, scores, -np.inf)
+                    rows = self._top_k(scores, top_k)
+                    found = rows, scores[rows]
+
+                return self._format_rows(ns, *found, include_values=include_values)
+
+        except Exception as e:
+            print(f"Error searching vectors: {e}")
+            return []
+
+    def search_many(self, query_embeddings: Union[np.ndarray, List[List[float]]],
+                    top_k: int = 8,
+                    namespace: str = "default",
+                    filter_dict: Dict[str, Any] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar vectors for several queries at once
+
+        Exact search scores all queries with one matrix product per block of
+        queries; the IVF and compressed paths search query by query.
+
+        Args:
+            query_embeddings: (m, dim) matrix of query vectors
+            top_k: Number of similar vectors to return per query
+            namespace: Namespace to search in
+            filter_dict: Optional metadata filter applied to every query
+
+        Returns:
+            One result list per query, best first
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        try:
+            with self._reading(namespace) as ns:
+                if not ns or ns.size == 0 or top_k <= 0 or len(queries) == 0:
+                    return [[] for _ in range(len(queries))]
+
+                queries = self._normalize(queries)
+                mask = ns.row_mask(filter_dict)
+                top_k = self._limit_top_k(ns, top_k, mask)
+                if top_k == 0:
+                    return [[] for _ in range(len(queries))]
+
+                if (ns.quantizer is not None and ns.quantizer.is_trained) or \
+                        (ns.index is not None and ns.index.is_trained):
+                    results = []
+                    for query in queries:
+                        found = self._search_approximate(ns, query, top_k, mask)
+                        if found is None:
+                            found = self._search_exact(ns, query.reshape(1, -1), top_k, mask)[0]
+                        results.append(self._format_rows(ns, *found))
+                    return results
+
+                # Bound the (n, block) score matrix to about 32M floats
+                block = max(1, (1 << 25) // max(1, ns.n_rows))
+                results = []
+                for start in range(0, len(queries), block):
+                    for found in self._search_exact(ns, queries[start:start + block], top_k, mask):
+                        results.append(self._format_rows(ns, *found))
+                return results
+
+        except Exception as e:
+            print(f"Error searching vectors: {e}")
+            return [[] for _ in range(len(queries))]
+
+    def get_vector_count(self, namespace: str = "default") -> int:
+        """
+        Get total number of vectors in namespace
+
+        Args:
+            namespace: Namespace
+
+        Returns:
+            Number of vectors
+        """
+        with self._reading(namespace) as ns:
+            return ns.size if ns else 0
+
+    def clear_namespace(self, namespace: str = "default") -> bool:
+        """
+        Clear all vectors from a namespace
+
+        Args:
+            namespace: Namespace to clear
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._writing(namespace) as ns:
+                if ns is not None:
+                    if ns.store is not None:
+                        ns.store.clear()
+                    with self._lock:
+                        self.namespaces.pop(namespace, None)
+            print(f"Cleared all vectors from namespace '{namespace}'")
+            return True
+        except Exception as e:
+            print(f"Error clearing namespace: {e}")
+            return False
+
+    def delete_vectors(self, vector_ids: List[str], namespace: str = "default") -> bool:
+        """
+        Delete specific vectors by ID
+
+        Args:
+            vector_ids: List of vector IDs to delete
+            namespace: Namespace containing the vectors
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._writing(namespace) as ns:
+                deleted = ns.delete(vector_ids) if ns else 0
+            if deleted:
+                self._schedule_compaction(namespace)
+            print(f"Deleted {deleted} vectors from namespace '{namespace}'")
+            return True
+        except Exception as e:
+            print(f"Error deleting vectors: {e}")
+            return False
+
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]], namespace: str = "default") -> bool:
+        """
+        Merge new metadata fields into stored vectors by ID
+
+        Segments are immutable, so the affected rows are re-appended with
+        their stored vectors and texts and the old rows tombstoned.
+
+        Args:
+            updates: Vector ID -> metadata fields to set
+            namespace: Namespace containing the vectors
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not updates:
+            return True
+        try:
+            with self._writing(namespace) as ns:
+                rows = [row for row in (ns.id_to_row.get(vector_id) for vector_id in updates)
+                        if row is not None] if ns else []
+                if rows:
+                    rows = np.asarray(rows, dtype=np.int64)
+                    ids = [ns.ids[row] for row in rows.tolist()]
+                    ns.upsert(ids, ns.vectors[rows],
+                              [{**ns.record(row), **updates[vector_id]}
+                               for row, vector_id in zip(rows.tolist(), ids)])
+            if len(rows):
+                self._schedule_compaction(namespace)
+            print(f"Updated metadata of {len(rows)} vectors in namespace '{namespace}'")
+            return True
+        except Exception as e:
+            print(f"Error updating metadata: {e}")
+            return False
+
+    def iter_vectors(self, namespace: str = "default") -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Iterate over every vector in a namespace
+
+        Args:
+            namespace: Namespace to scan
+
+        Yields:
+            (vector ID, metadata) tuples, from a snapshot taken at the first call
+        """
+        with self._reading(namespace) as ns:
+            records = [(ns.ids[row], ns.record(row)) for row in ns.live_rows().tolist()] if ns else []
+        yield from records
+
+    def get_vectors(self, vector_ids: List[str], namespace: str = "default",
+                    include_values: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get stored vectors by ID
+
+        Args:
+            vector_ids: Vector IDs
+            namespace: Namespace containing the vectors
+            include_values: Add each (normalized) stored vector as a float32 array under 'values'
+
+        Returns:
+            Results in the search result format (score 0.0), in the order of
+            vector_ids; unknown IDs are skipped
+        """
+        with self._reading(namespace) as ns:
+            if not ns:
+                return []
+            rows = np.asarray([row for row in (ns.id_to_row.get(vector_id) for vector_id in vector_ids)
+                               if row is not None], dtype=np.int64)
+            return self._format_rows(ns, rows, np.zeros(len(rows), dtype=np.float32), include_values)
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        """
+        Get index statistics
+
+        Returns:
+            Dictionary with index statistics
+        """
+        with self._lock:
+            names = list(self.namespaces)
+        namespaces = {}
+        for name in names:
+            with self._reading(name) as ns:
+                if ns is not None:
+                    namespaces[name] = {'vector_count': ns.size,
+                                        'deleted_rows': ns.n_rows - ns.size,
+                                        'segments': len(ns.segments),
+                                        'resident_bytes': ns.resident_bytes()}
+        return {
+            'total_vector_count': sum(ns['vector_count'] for ns in namespaces.values()),
+            'dimension': self.dimension,
+            'index_fullness': 0.0,
+            'compression': self.compression,
+            'namespaces': namespaces
+        }
+
+    def search_by_metadata(self, filter_dict: Dict[str, Any],
+                          top_k: int = 10,
+                          namespace: str = "default") -> List[Dict[str, Any]]:
+        """
+        Search vectors by metadata filter
+
+        Args:
+            filter_dict: Metadata filter conditions
+            top_k: Number of results to return
+            namespace: Namespace to search in
+
+        Returns:
+            List of matching vectors
+        """
+        try:
+            with self._reading(namespace) as ns:
+                if not ns:
+                    return []
+                results = []
+                for row in ns.live_rows().tolist():
+                    if len(results) >= top_k:
+                        break
+                    if matches_filter(ns.metadata[row], filter_dict):
+                        results.append(self.format_match(ns.ids[row], 0.0, ns.record(row)))
+                return results
+        except Exception as e:
+            print(f"Error searching by metadata: {e}")
+            return []
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so a dot product is cosine similarity"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the top_k scores, best first (argpartition + small sort)"""
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    @staticmethod
+    def _limit_top_k(ns: _Namespace, top_k: int, mask: Optional[np.ndarray]) -> int:
+        """Cap top_k at the number of live rows passing the filter"""
+        if mask is not None:
+            top_k = min(top_k, int(mask.sum()))
+        return min(top_k, ns.size)
+
+    def _search_approximate(self, ns: _Namespace, query: np.ndarray, top_k: int,
+                            mask: Optional[np.ndarray]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Search the compressed codes or IVF index (None when exact search is needed)"""
+        if ns.quantizer is not None and ns.quantizer.is_trained:
+            return self._search_compressed(ns, query, top_k, mask)
+        if ns.index is not None:
+            return ns.index.search(query, ns.vectors, top_k, mask)
+        return None
+
+    def _search_exact(self, ns: _Namespace, queries: np.ndarray, top_k: int,
+                      mask: Optional[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Exact top-k of each row of a (m, dim) query matrix via one matrix product"""
+        scores = ns.vectors.dot(queries.T)
+        if mask is not None:
+            scores = np.where(mask[:, None], scores, -np.inf)
+        found = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            rows = self._top_k(column_scores, top_k)
+            found.append((rows, column_scores[rows]))
+        return found
+
+    def _format_rows(self, ns: _Namespace, rows: np.ndarray, scores: np.ndarray,
+                     include_values: bool = False) -> List[Dict[str, Any]]:
+        """Convert (rows, scores) into search results"""
+        results = [self.format_match(ns.ids[row], float(score), ns.record(row))
+                   for row, score in zip(rows.tolist(), scores.tolist())]
+        if include_values and results:
+            for result, values in zip(results, ns.vectors[rows]):
+                result['values'] = values
+        return results
+
+    def _search_compressed(self, ns: _Namespace, query: np.ndarray, top_k: int,
+                           mask: Optional[np.ndarray]):
+        """Score codes (within the IVF probe if trained), then re-rank a shortlist exactly"""
+        rows = None
+        if ns.index is not None and ns.index.is_trained:
+            rows = ns.index.candidates(query)
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) < top_k:
+                rows = None
+        if rows is None:
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(ns.n_rows)
+
+        approx = ns.quantizer.scores(ns.codes[rows], query)
+        shortlist = rows[self._top_k(approx, min(len(rows), top_k * self.rerank_factor))]
+        # Fancy indexing a memmap only pages in the shortlisted rows
+        shortlist = np.sort(shortlist)
+        exact = ns.vectors[shortlist] @ query
+        best = self._top_k(exact, top_k)
+        return shortlist[best], exact[best]
+
+    def _get_namespace(self, namespace: str, dimension: int, create: bool = False) -> Optional[_Namespace]:
+        """Look up (or create) a namespace, checking the dimension"""
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = dimension
+            if dimension != self.dimension:
+                raise ValueError(f"Dimension mismatch: index is {self.dimension}, got {dimension}")
+            ns = self.namespaces.get(namespace)
+            if ns is None and create:
+                store = SegmentStore(self._namespace_dir(namespace), namespace, self.dimension) if self.index_dir else None
+                ns = self._new_namespace(store)
+                self.namespaces[namespace] = ns
+            return ns
+
+    def _new_namespace(self, store: Optional[SegmentStore]) -> _Namespace:
+        """Build an empty namespace with the configured quantizer and ANN index"""
+        quantizer = create_quantizer(self.compression, self.dimension, self.pq_m,
+                                     self.quantize_min_train_size)
+        return _Namespace(self.dimension, self._create_index(), quantizer, store)
+
+    def _create_index(self) -> Optional[IVFIndex]:
+        """Build the ANN index configured by LOCAL_INDEX_TYPE (None for exact search)"""
+        if self.index_type == 'ivf':
+            return IVFIndex(self.dimension, nlist=self.ivf_nlist, nprobe=self.ivf_nprobe,
+                            min_train_size=self.ivf_min_train_size)
+        if self.index_type != 'flat':
+            raise ValueError(f"Unknown LOCAL_INDEX_TYPE: {self.index_type}")
+        return None
+
+    def _maybe_train(self, ns: _Namespace) -> None:
+        """Train the namespace's quantizer and ANN index once they are large enough"""
+        trained = False
+        if ns.quantizer is not None and ns.quantizer.needs_training(ns.size):
+            print(f"Training {ns.quantizer.kind} quantizer on {ns.size} vectors...")
+            ns.quantizer.train(ns.vectors)
+            ns.encode_all()
+            trained = True
+        if ns.index is not None and ns.index.needs_training(ns.size):
+            print(f"Training IVF index on {ns.size} vectors...")
+            ns.index.train(ns.vectors)
+            ns.index.remove(np.flatnonzero(~ns.alive[:ns.n_rows]))
+            trained = True
+        if trained and ns.store is not None:
+            self._save_training(ns)
+
+    def _save_training(self, ns: _Namespace) -> None:
+        """Persist trained quantizer / IVF state and every segment's codes and assignments"""
+        if ns.quantizer is not None and ns.quantizer.is_trained:
+            ns.store.save_array('quantizer.npz', {'kind': np.asarray(ns.quantizer.kind),
+                                                  **ns.quantizer.get_state()})
+        if ns.index is not None and ns.index.is_trained:
+            ns.store.save_array('ivf.npz', {'centroids': ns.index.centroids,
+                                            'trained_size': np.asarray(ns.index.trained_size)})
+        ns.save_side_files(ns.segments)
+
+    def compact(self, namespace: str = "default") -> bool:
+        """
+        Merge a namespace's segments and drop tombstoned rows
+
+        The merged segment is written without holding the namespace or store
+        lock, so searches and writes (in this and other processes) continue
+        meanwhile.
+
+        Args:
+            namespace: Namespace to compact
+
+        Returns:
+            True if the namespace was compacted
+        """
+        with self._lock:
+            if namespace not in self.namespaces or namespace in self._compacting:
+                return False
+            self._compacting.add(namespace)
+        try:
+            with self._writing(namespace) as ns:
+                if ns is None:
+                    return False
+                plan = ns.plan_compaction()
+            merged = ns.build_compacted(plan)
+            with self._writing(namespace) as current:
+                if current is not ns:
+                    # Cleared, or compacted by another process, meanwhile
+                    if ns.store is not None:
+                        ns.store.remove_segment(plan[3])
+                    return False
+                before = len(ns.segments)
+                ns.swap_compacted(plan, merged)
+            print(f"Compacted namespace '{namespace}': {before} -> {len(ns.segments)} segments")
+            return True
+        except Exception as e:
+            print(f"Error compacting namespace '{namespace}': {e}")
+            return False
+        finally:
+            with self._lock:
+                self._compacting.discard(namespace)
+
+    def _schedule_compaction(self, namespace: str) -> None:
+        """Start a background compaction if the namespace needs one"""
+        with self._lock:
+            ns = self.namespaces.get(namespace)
+            if ns is None or namespace in self._compacting:
+                return
+            if not ns.needs_compaction(self.compact_max_segments, self.compact_dead_ratio):
+                return
+        threading.Thread(target=self.compact, args=(namespace,), daemon=True).start()
+
+    def _current(self, namespace: str) -> Optional[_Namespace]:
+        """
+        Look up a namespace, first catching up with what other processes
+        committed to its directory
+
+        Checking costs a few stat calls; the file lock is only taken when
+        the manifest, tombstone log or training files changed.
+        """
+        with self._lock:
+            ns = self.namespaces.get(namespace)
+        if not self.index_dir:
+            return ns
+        if ns is None:
+            ns_dir = self._namespace_dir(namespace)
+            if not os.path.exists(os.path.join(ns_dir, SegmentStore.MANIFEST)):
+                return None
+            store = SegmentStore(ns_dir)
+            with store.locked():
+                return self._open_namespace(store)
+        if ns.store is not None and ns.store.has_changed():
+            with ns.lock.writing(), ns.store.locked():
+                return self._sync(namespace, ns)
+        return ns
+
+    @contextmanager
+    def _reading(self, namespace: str):
+        """
+        Hold a namespace's lock shared, caught up with other processes' commits
+
+        Yields:
+            The namespace, or None if it does not exist
+        """
+        ns = self._current(namespace)
+        if ns is None:
+            yield None
+            return
+        with ns.lock.reading():
+            yield ns
+
+    @contextmanager
+    def _writing(self, namespace: str, dimension: Optional[int] = None):
+        """
+        Hold a namespace's lock exclusively and its file lock, caught up with
+        other processes' commits
+
+        Args:
+            namespace: Namespace to change
+            dimension: Vector dimension, to create the namespace if it is missing
+
+        Yields:
+            The namespace, or None if it does not exist
+        """
+        while True:
+            ns = self._current(namespace)
+            if dimension is not None:
+                ns = self._get_namespace(namespace, dimension, create=True)
+            if ns is None:
+                yield None
+                return
+            with ns.lock.writing():
+                if ns.store is None:
+                    with self._lock:
+                        current = self.namespaces.get(namespace)
+                    if current is ns:
+                        yield ns
+                        return
+                else:
+                    with ns.store.locked():
+                        if self._sync(namespace, ns) is ns:
+                            yield ns
+                            return
+            # Cleared or reopened by another thread meanwhile: start over
+
+    def _sync(self, namespace: str, ns: _Namespace) -> Optional[_Namespace]:
+        """
+        Apply other processes' commits, reopening the namespace if they compacted
+        or cleared it (caller holds the namespace's lock exclusively and its file lock)
+
+        Returns:
+            The namespace now registered under the name (None if it was cleared)
+        """
+        with self._lock:
+            current = self.namespaces.get(namespace)
+        if current is not ns:
+            return current
+        if ns.sync():
+            return ns
+        return self._open_namespace(SegmentStore(ns.store.directory), replace=ns)
+
+    def _namespace_dir(self, namespace: str) -> str:
+        """
+        Directory a namespace is persisted in
+
+        The readable, sanitized name is suffixed with a hash of the raw name,
+        so namespaces that sanitize alike (e.g. "my file.pdf" and
+        "my_file.pdf") get separate directories. A directory written before
+        the suffix was added is still used if its manifest names this
+        namespace.
+        """
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', namespace) or '_'
+        digest = hashlib.sha256(namespace.encode('utf-8')).hexdigest()[:12]
+        ns_dir = os.path.join(self.index_dir, f"{safe_name}-{digest}")
+        legacy_dir = os.path.join(self.index_dir, safe_name)
+        if not os.path.exists(os.path.join(ns_dir, SegmentStore.MANIFEST)) and \
+                self._manifest_namespace(legacy_dir) == namespace:
+            return legacy_dir
+        return ns_dir
+
+    @staticmethod
+    def _manifest_namespace(ns_dir: str) -> Optional[str]:
+        """Raw namespace name recorded in a directory's manifest (None if there is none)"""
+        try:
+            with open(os.path.join(ns_dir, SegmentStore.MANIFEST), 'r', encoding='utf-8') as f:
+                return json.load(f).get('namespace')
+        except (OSError, ValueError):
+            return None
+
+    def _load(self) -> None:
+        """Open all persisted namespaces (vectors and texts are memory-mapped, not read)"""
+        for entry in sorted(os.listdir(self.index_dir)):
+            ns_dir = os.path.join(self.index_dir, entry)
+            # Namespaces are named by their manifest, not their directory
+            namespace = self._manifest_namespace(ns_dir)
+            if namespace is None or os.path.normpath(self._namespace_dir(namespace)) != os.path.normpath(ns_dir):
+                continue
+            try:
+                store = SegmentStore(ns_dir)
+                with store.locked():
+                    self._open_namespace(store)
+            except Exception as e:
+                print(f"Error loading namespace from {ns_dir}: {e}")
+
+    def _open_namespace(self, store: SegmentStore, replace: Optional[_Namespace] = None) -> _Namespace:
+        """
+        Attach a namespace's committed segments and restore its trained state
+        (caller holds the store lock)
+
+        The namespace is built before it is registered, so other namespaces
+        stay searchable meanwhile. If another thread registered the name
+        first (and it is not the namespace being replaced), that one is kept.
+
+        Args:
+            store: The namespace's segment store
+            replace: Stale namespace object this one supersedes
+
+        Returns:
+            The namespace registered under the name
+        """
+        segments, tombstones = store.load()
+        namespace = store.manifest['namespace']
+        self._get_namespace(namespace, store.manifest['dimension'])
+        ns = self._new_namespace(store)
+        for segment, ids, metadata in segments:
+            ns.add_segment(segment, ids, metadata)
+        ns.apply_tombstones(tombstones)
+
+        # Reuse saved training so startup neither reruns k-means nor re-encodes
+        ns.restore_training()
+        ns.load_side_files(ns.segments)
+        self._maybe_train(ns)
+        with self._lock:
+            current = self.namespaces.get(namespace)
+            if current is not None and current is not replace:
+                return current
+            self.namespaces[namespace] = ns
+        print(f"Opened {ns.size} vectors in {len(ns.segments)} segments for namespace '{namespace}'")
+        self._schedule_compaction(namespace)
+        return ns
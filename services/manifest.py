@@ -0,0 +1,211 @@
+"""
+Ingestion manifest
+SQLite record of every ingested file per namespace (content hash, size, mtime,
+chunk count, embedding model, vector IDs and chunk hashes), so startup ingestion
+decides exactly and cheaply which PDFs still need processing and re-ingestion
+only embeds the chunks that changed
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def file_hash(filepath: str, block_size: int = 1 << 20) -> str:
+    """
+    SHA-256 of a file's contents
+
+    Args:
+        filepath: Path to the file
+        block_size: Bytes read at a time
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    """SHA-256 of a chunk's text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class IngestionManifest:
+    """Tracks which files have been ingested into which namespace"""
+
+    def __init__(self, db_path: Optional[str] = None, version_cache_seconds: Optional[float] = None):
+        """
+        Initialize ingestion manifest
+
+        Args:
+            db_path: SQLite database path (defaults to INGEST_MANIFEST_PATH)
+            version_cache_seconds: How long a namespace version read is reused
+                (defaults to NAMESPACE_VERSION_CACHE_SECONDS)
+        """
+        self.db_path = db_path or os.getenv('INGEST_MANIFEST_PATH', 'storage/ingest_manifest.sqlite3')
+        self.version_cache_seconds = version_cache_seconds if version_cache_seconds is not None else \
+            float(os.getenv('NAMESPACE_VERSION_CACHE_SECONDS', 1.0))
+        # Namespace -> (version, monotonic time it was read)
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            # WAL lets gunicorn workers read while another process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    namespace TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    model_name TEXT NOT NULL,
+                    vector_ids TEXT NOT NULL,
+                    ingested_at REAL NOT NULL,
+                    chunk_hashes TEXT NOT NULL,
+                    PRIMARY KEY (namespace, filename)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS namespaces (
+                    namespace TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived connection committing on success (safe across threads and forked workers)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record['vector_ids'] = json.loads(record['vector_ids'])
+        record['chunk_hashes'] = json.loads(record['chunk_hashes'])
+        return record
+
+    def get(self, namespace: str, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the record of an ingested file
+
+        Args:
+            namespace: Namespace the file was ingested into
+            filename: Filename
+
+        Returns:
+            Record dictionary, or None if the file is not in the manifest
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM files WHERE namespace = ? AND filename = ?",
+                               (namespace, filename)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_files(self, namespace: str) -> List[Dict[str, Any]]:
+        """
+        Get all records of a namespace
+
+        Args:
+            namespace: Namespace
+
+        Returns:
+            List of record dictionaries ordered by filename
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM files WHERE namespace = ? ORDER BY filename",
+                                (namespace,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self, namespace: str) -> int:
+        """Number of files recorded for a namespace"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM files WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def record(self, namespace: str, filename: str, content_hash: str, size: int, mtime: float,
+               chunk_count: int, model_name: str, vector_ids: List[str],
+               chunk_hashes: List[str]) -> None:
+        """
+        Record (or replace) an ingested file
+
+        Args:
+            namespace: Namespace the file was ingested into
+            filename: Filename
+            content_hash: SHA-256 of the file contents
+            size: File size in bytes
+            mtime: File modification time
+            chunk_count: Number of chunks stored
+            model_name: Embedding model used
+            vector_ids: IDs of the stored vectors, in chunk order
+            chunk_hashes: Hash of each chunk's text, parallel to vector_ids
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, filename, content_hash, size, mtime, chunk_count, model_name,
+                 json.dumps(vector_ids), time.time(), json.dumps(chunk_hashes))
+            )
+
+    def touch(self, namespace: str, filename: str, size: int, mtime: float) -> None:
+        """Update size/mtime of a file whose contents are unchanged"""
+        with self._connect() as conn:
+            conn.execute("UPDATE files SET size = ?, mtime = ? WHERE namespace = ? AND filename = ?",
+                         (size, mtime, namespace, filename))
+
+    def remove(self, namespace: str, filename: str) -> None:
+        """Forget a file"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM files WHERE namespace = ? AND filename = ?", (namespace, filename))
+
+    def clear_namespace(self, namespace: str) -> None:
+        """Forget every file of a namespace"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM files WHERE namespace = ?", (namespace,))
+
+    def namespace_version(self, namespace: str) -> int:
+        """
+        Number of times a namespace's chunks changed (0 if never), as seen by every process
+
+        Every search and answer cache lookup asks for it, so a reading is
+        reused for version_cache_seconds: changes made by other processes are
+        seen that much later, changes made by this one at once.
+        """
+        cached = self._versions.get(namespace)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < self.version_cache_seconds:
+            return cached[0]
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM namespaces WHERE namespace = ?", (namespace,)).fetchone()
+        version = row['version'] if row else 0
+        # Versions only grow; a read that raced an in-process bump must not undo it
+        latest = self._versions.get(namespace)
+        if latest is not None and latest[0] > version:
+            version = latest[0]
+        self._versions[namespace] = (version, now)
+        return version
+
+    def bump_namespace_version(self, namespace: str) -> int:
+        """Record that a namespace's chunks changed and return its new version"""
+        with self._connect() as conn:
+            conn.execute("INSERT INTO namespaces VALUES (?, 1) "
+                         "ON CONFLICT(namespace) DO UPDATE SET version = version + 1", (namespace,))
+            # Same transaction: no other process can bump in between
+            row = conn.execute("SELECT version FROM namespaces WHERE namespace = ?", (namespace,)).fetchone()
+        self._versions[namespace] = (row['version'], time.monotonic())
+        return row['version']
@@ -0,0 +1,241 @@
+"""
+ONNX Runtime embedding backend
+Runs sentence-transformers models exported to ONNX (optionally int8-quantized)
+on CPU without importing PyTorch at serving time
+"""
+
+import os
+import re
+import json
+import threading
+from typing import List, Union, Optional, Dict, Any
+
+import numpy as np
+
+
+class OnnxSentenceEncoder:
+    """Drop-in replacement for SentenceTransformer.encode backed by onnxruntime"""
+
+    def __init__(self, model_name: str,
+                 onnx_dir: str = 'storage/onnx',
+                 quantize: bool = True,
+                 max_seq_length: Optional[int] = None,
+                 num_threads: Optional[int] = None):
+        """
+        Initialize ONNX encoder, exporting the model on first use
+
+        Args:
+            model_name: Hugging Face sentence-transformers model name
+            onnx_dir: Directory holding exported models
+            quantize: Use a dynamically int8-quantized copy of the model
+            max_seq_length: Maximum tokens per input (defaults to the exported model's)
+            num_threads: onnxruntime intra-op threads (None lets onnxruntime decide)
+        """
+        self.model_name = model_name
+        self.quantize = quantize
+        self.model_dir = os.path.join(onnx_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.model_path = os.path.join(self.model_dir, 'model_int8.onnx' if quantize else 'model.onnx')
+
+        if not os.path.exists(self.model_path):
+            export_model(model_name, onnx_dir, quantize=quantize)
+
+        # Imported here so a missing onnxruntime fails now, not on the first query
+        import onnxruntime  # noqa: F401
+        from transformers import AutoTokenizer
+
+        self.num_threads = num_threads
+        self.input_names = set()
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+        with open(os.path.join(self.model_dir, 'encoder_config.json'), 'r') as f:
+            config = json.load(f)
+        self.pooling = config.get('pooling', 'mean')
+        self.normalize = config.get('normalize', False)
+        self.dimension = config['dimension']
+        self.max_seq_length = max_seq_length or config.get('max_seq_length', 256)
+
+    @property
+    def session(self):
+        """
+        This process's InferenceSession, created on first use
+
+        Not created in __init__: the gunicorn master preloads the encoder, and
+        onnxruntime's thread pools do not survive fork, so each worker builds
+        its own session (on warmup or its first encode).
+        """
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import onnxruntime as ort
+
+                    options = ort.SessionOptions()
+                    if self.num_threads:
+                        options.intra_op_num_threads = self.num_threads
+                    session = ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+                    self.input_names = {i.name for i in session.get_inputs()}
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Get the dimension of embeddings produced by this model"""
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_tensor: bool = False, **kwargs) -> np.ndarray:
+        """
+        Encode sentences into embeddings
+
+        Args:
+            sentences: A single text or a list of texts
+            batch_size: Number of texts per inference call
+            convert_to_tensor: Ignored, kept for SentenceTransformer compatibility
+
+        Returns:
+            float32 array of shape (dim,) for a single text or (n, dim) for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        outputs = []
+        for i in range(0, len(texts), batch_size):
+            outputs.append(self._encode_batch(texts[i:i + batch_size]))
+        embeddings = np.concatenate(outputs, axis=0)
+
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run one inference call and pool token embeddings"""
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True,
+            max_length=self.max_seq_length, return_tensors='np'
+        )
+        session = self.session
+        feeds = {name: encoded[name].astype(np.int64) for name in ('input_ids', 'attention_mask', 'token_type_ids')
+                 if name in self.input_names and name in encoded}
+        token_embeddings = session.run(None, feeds)[0]
+
+        if self.pooling == 'cls':
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings.astype(np.float32)
+
+
+def export_model(model_name: str, onnx_dir: str = 'storage/onnx', quantize: bool = True) -> str:
+    """
+    Export a sentence-transformers model to ONNX (requires torch at export time only)
+
+    Args:
+        model_name: Hugging Face sentence-transformers model name
+        onnx_dir: Directory to write exported models to
+        quantize: Also write a dynamically int8-quantized copy
+
+    Returns:
+        Path of the model directory
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = os.path.join(onnx_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+    os.makedirs(model_dir, exist_ok=True)
+    fp32_path = os.path.join(model_dir, 'model.onnx')
+
+    print(f"Exporting {model_name} to ONNX in {model_dir}")
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(model_dir)
+
+    dummy = tokenizer(["export sample"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+
+    class _TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args)))[0]
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _TokenEmbeddings(transformer),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    pooling = 'mean'
+    normalize = False
+    for module in st_model:
+        module_type = type(module).__name__
+        if module_type == 'Pooling' and getattr(module, 'pooling_mode_cls_token', False):
+            pooling = 'cls'
+        elif module_type == 'Normalize':
+            normalize = True
+
+    with open(os.path.join(model_dir, 'encoder_config.json'), 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'pooling': pooling,
+            'normalize': normalize,
+            'dimension': st_model.get_sentence_embedding_dimension(),
+            'max_seq_length': st_model.max_seq_length
+        }, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, os.path.join(model_dir, 'model_int8.onnx'), weight_type=QuantType.QInt8)
+        print("Wrote int8-quantized model")
+
+    return model_dir
+
+
+def check_parity(model_name: str, texts: List[str],
+                 onnx_dir: str = 'storage/onnx', quantize: bool = True) -> Dict[str, Any]:
+    """
+    Compare ONNX embeddings against the PyTorch SentenceTransformer vectors
+
+    Args:
+        model_name: Hugging Face sentence-transformers model name
+        texts: Sample texts to embed with both backends
+        onnx_dir: Directory holding exported models
+        quantize: Check the int8-quantized model instead of the fp32 one
+
+    Returns:
+        Dictionary with min/mean cosine similarity and max absolute difference
+    """
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device='cpu').encode(texts, convert_to_tensor=False)
+    candidate = OnnxSentenceEncoder(model_name, onnx_dir=onnx_dir, quantize=quantize).encode(texts)
+
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    normalized = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (reference * normalized).sum(axis=1)
+
+    return {
+        'model_name': model_name,
+        'quantized': quantize,
+        'samples': len(texts),
+        'min_cosine': float(cosines.min()),
+        'mean_cosine': float(cosines.mean()),
+        'max_abs_diff': float(np.abs(reference - normalized).max())
+    }
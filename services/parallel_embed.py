@@ -0,0 +1,120 @@
+"""
+Parallel embedding service
+Spreads embedding of large ingestion jobs across a pool of worker processes,
+each holding its own model copy, and streams results back in order
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# Per-process embedding service, created by _init_worker in each pool process
+_worker_service = None
+
+
+def _init_worker(threads_per_worker: int):
+    """Pool initializer: cap native thread pools, then load the model once"""
+    global _worker_service
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads_per_worker)
+    # Workers must not start their own micro-batcher or nested pools
+    os.environ['EMBEDDING_BATCH_MAX_WAIT_MS'] = '0'
+
+    from services.embeddings import EmbeddingService
+    _worker_service = EmbeddingService()
+    _worker_service.set_num_threads(threads_per_worker)
+
+
+def _embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed one batch of texts in a pool process"""
+    return _worker_service.batch_encode(texts)
+
+
+class ParallelEmbedder:
+    """Multi-process embedder for large ingestion jobs"""
+
+    def __init__(self, num_workers: int = None,
+                 threads_per_worker: int = None,
+                 texts_per_task: int = None):
+        """
+        Initialize the process pool
+
+        Args:
+            num_workers: Number of worker processes (one model copy each)
+            threads_per_worker: Native threads per worker process
+            texts_per_task: Number of texts sent to a worker at a time
+        """
+        cpu_count = os.cpu_count() or 1
+        self.num_workers = num_workers or int(os.getenv('EMBEDDING_WORKERS', 0)) or cpu_count
+        self.threads_per_worker = threads_per_worker or int(os.getenv('EMBEDDING_THREADS_PER_WORKER', 0)) \
+            or max(1, cpu_count // self.num_workers)
+        self.texts_per_task = texts_per_task or int(os.getenv('EMBEDDING_TEXTS_PER_TASK', 256))
+        # spawn: forking a parent that already ran torch can deadlock OpenMP
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker,)
+        )
+        print(f"Started {self.num_workers} embedding workers ({self.threads_per_worker} threads each)")
+
+    def embed_stream(self, items: Iterable[Tuple[Any, List[str]]]) -> Iterator[Tuple[Any, np.ndarray]]:
+        """
+        Embed a stream of (key, texts) items, yielding (key, embeddings) in input order
+
+        Each item's texts are split into tasks of texts_per_task so a single
+        large document is spread over all workers. At most two tasks per
+        worker are in flight, so the input stream is consumed lazily.
+
+        Args:
+            items: Iterable of (key, list of texts)
+
+        Yields:
+            (key, float32 array of shape (len(texts), dim)) per item, or
+            (key, None) if embedding that item failed
+        """
+        max_in_flight = self.num_workers * 2
+        pending = deque()  # (key, [futures]) in submission order
+        in_flight = 0
+
+        def finish_oldest():
+            key, futures = pending.popleft()
+            try:
+                parts = [future.result() for future in futures]
+                embeddings = np.concatenate(parts, axis=0) if parts else None
+            except Exception as e:
+                print(f"Error embedding {key}: {e}")
+                embeddings = None
+            return len(futures), (key, embeddings)
+
+        for key, texts in items:
+            futures = [
+                self._executor.submit(_embed_texts, texts[i:i + self.texts_per_task])
+                for i in range(0, len(texts), self.texts_per_task)
+            ]
+            pending.append((key, futures))
+            in_flight += len(futures)
+
+            while in_flight > max_in_flight and len(pending) > 1:
+                done, result = finish_oldest()
+                in_flight -= done
+                yield result
+
+        while pending:
+            done, result = finish_oldest()
+            in_flight -= done
+            yield result
+
+    def close(self) -> None:
+        """Shut down the worker processes"""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
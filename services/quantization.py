@@ -0,0 +1,246 @@
+"""
+Vector quantization
+Compressed codes for the local vector store: per-dimension scalar int8
+quantization (4x smaller) and product quantization (up to 32x smaller).
+Queries score the codes directly and re-rank a shortlist with the
+full-precision vectors.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class ScalarQuantizer:
+    """Per-dimension int8 quantizer (one byte per dimension)"""
+
+    kind = 'int8'
+
+    def __init__(self, dimension: int, min_train_size: int = 1000,
+                 max_train_sample: int = 65536):
+        """
+        Initialize scalar quantizer
+
+        Args:
+            dimension: Embedding dimension
+            min_train_size: Namespace size at which the quantizer is trained
+            max_train_sample: Maximum number of vectors used to fit the value range
+        """
+        self.dimension = dimension
+        self.min_train_size = min_train_size
+        self.max_train_sample = max_train_sample
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.offset is not None
+
+    @property
+    def code_size(self) -> int:
+        """Bytes per encoded vector"""
+        return self.dimension
+
+    def needs_training(self, size: int) -> bool:
+        """Train once the namespace is big enough, retrain after it grew 4x"""
+        if not self.is_trained:
+            return size >= self.min_train_size
+        return size >= 4 * self.trained_size
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Fit the per-dimension value range (values outside it are clipped)"""
+        sample = vectors
+        if len(vectors) > self.max_train_sample:
+            rng = np.random.default_rng(0)
+            sample = vectors[np.sort(rng.choice(len(vectors), self.max_train_sample, replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+        low = sample.min(axis=0)
+        high = sample.max(axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = (np.maximum(high - low, 1e-8) / 255.0).astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode (n, dim) vectors as (n, dim) uint8 codes"""
+        codes = np.rint((vectors - self.offset) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray, block_size: int = 16384) -> np.ndarray:
+        """
+        Approximate dot products between a query and encoded vectors
+
+        Args:
+            codes: (n, dim) uint8 codes
+            query: (dim,) float32 query
+            block_size: Rows decoded at a time (bounds the float32 temporary)
+
+        Returns:
+            (n,) float32 scores
+        """
+        # q . (offset + scale * code) = q . offset + (q * scale) . code
+        weights = query * self.scale
+        bias = float(query @ self.offset)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block_size):
+            out[start:start + block_size] = codes[start:start + block_size].astype(np.float32) @ weights
+        return out + bias
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore the trained quantizer"""
+        return {'offset': self.offset, 'scale': self.scale,
+                'trained_size': np.asarray(self.trained_size)}
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore a trained quantizer saved with get_state"""
+        self.offset = state['offset'].astype(np.float32)
+        self.scale = state['scale'].astype(np.float32)
+        self.trained_size = int(state['trained_size'])
+
+
+class ProductQuantizer:
+    """Product quantizer: m sub-vectors, each encoded as one of 256 centroids"""
+
+    kind = 'pq'
+
+    def __init__(self, dimension: int, m: int = 0, min_train_size: int = 1000,
+                 max_train_sample: int = 8192):
+        """
+        Initialize product quantizer
+
+        Args:
+            dimension: Embedding dimension
+            m: Number of sub-quantizers / bytes per vector (0 picks dimension // 4)
+            min_train_size: Namespace size at which the quantizer is trained
+            max_train_sample: Maximum number of vectors used for k-means
+        """
+        m = m or max(1, dimension // 4)
+        if dimension % m != 0:
+            raise ValueError(f"PQ sub-quantizer count {m} must divide dimension {dimension}")
+        self.dimension = dimension
+        self.m = m
+        self.dsub = dimension // m
+        self.min_train_size = max(min_train_size, 256)
+        self.max_train_sample = max_train_sample
+        self.codebooks: Optional[np.ndarray] = None  # (m, 256, dsub)
+        self.trained_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def code_size(self) -> int:
+        """Bytes per encoded vector"""
+        return self.m
+
+    def needs_training(self, size: int) -> bool:
+        """Train once the namespace is big enough, retrain after it grew 4x"""
+        if not self.is_trained:
+            return size >= self.min_train_size
+        return size >= 4 * self.trained_size
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, seed: int = 0) -> None:
+        """Run k-means on every sub-vector space at once (batched Lloyd iterations)"""
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > self.max_train_sample:
+            sample = vectors[np.sort(rng.choice(len(vectors), self.max_train_sample, replace=False))]
+        sample = np.ascontiguousarray(sample, dtype=np.float32).reshape(len(sample), self.m, self.dsub)
+        n, ksub = len(sample), 256
+
+        # (m, 256, dsub); fewer samples than centroids just duplicates some
+        init = rng.choice(n, ksub, replace=n < ksub)
+        codebooks = np.ascontiguousarray(sample[init].transpose(1, 0, 2))
+        offsets = np.arange(self.m) * ksub
+
+        for _ in range(iterations):
+            slots = (self._assign(sample, codebooks) + offsets).ravel()
+            counts = np.bincount(slots, minlength=self.m * ksub).astype(np.float32)
+            # Per-centroid sums via one weighted bincount per sub-vector dimension
+            sums = np.stack([np.bincount(slots, weights=sample[:, :, d].ravel(), minlength=self.m * ksub)
+                             for d in range(self.dsub)], axis=1).astype(np.float32)
+
+            # Re-seed empty centroids from random points of the same sub-space
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                picks = rng.integers(0, n, len(empty))
+                sums[empty] = sample[picks, empty // ksub, :]
+                counts[empty] = 1
+            codebooks = (sums / counts[:, None]).reshape(self.m, ksub, self.dsub)
+
+        self.codebooks = np.ascontiguousarray(codebooks, dtype=np.float32)
+        self.trained_size = len(vectors)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode (n, dim) vectors as (n, m) uint8 codes"""
+        sub_vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.m, self.dsub)
+        return self._assign(sub_vectors, self.codebooks).astype(np.uint8)
+
+    def _assign(self, sub_vectors: np.ndarray, codebooks: np.ndarray, block_size: int = 256) -> np.ndarray:
+        """Closest (L2) centroid per sub-vector: (n, m, dsub) -> (n, m)"""
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+        half_norms = 0.5 * np.einsum('jkd,jkd->jk', codebooks, codebooks)[:, None, :]
+        codebooks_t = codebooks.transpose(0, 2, 1)
+        assign = np.empty(sub_vectors.shape[:2], dtype=np.int64)
+        for start in range(0, len(sub_vectors), block_size):
+            block = sub_vectors[start:start + block_size].transpose(1, 0, 2)  # (m, b, dsub)
+            assign[start:start + block_size] = np.argmax(block @ codebooks_t - half_norms, axis=2).T
+        return assign
+
+    def scores(self, codes: np.ndarray, query: np.ndarray, block_size: int = 16384) -> np.ndarray:
+        """
+        Approximate dot products between a query and encoded vectors (asymmetric
+        distance computation: one lookup table per query, no decoding)
+
+        Args:
+            codes: (n, m) uint8 codes
+            query: (dim,) float32 query
+            block_size: Rows scored at a time
+
+        Returns:
+            (n,) float32 scores
+        """
+        tables = np.einsum('jkd,jd->jk', self.codebooks, query.reshape(self.m, self.dsub))
+        flat_tables = tables.ravel()
+        # Offset each sub-quantizer's code into its row of the flattened table
+        offsets = (np.arange(self.m) * 256).astype(np.intp)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block_size):
+            block = codes[start:start + block_size].astype(np.intp) + offsets
+            out[start:start + block_size] = flat_tables[block].sum(axis=1)
+        return out
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore the trained quantizer"""
+        return {'codebooks': self.codebooks, 'trained_size': np.asarray(self.trained_size)}
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore a trained quantizer saved with get_state"""
+        codebooks = state['codebooks'].astype(np.float32)
+        if codebooks.shape[0] != self.m:
+            raise ValueError(f"Saved PQ has {codebooks.shape[0]} sub-quantizers, expected {self.m}")
+        self.codebooks = codebooks
+        self.trained_size = int(state['trained_size'])
+
+
+def create_quantizer(kind: str, dimension: int, pq_m: int = 0, min_train_size: int = 1000):
+    """
+    Build the quantizer selected by LOCAL_INDEX_COMPRESSION
+
+    Args:
+        kind: 'none', 'int8' or 'pq'
+        dimension: Embedding dimension
+        pq_m: PQ sub-quantizer count (0 picks dimension // 4)
+        min_train_size: Namespace size at which the quantizer is trained
+
+    Returns:
+        A quantizer, or None for uncompressed storage
+    """
+    if kind == 'none':
+        return None
+    if kind == 'int8':
+        return ScalarQuantizer(dimension, min_train_size=min_train_size)
+    if kind == 'pq':
+        return ProductQuantizer(dimension, m=pq_m, min_train_size=min_train_size)
+    raise ValueError(f"Unknown LOCAL_INDEX_COMPRESSION: {kind}")
@@ -4,31 +4,129 @@ Handles query processing, retrieval, and medical response generation
 """
 
 import os
-import requests
+import time
 import json
-from typing import List, Dict, Any, Optional
+import numpy as np
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from services.embeddings import EmbeddingService
-from services.vector_store import VectorStore
+from services.vector_store import BaseVectorStore
+from services.bm25_index import LexicalIndex
+from services.reranker import CrossEncoderReranker
+from services.diversify import mmr_select, suppress_duplicates
+from services.context_packer import ContextPacker
+from services.answer_cache import SemanticAnswerCache
+from services.llm_client import LLMError, OpenRouterClient
 import logging
 
 logger = logging.getLogger(__name__)
 
+# X-Title headers OpenRouter attributes each kind of call to
+RAG_APP_TITLE = "RAG Career Chatbot"
+FALLBACK_APP_TITLE = "RAG Medical Chatbot"
+
+# Per-request retrieval overrides accepted by RAGService.query
+RETRIEVAL_OPTIONS = ('mmr', 'mmr_lambda', 'dedup')
+_TRUE_VALUES = {'1', 'true'}
+_FALSE_VALUES = {'0', 'false'}
+
+def parse_retrieval_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Validate per-request retrieval overrides
+    
+    Args:
+        options: Any of 'mmr' and 'dedup' (True/False, 1/0 or "true"/"false"/"1"/"0")
+            and 'mmr_lambda' (a number from 0 to 1); other keys are ignored
+            
+    Returns:
+        The given overrides as bools and a float
+        
+    Raises:
+        ValueError: If a value cannot be parsed
+    """
+    parsed = {}
+    for key in ('mmr', 'dedup'):
+        if key not in (options or {}):
+            continue
+        value = options[key]
+        text = str(value).strip().lower() if isinstance(value, (bool, int, str)) else None
+        if text in _TRUE_VALUES:
+            parsed[key] = True
+        elif text in _FALSE_VALUES:
+            parsed[key] = False
+        else:
+            raise ValueError(f"'{key}' must be true or false, got {value!r}")
+    if 'mmr_lambda' in (options or {}):
+        value = options['mmr_lambda']
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            mmr_lambda = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'mmr_lambda' must be a number, got {value!r}")
+        if not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError(f"'mmr_lambda' must be between 0 and 1, got {value!r}")
+        parsed['mmr_lambda'] = mmr_lambda
+    return parsed
+
 class RAGService:
     """Orchestrates RAG pipeline for medical guidance chatbot"""
     
-    def __init__(self):
-        """Initialize RAG service with dependencies"""
-        self.embedding_service = EmbeddingService()
-        self.vector_store = VectorStore()
-        self.openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
-        self.openrouter_model = os.getenv('OPENROUTER_MODEL', 'openrouter/auto')
-        self.openrouter_url = "https://openrouter.ai/api/v1/chat/completions"
-        
-        if not self.openrouter_api_key:
+    def __init__(self, embedding_service: Optional[EmbeddingService] = None,
+                 vector_store: Optional[BaseVectorStore] = None,
+                 lexical_index: Optional[LexicalIndex] = None,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 context_packer: Optional[ContextPacker] = None,
+                 answer_cache: Optional[SemanticAnswerCache] = None,
+                 llm_client: Optional[OpenRouterClient] = None):
+        """
+        Initialize RAG service with dependencies
+        
+        Args:
+            embedding_service: Shared embedding service (defaults to the registry's)
+            vector_store: Shared vector store (defaults to the registry's)
+            lexical_index: BM25 index fused with dense results (defaults to the registry's)
+            reranker: Optional cross-encoder re-ranking stage
+            context_packer: Token-budgeted context builder (defaults to the registry's)
+            answer_cache: Optional cache of LLM answers for rephrased questions
+            llm_client: Pooled OpenRouter client (defaults to the registry's)
+        """
+        if embedding_service is None or vector_store is None or context_packer is None or llm_client is None:
+            from services.registry import registry
+            embedding_service = embedding_service or registry.embedding_service
+            vector_store = vector_store or registry.vector_store
+            lexical_index = lexical_index or registry.lexical_index
+            context_packer = context_packer or registry.context_packer
+            llm_client = llm_client or registry.llm_client
+        self.context_packer = context_packer
+        self.answer_cache = answer_cache
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.top_k = int(os.getenv('RETRIEVAL_TOP_K', 8))
+        # Hybrid retrieval: dense and BM25 candidates merged by reciprocal-rank fusion
+        self.hybrid_retrieval = os.getenv('HYBRID_RETRIEVAL', '1') != '0' and lexical_index is not None
+        self.hybrid_candidates = int(os.getenv('HYBRID_CANDIDATES', 20))
+        self.rrf_k = int(os.getenv('HYBRID_RRF_K', 60))
+        # Re-ranking over-fetches candidates and must finish within the budget,
+        # counted from the start of the request
+        self.reranker = reranker
+        self.rerank_candidates = int(os.getenv('RERANK_CANDIDATES', 50))
+        self.rerank_budget_ms = float(os.getenv('RERANK_LATENCY_BUDGET_MS', 300))
+        # Diversification: near-duplicate suppression, then MMR picks the top_k
+        # out of mmr_candidates (both overridable per request)
+        self.mmr_enabled = os.getenv('RETRIEVAL_MMR', '1') != '0'
+        self.mmr_lambda = float(os.getenv('MMR_LAMBDA', 0.7))
+        self.mmr_candidates = int(os.getenv('MMR_CANDIDATES', 20))
+        self.dedup_enabled = os.getenv('RETRIEVAL_DEDUP', '1') != '0'
+        self.dedup_similarity = float(os.getenv('DEDUP_SIMILARITY', 0.95))
+        self.llm_client = llm_client
+        
+        if not self.llm_client.enabled:
             print("Warning: OPENROUTER_API_KEY not found. LLM responses will be disabled.")
     
     def query(self, user_query: str, persona: str = "doctor", 
-              namespace: str = "default") -> Dict[str, Any]:
+              namespace: str = "default",
+              retrieval_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Process user query through RAG pipeline with OpenRouter fallback
         
@@ -36,50 +134,55 @@ class RAGService:
             user_query: User's medical question
             persona: AI persona (doctor/specialist/nurse)
             namespace: Vector store namespace
+            retrieval_options: Per-request overrides ('mmr', 'mmr_lambda', 'dedup')
             
         Returns:
             Response dictionary with answer and sources
         """
         try:
-            # Step 1: Generate query embedding
-            query_embedding = self.embedding_service.generate_embedding(user_query)
-            
-            # Step 2: Retrieve relevant chunks
-            retrieved_chunks = self.vector_store.search_similar(
-                query_embedding=query_embedding,
-                top_k=8,
-                namespace=namespace
+            # Steps 1-2: Embed the query and retrieve relevant chunks
+            query_embedding, retrieved_chunks, chunk_ids, version, cached = self._retrieve_for_query(
+                user_query, persona, namespace, retrieval_options
             )
-            logger.info(f"Retrieved {len(retrieved_chunks)} chunks for query '{user_query}' in namespace '{namespace}'.")
-            for i, chunk in enumerate(retrieved_chunks):
-                logger.debug(f"Chunk {i+1}: Filename={chunk.get('filename', 'N/A')}, Score={chunk.get('score', 'N/A')}, Text_Preview={chunk.get('text', '')[:100]}...")
+            if cached is not None:
+                return cached
             
             # Step 3: Check if we have sufficient relevant data
             has_sufficient_data = self._check_data_sufficiency(retrieved_chunks)
             
             if not has_sufficient_data:
                 # Use OpenRouter's knowledge base as fallback
-                return self._generate_openrouter_fallback(user_query, persona, retrieved_chunks)
+                response = self._generate_openrouter_fallback(user_query, persona, retrieved_chunks)
+                if response.get('fallback_used'):
+                    self._cache_answer(namespace, persona, query_embedding, chunk_ids, version, response)
+                return response
             
             # Step 4: Build context with citations
-            context, sources = self._build_context_with_citations(retrieved_chunks)
+            context, sources, context_tokens = self._build_context_with_citations(retrieved_chunks)
             
             # Step 5: Generate response using LLM with context
-            if self.openrouter_api_key:
+            response_text = None
+            if self.llm_client.enabled:
                 response_text = self._generate_llm_response(
                     user_query, context, persona, sources
                 )
-            else:
+            generated = response_text is not None
+            if not generated:
                 response_text = self._create_simple_response(context, sources)
             
-            return {
+            response = {
                 'answer': response_text,
                 'sources': sources,
                 'retrieved_chunks': len(retrieved_chunks),
+                'context_tokens': context_tokens,
                 'persona': persona,
                 'query': user_query,
                 'data_source': 'pdf_documents'
             }
+            # Only LLM answers are worth caching; the simple response is cheap and degraded
+            if generated:
+                self._cache_answer(namespace, persona, query_embedding, chunk_ids, version, response)
+            return response
             
         except Exception as e:
             print(f"Error in RAG query: {e}")
@@ -92,6 +195,284 @@ class RAGService:
                 'error': str(e)
             }
     
+    def query_stream(self, user_query: str, persona: str = "doctor",
+                     namespace: str = "default",
+                     retrieval_options: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Process user query like query(), streaming the answer as the LLM generates it
+        
+        Args:
+            user_query: User's medical question
+            persona: AI persona (doctor/specialist/nurse)
+            namespace: Vector store namespace
+            retrieval_options: Per-request overrides ('mmr', 'mmr_lambda', 'dedup')
+            
+        Yields:
+            ('token', text) events for the answer as it arrives, then one
+            ('done', response) event with the response dictionary of query()
+            (sources and metadata; 'answer' holds the whole answer), or one
+            ('error', {'error': message}) event
+        """
+        started = time.perf_counter()
+        try:
+            query_embedding, retrieved_chunks, chunk_ids, version, cached = self._retrieve_for_query(
+                user_query, persona, namespace, retrieval_options
+            )
+            if cached is not None:
+                yield 'token', cached['answer']
+                yield 'done', {**cached, 'first_token_ms': round((time.perf_counter() - started) * 1000, 1)}
+                return
+            
+            if not self._check_data_sufficiency(retrieved_chunks):
+                response = {
+                    'sources': [],
+                    'retrieved_chunks': len(retrieved_chunks),
+                    'persona': persona,
+                    'query': user_query,
+                    'data_source': 'openrouter_knowledge_base',
+                    'fallback_used': True
+                }
+                prompts = self._build_fallback_prompts(user_query, persona, retrieved_chunks)
+                title = FALLBACK_APP_TITLE
+                degraded = lambda: self._create_fallback_response(user_query, persona)
+            else:
+                context, sources, context_tokens = self._build_context_with_citations(retrieved_chunks)
+                response = {
+                    'sources': sources,
+                    'retrieved_chunks': len(retrieved_chunks),
+                    'context_tokens': context_tokens,
+                    'persona': persona,
+                    'query': user_query,
+                    'data_source': 'pdf_documents'
+                }
+                prompts = self._build_rag_prompts(user_query, context, persona)
+                title = RAG_APP_TITLE
+                degraded = lambda: {**response, 'answer': self._create_simple_response(context, sources)}
+            
+            parts = []
+            first_token_ms = None
+            if self.llm_client.enabled:
+                try:
+                    for text in self.llm_client.stream(*prompts, title=title):
+                        if first_token_ms is None:
+                            first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                        parts.append(text)
+                        yield 'token', text
+                except LLMError as e:
+                    print(e)
+                    if parts:
+                        # Tokens already sent cannot be taken back; flag the answer as cut short
+                        response['incomplete'] = True
+            
+            if parts:
+                response['answer'] = ''.join(parts)
+                if not response.get('incomplete'):
+                    self._cache_answer(namespace, persona, query_embedding, chunk_ids, version, response)
+            else:
+                response = degraded()
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield 'token', response['answer']
+            
+            logger.info(f"Streamed answer for query '{user_query}': first token after {first_token_ms} ms.")
+            yield 'done', {**response, 'first_token_ms': first_token_ms}
+            
+        except Exception as e:
+            print(f"Error in streaming RAG query: {e}")
+            yield 'error', {'error': str(e)}
+    
+    def _retrieve_for_query(self, user_query: str, persona: str, namespace: str,
+                            retrieval_options: Optional[Dict[str, Any]] = None):
+        """
+        Embed a query, retrieve its chunks and look up a cached answer
+        
+        Args:
+            user_query: User's question
+            persona: AI persona
+            namespace: Vector store namespace
+            retrieval_options: Per-request retrieval overrides
+            
+        Returns:
+            Tuple of (query_embedding, retrieved_chunks, chunk_ids, namespace
+            version read before retrieval, cached_response or None)
+        """
+        started = time.perf_counter()
+        # Read before retrieval: an answer is only cached if no ingest came in between
+        version = self.answer_cache.version(namespace) if self.answer_cache is not None else None
+        # Step 1: Generate query embedding
+        query_embedding = self.embedding_service.generate_embedding(user_query)
+        
+        # Step 2: Retrieve relevant chunks
+        deadline = started + self.rerank_budget_ms / 1000 if self.rerank_budget_ms > 0 else None
+        retrieved_chunks = self._retrieve(user_query, query_embedding, namespace, deadline,
+                                          retrieval_options)
+        logger.info(f"Retrieved {len(retrieved_chunks)} chunks for query '{user_query}' in namespace '{namespace}'.")
+        for i, chunk in enumerate(retrieved_chunks):
+            logger.debug(f"Chunk {i+1}: Filename={chunk.get('filename', 'N/A')}, Score={chunk.get('score', 'N/A')}, Text_Preview={chunk.get('text', '')[:100]}...")
+        
+        # A rephrasing of an answered question with the same chunks reuses the answer
+        chunk_ids = [chunk.get('id') for chunk in retrieved_chunks]
+        cached = None
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(namespace, persona, query_embedding, chunk_ids)
+            if cached is not None:
+                logger.info(f"Answer cache hit for query '{user_query}' in namespace '{namespace}'.")
+                cached = {**cached, 'query': user_query, 'cached': True}
+        return query_embedding, retrieved_chunks, chunk_ids, version, cached
+    
+    def _cache_answer(self, namespace: str, persona: str, query_embedding,
+                      chunk_ids: List[str], version: Optional[int], response: Dict[str, Any]) -> None:
+        """Store an LLM answer in the answer cache, if there is one"""
+        if self.answer_cache is None:
+            return
+        try:
+            self.answer_cache.put(namespace, persona, query_embedding, chunk_ids, response, version)
+        except Exception as e:
+            print(f"Error caching answer: {e}")
+    
+    def _retrieve(self, query: str, query_embedding, namespace: str,
+                  deadline: Optional[float] = None,
+                  options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieve the top chunks for a query: dense or hybrid, near-duplicates
+        dropped, optionally re-ranked, then diversified by MMR
+        
+        Args:
+            query: User's question
+            query_embedding: Embedding of the question
+            namespace: Vector store namespace
+            deadline: time.perf_counter() value re-ranking must finish by
+            options: Per-request overrides ('mmr', 'mmr_lambda', 'dedup')
+            
+        Returns:
+            Retrieved chunks, best first
+        """
+        options = parse_retrieval_options(options)
+        use_mmr = options.get('mmr', self.mmr_enabled)
+        use_dedup = options.get('dedup', self.dedup_enabled)
+        mmr_lambda = options.get('mmr_lambda', min(1.0, max(0.0, self.mmr_lambda)))
+        # Stored vectors are only fetched when a stage compares them
+        include_values = use_mmr or use_dedup
+        
+        # Re-ranking and MMR pick the top_k out of a larger candidate pool
+        pool_size = self.top_k
+        if self.reranker:
+            pool_size = max(pool_size, self.rerank_candidates)
+        if use_mmr:
+            pool_size = max(pool_size, self.mmr_candidates)
+        
+        if not self.hybrid_retrieval:
+            candidates = self.vector_store.search_similar(
+                query_embedding=query_embedding,
+                top_k=pool_size,
+                namespace=namespace,
+                include_values=include_values
+            )
+        else:
+            dense = self.vector_store.search_similar(
+                query_embedding=query_embedding,
+                top_k=max(pool_size, self.hybrid_candidates),
+                namespace=namespace,
+                include_values=include_values
+            )
+            try:
+                lexical = self.lexical_index.search(query, max(pool_size, self.hybrid_candidates), namespace)
+            except Exception as e:
+                print(f"Error in BM25 search: {e}")
+                lexical = []
+            candidates = self._fuse_rankings(dense, lexical, namespace, pool_size,
+                                             query_embedding, include_values)[:pool_size]
+        
+        if use_dedup:
+            candidates = suppress_duplicates(candidates, self.dedup_similarity)
+        
+        if self.reranker is not None:
+            try:
+                candidates = self.reranker.rerank(query, candidates, self.top_k, deadline,
+                                                  limit=len(candidates) if use_mmr else self.top_k)
+            except Exception as e:
+                print(f"Error re-ranking: {e}")
+        
+        if use_mmr:
+            candidates = mmr_select(query_embedding, candidates, self.top_k, mmr_lambda,
+                                    self._rerank_relevance(candidates))
+        
+        # Vectors are not part of the result (and not JSON serializable)
+        return [{key: value for key, value in chunk.items() if key != 'values'}
+                for chunk in candidates[:self.top_k]]
+    
+    @staticmethod
+    def _rerank_relevance(chunks: List[Dict[str, Any]]):
+        """
+        MMR relevance from cross-encoder scores, scaled to [0, 1]
+        
+        Chunks the re-ranker did not reach (budget truncation) get 0. Returns
+        None, so MMR falls back to query similarity, if nothing was re-ranked.
+        """
+        scores = [chunk.get('rerank_score') for chunk in chunks]
+        scored = [score for score in scores if score is not None]
+        if not scored:
+            return None
+        low, high = min(scored), max(scored)
+        span = (high - low) or 1.0
+        return [(score - low) / span if score is not None else 0.0 for score in scores]
+    
+    def _fuse_rankings(self, dense: List[Dict[str, Any]], lexical: List[tuple],
+                       namespace: str, limit: int, query_embedding: np.ndarray,
+                       include_values: bool = False) -> List[Dict[str, Any]]:
+        """
+        Merge dense and BM25 rankings with reciprocal-rank fusion
+        
+        Each chunk scores sum(1 / (rrf_k + rank)) over the rankings it appears
+        in. 'score' stays the dense cosine similarity; BM25-only hits are loaded
+        by ID with their vectors and scored against the query the same way.
+        'fusion_score' and 'bm25_score' are added.
+        
+        Args:
+            dense: Dense search results, best first
+            lexical: (vector ID, BM25 score) pairs, best first
+            namespace: Vector store namespace
+            limit: Number of fused results that will be used
+            query_embedding: Query vector, to score BM25-only hits
+            include_values: Keep the vectors of BM25-only hits under 'values'
+            
+        Returns:
+            Chunks ordered by fused score
+        """
+        fused: Dict[str, float] = {}
+        for rank, chunk in enumerate(dense, 1):
+            fused[chunk['id']] = fused.get(chunk['id'], 0.0) + 1.0 / (self.rrf_k + rank)
+        for rank, (vector_id, _) in enumerate(lexical, 1):
+            fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (self.rrf_k + rank)
+        
+        chunks = {chunk['id']: chunk for chunk in dense}
+        ranked_ids = sorted(fused, key=fused.get, reverse=True)
+        # Only BM25 hits that can still make the cut are loaded
+        missing = [vector_id for vector_id in ranked_ids[:limit] if vector_id not in chunks]
+        if missing:
+            loaded = self.vector_store.get_vectors(missing, namespace, include_values=True)
+            if loaded:
+                query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+                query = query / max(float(np.linalg.norm(query)), 1e-12)
+                values = np.stack([np.asarray(chunk['values'], dtype=np.float32) for chunk in loaded])
+                norms = np.maximum(np.linalg.norm(values, axis=1), 1e-12)
+                similarities = values @ query / norms
+                for chunk, similarity in zip(loaded, similarities):
+                    chunk['score'] = float(similarity)
+                    if not include_values:
+                        del chunk['values']
+                    chunks[chunk['id']] = chunk
+        
+        bm25_scores = dict(lexical)
+        results = []
+        for vector_id in ranked_ids:
+            chunk = chunks.get(vector_id)
+            if chunk is None:
+                continue
+            results.append({**chunk,
+                            'fusion_score': fused[vector_id],
+                            'bm25_score': bm25_scores.get(vector_id, 0.0)})
+        return results
+    
     def _check_data_sufficiency(self, chunks: List[Dict[str, Any]]) -> bool:
         """
         Check if retrieved chunks provide sufficient relevant data
@@ -128,108 +509,64 @@ class RAGService:
         Returns:
             Response dictionary
         """
-        if not self.openrouter_api_key:
+        if not self.llm_client.enabled:
             return self._create_fallback_response(query, persona)
         
         try:
-            # Create persona-specific system prompt for general medical knowledge
-            system_prompt = self._get_persona_prompt(persona) + """
-            
-            You are responding based on your general medical knowledge. The user's question may not be fully covered by their uploaded documents, so provide comprehensive medical information based on established medical knowledge and best practices. Always emphasize that this is for informational purposes only and that they should consult healthcare professionals for medical advice."""
+            answer = self.llm_client.complete(*self._build_fallback_prompts(query, persona, retrieved_chunks),
+                                             title=FALLBACK_APP_TITLE)
             
-            # Include any relevant context from retrieved chunks if available
-            context_note = ""
-            if retrieved_chunks:
-                context_note = f"\n\nNote: Some information from uploaded documents may be relevant, but the response below is primarily based on general medical knowledge."
-            
-            user_prompt = f"""Please provide a comprehensive answer to this medical question: {query}
-
-{context_note}
-
-Please provide detailed, accurate medical information while emphasizing that this is for informational purposes only and that professional medical consultation is recommended."""
-            
-            # Make API request to OpenRouter
-            headers = {
-                "Authorization": f"Bearer {self.openrouter_api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:8000",
-                "X-Title": "RAG Medical Chatbot"
-            }
-            
-            payload = {
-                "model": self.openrouter_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 200  # Reduced max_tokens for shorter output
+            return {
+                'answer': answer,
+                'sources': [],  # No specific sources since using general knowledge
+                'retrieved_chunks': len(retrieved_chunks),
+                'persona': persona,
+                'query': query,
+                'data_source': 'openrouter_knowledge_base',
+                'fallback_used': True
             }
-            
-            response = requests.post(
-                self.openrouter_url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                answer = result['choices'][0]['message']['content']
-                
-                return {
-                    'answer': answer,
-                    'sources': [],  # No specific sources since using general knowledge
-                    'retrieved_chunks': len(retrieved_chunks),
-                    'persona': persona,
-                    'query': query,
-                    'data_source': 'openrouter_knowledge_base',
-                    'fallback_used': True
-                }
-            else:
-                print(f"OpenRouter API error: {response.status_code} - {response.text}")
-                return self._create_fallback_response(query, persona)
                 
+        except LLMError as e:
+            print(e)
+            return self._create_fallback_response(query, persona)
         except Exception as e:
             print(f"Error in OpenRouter fallback: {e}")
             return self._create_fallback_response(query, persona)
     
-    def _build_context_with_citations(self, chunks: List[Dict[str, Any]]) -> tuple[str, List[Dict[str, Any]]]:
+    def _build_fallback_prompts(self, query: str, persona: str,
+                                retrieved_chunks: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """System and user prompts for answering from general medical knowledge"""
+        # Create persona-specific system prompt for general medical knowledge
+        system_prompt = self._get_persona_prompt(persona) + """
+        
+        You are responding based on your general medical knowledge. The user's question may not be fully covered by their uploaded documents, so provide comprehensive medical information based on established medical knowledge and best practices. Always emphasize that this is for informational purposes only and that they should consult healthcare professionals for medical advice."""
+        
+        # Include any relevant context from retrieved chunks if available
+        context_note = ""
+        if retrieved_chunks:
+            context_note = f"\n\nNote: Some information from uploaded documents may be relevant, but the response below is primarily based on general medical knowledge."
+        
+        user_prompt = f"""Please provide a comprehensive answer to this medical question: {query}
+
+{context_note}
+
+Please provide detailed, accurate medical information while emphasizing that this is for informational purposes only and that professional medical consultation is recommended."""
+        return system_prompt, user_prompt
+    
+    def _build_context_with_citations(self, chunks: List[Dict[str, Any]]) -> tuple[str, List[Dict[str, Any]], int]:
         """
-        Build context string with source citations
+        Build context string with source citations, within the context token budget
         
         Args:
-            chunks: Retrieved text chunks
+            chunks: Retrieved text chunks, best first
             
         Returns:
-            Tuple of (context_string, sources_list)
+            Tuple of (context_string, sources_list, context_tokens)
         """
-        context_parts = []
-        sources = []
-        
-        for i, chunk in enumerate(chunks, 1):
-            # Extract source information
-            filename = chunk.get('filename', 'Unknown')
-            chunk_id = chunk.get('chunk_id', 0)
-            text = chunk.get('text', '')
-            score = chunk.get('score', 0.0)
-            
-            # Create citation reference
-            citation = f"[{i}]"
-            source_info = {
-                'citation': citation,
-                'filename': filename,
-                'chunk_id': chunk_id,
-                'relevance_score': round(score, 3),
-                'text_preview': text[:200] + "..." if len(text) > 200 else text
-            }
-            sources.append(source_info)
-            
-            # Add to context with citation
-            context_parts.append(f"{citation} {text}")
-        
-        context = "\n\n".join(context_parts)
-        return context, sources
+        packed = self.context_packer.pack(chunks)
+        logger.info(f"Packed {packed['chunks_used']} of {len(chunks)} chunks into {len(packed['sources'])} "
+                    f"citations using {packed['tokens_used']}/{self.context_packer.max_tokens} context tokens.")
+        return packed['context'], packed['sources'], packed['tokens_used']
     
     def _generate_llm_response(self, query: str, context: str, 
                               persona: str, sources: List[Dict[str, Any]]) -> str:
@@ -243,14 +580,26 @@ Please provide detailed, accurate medical information while emphasizing that thi
             sources: List of source information
             
         Returns:
-            Generated response text
+            Generated response text, or None if the call failed
         """
         try:
-            # Create persona-specific system prompt
-            system_prompt = self._get_persona_prompt(persona)
-            
-            # Create user prompt with context
-            user_prompt = f"""Based on the following career guidance information, please answer the user's question. Use the provided sources to support your answer and include relevant citations.
+            return self.llm_client.complete(*self._build_rag_prompts(query, context, persona),
+                                           title=RAG_APP_TITLE)
+                
+        except LLMError as e:
+            print(e)
+            return None
+        except Exception as e:
+            print(f"Error generating LLM response: {e}")
+            return None
+    
+    def _build_rag_prompts(self, query: str, context: str, persona: str) -> Tuple[str, str]:
+        """System and user prompts for answering from the retrieved context"""
+        # Create persona-specific system prompt
+        system_prompt = self._get_persona_prompt(persona)
+        
+        # Create user prompt with context
+        user_prompt = f"""Based on the following career guidance information, please answer the user's question. Use the provided sources to support your answer and include relevant citations.
 
 Context Information:
 {context}
@@ -258,43 +607,7 @@ Context Information:
 User Question: {query}
 
 Please provide a helpful, accurate response based on the context above. Include relevant citations from the sources when appropriate."""
-
-            # Prepare API request
-            headers = {
-                "Authorization": f"Bearer {self.openrouter_api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:8000",
-                "X-Title": "RAG Career Chatbot"
-            }
-            
-            payload = {
-                "model": self.openrouter_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 200  # Reduced max_tokens for shorter output
-            }
-            
-            # Make API request
-            response = requests.post(
-                self.openrouter_url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
-            else:
-                print(f"OpenRouter API error: {response.status_code} - {response.text}")
-                return self._create_simple_response(context, sources)
-                
-        except Exception as e:
-            print(f"Error generating LLM response: {e}")
-            return self._create_simple_response(context, sources)
+        return system_prompt, user_prompt
     
     def _get_persona_prompt(self, persona: str) -> str:
         """
@@ -0,0 +1,265 @@
+"""
+Service registry
+Owns a single, lazily constructed instance of each heavyweight service so the
+Flask app and the RAG pipeline share one model and one vector store client
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict
+
+
+def _create_pdf_processor():
+    from services.pdf_ingest import PDFProcessor
+    return PDFProcessor()
+
+
+def _create_chunker():
+    from services.chunker import TextChunker
+    return TextChunker()
+
+
+def _create_embedding_service():
+    from services.embeddings import EmbeddingService
+    return EmbeddingService()
+
+
+def _create_vector_store():
+    from services.vector_store import create_vector_store
+    return create_vector_store()
+
+
+def _create_manifest():
+    from services.manifest import IngestionManifest
+    return IngestionManifest()
+
+
+def _create_lexical_index():
+    from services.bm25_index import LexicalIndex
+    # Look the vector store up per build so a post-fork client is used; a
+    # namespace is rebuilt once ingestion in any process bumps its version
+    return LexicalIndex(lambda namespace: registry.vector_store.iter_texts(namespace),
+                        version_source=registry.manifest.namespace_version)
+
+
+def _create_answer_cache():
+    from services.answer_cache import SemanticAnswerCache
+    # Ingestion in any process bumps the manifest's namespace version
+    return SemanticAnswerCache(version_source=registry.manifest.namespace_version)
+
+
+def _create_ingestion_service():
+    from services.ingestion import IngestionService
+    return IngestionService(
+        pdf_processor=registry.pdf_processor,
+        chunker=registry.chunker,
+        embedding_service=registry.embedding_service,
+        vector_store=registry.vector_store,
+        manifest=registry.manifest,
+        lexical_index=registry.lexical_index,
+        answer_cache=registry.answer_cache
+    )
+
+
+def _create_reranker():
+    from services.reranker import CrossEncoderReranker
+    return CrossEncoderReranker()
+
+
+def _create_context_packer():
+    from services.context_packer import ContextPacker
+    # Count prompt tokens with the encoding the chunker already loaded
+    return ContextPacker(registry.chunker.encoding)
+
+
+def _create_llm_client():
+    from services.llm_client import OpenRouterClient
+    return OpenRouterClient()
+
+
+def _create_rag_service():
+    from services.rag import RAGService
+    return RAGService(
+        embedding_service=registry.embedding_service,
+        vector_store=registry.vector_store,
+        lexical_index=registry.lexical_index,
+        reranker=registry.reranker if os.getenv('RERANK_ENABLED', '0') == '1' else None,
+        context_packer=registry.context_packer,
+        answer_cache=registry.answer_cache,
+        llm_client=registry.llm_client
+    )
+
+
+def _process_memory() -> Dict[str, int]:
+    """
+    Get this process's memory usage in kB
+
+    Pss/Shared come from /proc/self/smaps_rollup (Linux) and show how much of
+    the resident set is shared copy-on-write with the gunicorn master.
+    """
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                    usage[key.lower()] = int(value.split()[0])
+    except OSError:
+        try:
+            import resource
+            usage['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            pass
+    return usage
+
+
+class ServiceRegistry:
+    """Container holding one lazily constructed instance per service"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.warmup_seconds = None
+
+        self.register('pdf_processor', _create_pdf_processor)
+        self.register('chunker', _create_chunker)
+        self.register('embedding_service', _create_embedding_service)
+        self.register('vector_store', _create_vector_store)
+        self.register('manifest', _create_manifest)
+        self.register('lexical_index', _create_lexical_index)
+        self.register('answer_cache', _create_answer_cache)
+        self.register('ingestion_service', _create_ingestion_service)
+        self.register('reranker', _create_reranker)
+        self.register('context_packer', _create_context_packer)
+        self.register('llm_client', _create_llm_client)
+        self.register('rag_service', _create_rag_service)
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """
+        Register (or replace) the factory for a service
+
+        Args:
+            name: Service name
+            factory: Zero-argument callable building the service
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """
+        Get a service, constructing it on first use
+
+        Args:
+            name: Service name
+
+        Returns:
+            The shared service instance
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown service: {name}")
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._load_seconds[name] = round(time.perf_counter() - start, 3)
+            return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        """Check whether a service has been constructed"""
+        return name in self._instances
+
+    def reset(self, name: str) -> None:
+        """Drop a service instance so it is rebuilt on next use"""
+        with self._lock:
+            self._instances.pop(name, None)
+
+    def reset_clients(self) -> None:
+        """Drop services holding network clients (call after fork so each worker opens its own)"""
+        with self._lock:
+            for name in ('rag_service', 'ingestion_service', 'vector_store', 'llm_client'):
+                self._instances.pop(name, None)
+
+    def warmup(self) -> None:
+        """Construct the query-path services and run one encode so the first request is fast"""
+        start = time.perf_counter()
+        rag_service = self.get('rag_service')
+        self.embedding_service.warmup()
+        if rag_service.reranker is not None:
+            rag_service.reranker.warmup()
+        self.warmup_seconds = round(time.perf_counter() - start, 3)
+        print(f"Services warmed up in {self.warmup_seconds}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get construction timings for loaded services
+
+        Returns:
+            Dictionary with per-service load seconds and warmup time
+        """
+        return {
+            'loaded': sorted(self._instances),
+            'load_seconds': dict(self._load_seconds),
+            'warmup_seconds': self.warmup_seconds,
+            'pid': os.getpid(),
+            'memory_kb': _process_memory()
+        }
+
+    @property
+    def pdf_processor(self):
+        return self.get('pdf_processor')
+
+    @property
+    def chunker(self):
+        return self.get('chunker')
+
+    @property
+    def embedding_service(self):
+        return self.get('embedding_service')
+
+    @property
+    def vector_store(self):
+        return self.get('vector_store')
+
+    @property
+    def manifest(self):
+        return self.get('manifest')
+
+    @property
+    def lexical_index(self):
+        return self.get('lexical_index')
+
+    @property
+    def answer_cache(self):
+        return self.get('answer_cache')
+
+    @property
+    def ingestion_service(self):
+        return self.get('ingestion_service')
+
+    @property
+    def reranker(self):
+        return self.get('reranker')
+
+    @property
+    def context_packer(self):
+        return self.get('context_packer')
+
+    @property
+    def llm_client(self):
+        return self.get('llm_client')
+
+    @property
+    def rag_service(self):
+        return self.get('rag_service')
+
+
+# Process-wide registry shared by app.py and the services
+registry = ServiceRegistry()
@@ -0,0 +1,119 @@
+"""
+Re-ranking service
+Scores (query, chunk) pairs with a small CPU cross-encoder in one batch and
+reorders retrieved chunks, within a per-request latency budget
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class CrossEncoderReranker:
+    """Cross-encoder re-ranking that skips or truncates itself to meet a deadline"""
+
+    def __init__(self, model_name: str = None, max_length: int = None):
+        """
+        Initialize re-ranker (the model is loaded on first use)
+
+        Args:
+            model_name: Hugging Face cross-encoder (defaults to RERANK_MODEL)
+            max_length: Maximum tokens per (query, chunk) pair (defaults to RERANK_MAX_LENGTH)
+        """
+        self.model_name = model_name or os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+        self.max_length = max_length or int(os.getenv('RERANK_MAX_LENGTH', 256))
+        self.model = None
+        self._load_lock = threading.Lock()
+        # One forward pass at a time: concurrent passes only split the same cores
+        self._model_lock = threading.Lock()
+        # Running estimate of milliseconds per scored pair, updated after each pass
+        self.ms_per_pair: Optional[float] = None
+        self.reranked = 0
+        self.truncated = 0
+        self.skipped = 0
+
+    def _get_model(self):
+        if self.model is None:
+            with self._load_lock:
+                if self.model is None:
+                    from sentence_transformers import CrossEncoder
+                    print(f"Loading re-ranking model: {self.model_name}")
+                    self.model = CrossEncoder(self.model_name, max_length=self.max_length)
+        return self.model
+
+    def warmup(self) -> None:
+        """Load the model and measure its per-pair cost once"""
+        self.rerank("warmup", [{'text': "warmup passage"}] * 8, top_k=8)
+
+    def rerank(self, query: str, chunks: List[Dict[str, Any]], top_k: int,
+               deadline: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Reorder chunks by cross-encoder relevance
+
+        With a deadline, only as many leading candidates as the remaining time
+        allows are scored (the rest keep their order after them), and
+        re-ranking is skipped when the model is busy past the deadline or no
+        useful number of pairs fits.
+
+        Args:
+            query: User's question
+            chunks: Retrieved chunks, best first
+            top_k: Number of chunks the caller will use
+            deadline: time.perf_counter() value re-ranking must finish by
+            limit: Number of chunks to return (defaults to top_k; a later
+                selection stage may want the whole reordered pool)
+
+        Returns:
+            Up to limit chunks; re-ranked ones carry 'rerank_score'
+        """
+        limit = limit or top_k
+        if len(chunks) <= 1:
+            return chunks[:limit]
+
+        if deadline is not None:
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            if not self._model_lock.acquire(timeout=max(0.0, remaining_ms / 1000)):
+                self.skipped += 1
+                return chunks[:limit]
+        else:
+            self._model_lock.acquire()
+
+        try:
+            model = self._get_model()
+            candidates = chunks
+            if deadline is not None and self.ms_per_pair:
+                remaining_ms = (deadline - time.perf_counter()) * 1000
+                fits = int(remaining_ms / self.ms_per_pair)
+                if fits < min(top_k, len(chunks)):
+                    # Too few pairs fit to change the top_k: keep retrieval order
+                    self.skipped += 1
+                    return chunks[:limit]
+                if fits < len(chunks):
+                    candidates = chunks[:fits]
+                    self.truncated += 1
+
+            start = time.perf_counter()
+            scores = model.predict([(query, chunk.get('text', '')) for chunk in candidates],
+                                   batch_size=len(candidates), show_progress_bar=False)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            per_pair = elapsed_ms / len(candidates)
+            self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+            self.reranked += 1
+        finally:
+            self._model_lock.release()
+
+        order = sorted(range(len(candidates)), key=lambda i: -float(scores[i]))
+        reranked = [{**candidates[i], 'rerank_score': float(scores[i])} for i in order]
+        return (reranked + chunks[len(candidates):])[:limit]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Re-ranking counters and the current per-pair cost estimate"""
+        return {
+            'model': self.model_name,
+            'loaded': self.model is not None,
+            'ms_per_pair': round(self.ms_per_pair, 3) if self.ms_per_pair else None,
+            'reranked': self.reranked,
+            'truncated': self.truncated,
+            'skipped': self.skipped
+        }
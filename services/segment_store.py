@@ -0,0 +1,410 @@
+"""
+Segment store
+Append-only on-disk layout for one local vector store namespace. Every write
+adds an immutable segment: a .npy vector matrix opened with mmap, a JSON
+record file (chunk IDs and metadata) and the chunk texts in a separate file
+addressed by an offsets array. Deletes append to a tombstone log, and a
+manifest replaced atomically commits the set of live segments, so a restart
+maps the vector and text files instead of reading or re-embedding them.
+Processes sharing a namespace directory (gunicorn workers) serialize their
+writes with a file lock and catch up with each other's commits.
+"""
+
+import os
+import json
+import mmap
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class SegmentedVectors:
+    """Row-indexable, read-only view over the vector matrices of several segments"""
+
+    def __init__(self, parts: List[np.ndarray], dimension: int):
+        self.parts = parts
+        self.dimension = dimension
+        self.starts = np.cumsum([0] + [len(part) for part in parts])
+        self.shape = (int(self.starts[-1]), dimension)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key) -> np.ndarray:
+        """Rows by slice or integer array (fancy indexing only pages in those rows)"""
+        if isinstance(key, slice):
+            start, stop, _ = key.indices(len(self))
+            pieces = []
+            for part, offset in zip(self.parts, self.starts[:-1].tolist()):
+                lo, hi = max(start, offset), min(stop, offset + len(part))
+                if lo < hi:
+                    pieces.append(part[lo - offset:hi - offset])
+            if not pieces:
+                return np.zeros((0, self.dimension), dtype=np.float32)
+            return np.asarray(pieces[0]) if len(pieces) == 1 else np.concatenate(pieces)
+
+        rows = np.asarray(key, dtype=np.int64)
+        if len(self.parts) == 1:
+            return np.asarray(self.parts[0][rows])
+        owner = np.searchsorted(self.starts, rows, side='right') - 1
+        out = np.empty((len(rows), self.dimension), dtype=np.float32)
+        for part in np.unique(owner).tolist():
+            selected = owner == part
+            out[selected] = self.parts[part][rows[selected] - self.starts[part]]
+        return out
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = self[0:len(self)]
+        return array.astype(dtype) if dtype is not None else array
+
+    def dot(self, query: np.ndarray) -> np.ndarray:
+        """Scores of every row against a query, or (n, m) scores against a (dim, m) matrix of queries"""
+        if not self.parts:
+            return np.zeros((0,) + query.shape[1:], dtype=np.float32)
+        return np.concatenate([part @ query for part in self.parts])
+
+
+class Segment:
+    """One immutable batch of rows (vectors memory-mapped when stored on disk)"""
+
+    def __init__(self, vectors: np.ndarray, texts: Optional[List[str]] = None,
+                 seq: Optional[int] = None, text_path: Optional[str] = None,
+                 text_offsets: Optional[np.ndarray] = None):
+        """
+        Initialize segment
+
+        Args:
+            vectors: (n, dim) float32 rows (a memmap for on-disk segments)
+            texts: Chunk texts held in memory (in-memory segments)
+            seq: Sequence number of an on-disk segment
+            text_path: Text file of an on-disk segment
+            text_offsets: (n + 1,) byte offsets of each chunk text in text_path
+        """
+        self.vectors = vectors
+        self.seq = seq
+        self._texts = texts
+        self._text_path = text_path
+        self._text_offsets = text_offsets
+        self._text_map = None
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def text(self, row: int) -> str:
+        """Chunk text of a row, read lazily from the mapped text file"""
+        if self._texts is not None:
+            return self._texts[row]
+        start, end = int(self._text_offsets[row]), int(self._text_offsets[row + 1])
+        if start == end:
+            return ''
+        if self._text_map is None:
+            with open(self._text_path, 'rb') as f:
+                self._text_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._text_map[start:end].decode('utf-8')
+
+
+class SegmentStore:
+    """
+    Files of one namespace: segments, tombstone log and manifest
+
+    Writers hold locked() and refresh() first, so the in-memory manifest they
+    commit already includes every other process's segments.
+    """
+
+    MANIFEST = 'manifest.json'
+    LOCK = '.lock'
+    TRAINING_FILES = ('quantizer.npz', 'ivf.npz')
+
+    def __init__(self, directory: str, namespace: Optional[str] = None, dimension: Optional[int] = None):
+        """
+        Initialize segment store
+
+        Args:
+            directory: Namespace directory
+            namespace: Namespace name recorded in a new manifest
+            dimension: Embedding dimension recorded in a new manifest
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest: Dict[str, Any] = {'namespace': namespace, 'dimension': dimension, 'segments': [],
+                                         'next_seq': 1, 'tombstones': 'tombstones.1.log'}
+        # (inode, mtime, size) of files as this process last read or wrote them
+        self._seen: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        # Bytes of the tombstone log already applied
+        self._log_offset = 0
+
+    @contextmanager
+    def locked(self):
+        """Hold the namespace's exclusive file lock (serializes writers across processes)"""
+        with open(os.path.join(self.directory, self.LOCK), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def exists(self) -> bool:
+        """Check whether a committed manifest is present"""
+        return os.path.exists(os.path.join(self.directory, self.MANIFEST))
+
+    def path(self, seq: int, suffix: str) -> str:
+        """Path of one file of a segment"""
+        return os.path.join(self.directory, f"seg_{seq:06d}.{suffix}")
+
+    def allocate_seq(self) -> int:
+        """Reserve the next segment sequence number (caller holds the lock and has refreshed)"""
+        seq = self.manifest['next_seq']
+        self.manifest['next_seq'] = seq + 1
+        # Persisted at once: the segment may be written after the lock is released
+        self._write_manifest()
+        return seq
+
+    def load(self) -> Tuple[List[Tuple[Segment, List[str], List[Dict[str, Any]]]], Dict[int, List[int]]]:
+        """
+        Open the committed segments (caller holds the lock)
+
+        Returns:
+            ([(segment, ids, metadata)] in row order, {segment seq: tombstoned rows})
+        """
+        with open(os.path.join(self.directory, self.MANIFEST), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self._remember(self.MANIFEST)
+        self._log_offset = 0
+        segments = [self.open_segment(seq) for seq in self.manifest['segments']]
+        return segments, self.read_tombstones()
+
+    def open_segment(self, seq: int) -> Tuple[Segment, List[str], List[Dict[str, Any]]]:
+        """Map a committed segment and read its IDs and metadata"""
+        with open(self.path(seq, 'json'), 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        segment = Segment(np.load(self.path(seq, 'vec.npy'), mmap_mode='r'), seq=seq,
+                          text_path=self.path(seq, 'txt'),
+                          text_offsets=np.load(self.path(seq, 'off.npy'), mmap_mode='r'))
+        return segment, records['ids'], records['metadata']
+
+    def read_tombstones(self) -> Dict[int, List[int]]:
+        """
+        Read tombstone log entries appended since the last call (caller holds the lock)
+
+        Returns:
+            {segment seq: tombstoned rows}; entries for segments no longer in
+            the manifest (compacted away) are ignored
+        """
+        live = set(self.manifest['segments'])
+        tombstones: Dict[int, List[int]] = {}
+        log_path = os.path.join(self.directory, self.manifest['tombstones'])
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # torn final line from a crash mid-append
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self._log_offset += len(line)
+                    if entry['seq'] in live:
+                        tombstones.setdefault(entry['seq'], []).extend(entry['rows'])
+        self._remember(self.manifest['tombstones'])
+        return tombstones
+
+    def refresh(self) -> Optional[List[int]]:
+        """
+        Re-read a manifest other processes may have committed (caller holds the lock)
+
+        Returns:
+            Sequence numbers of the segments committed since this process last
+            read or wrote the manifest (read their tombstones next with
+            read_tombstones), or None if segments it knew were compacted or
+            cleared away and the namespace must be reopened
+        """
+        path = os.path.join(self.directory, self.MANIFEST)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        known = self.manifest['segments']
+        if manifest['segments'][:len(known)] != known or manifest['tombstones'] != self.manifest['tombstones']:
+            return None
+        self.manifest = manifest
+        self._remember(self.MANIFEST)
+        return manifest['segments'][len(known):]
+
+    def has_changed(self, names: Optional[Iterable[str]] = None) -> bool:
+        """
+        Check (without the lock) whether another process rewrote files since
+        this one last read or wrote them
+
+        Args:
+            names: Files to check (defaults to the manifest, tombstone log and training files)
+        """
+        if names is None:
+            names = (self.MANIFEST, self.manifest['tombstones']) + self.TRAINING_FILES
+        return any(self._stamp(name) != self._seen.get(name) for name in names)
+
+    def write_segment(self, seq: int, blocks: Iterable[np.ndarray], n_rows: int,
+                      ids: List[str], metadata: List[Dict[str, Any]], texts: List[str]) -> Segment:
+        """
+        Write (but do not commit) an immutable segment
+
+        Args:
+            seq: Sequence number from allocate_seq
+            blocks: Consecutive row blocks of the (n_rows, dim) vector matrix
+            n_rows: Total number of rows
+            ids: Vector ID per row
+            metadata: Metadata per row (without the chunk text)
+            texts: Chunk text per row
+
+        Returns:
+            The segment, memory-mapped from the written files
+        """
+        vectors_tmp = self.path(seq, 'vec.tmp.npy')
+        vectors = None
+        written = 0
+        for block in blocks:
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(vectors_tmp, mode='w+', dtype=np.float32,
+                                                    shape=(n_rows, block.shape[1]))
+            vectors[written:written + len(block)] = block
+            written += len(block)
+        vectors.flush()
+        del vectors
+
+        encoded = [text.encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+        with open(self.path(seq, 'txt.tmp'), 'wb') as f:
+            for data in encoded:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        np.save(self.path(seq, 'off.tmp.npy'), offsets)
+        self._write_json(self.path(seq, 'json'), {'ids': ids, 'metadata': metadata})
+
+        os.replace(vectors_tmp, self.path(seq, 'vec.npy'))
+        os.replace(self.path(seq, 'txt.tmp'), self.path(seq, 'txt'))
+        os.replace(self.path(seq, 'off.tmp.npy'), self.path(seq, 'off.npy'))
+        return Segment(np.load(self.path(seq, 'vec.npy'), mmap_mode='r'), seq=seq,
+                       text_path=self.path(seq, 'txt'),
+                       text_offsets=np.load(self.path(seq, 'off.npy'), mmap_mode='r'))
+
+    def commit(self, segment_seqs: List[int]) -> None:
+        """Atomically record the live segments (caller holds the lock and has refreshed)"""
+        self.manifest['segments'] = list(segment_seqs)
+        self._write_manifest()
+
+    def append_tombstones(self, tombstones: Dict[int, List[int]]) -> None:
+        """Durably append {segment seq: rows} to the tombstone log (caller holds the lock and has refreshed)"""
+        with open(os.path.join(self.directory, self.manifest['tombstones']), 'a', encoding='utf-8') as f:
+            for seq, rows in tombstones.items():
+                f.write(json.dumps({'seq': seq, 'rows': rows}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+        self._remember(self.manifest['tombstones'])
+
+    def commit_compaction(self, segment_seqs: List[int], tombstones: Dict[int, List[int]],
+                          removed_seqs: List[int]) -> None:
+        """
+        Swap in compacted segments: write a fresh tombstone log, commit the
+        manifest pointing at it, then delete the merged segments' files
+
+        Args:
+            segment_seqs: Live segments after compaction
+            tombstones: Tombstones still applying to those segments
+            removed_seqs: Segments replaced by the compacted one
+        """
+        old_log = self.manifest['tombstones']
+        self._next_tombstone_log()
+        with open(os.path.join(self.directory, self.manifest['tombstones']), 'w', encoding='utf-8') as f:
+            for seq, rows in tombstones.items():
+                f.write(json.dumps({'seq': seq, 'rows': rows}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()
+        self._remember(self.manifest['tombstones'])
+        self.commit(segment_seqs)
+
+        self._remove(old_log)
+        for seq in removed_seqs:
+            self.remove_segment(seq)
+
+    def clear(self) -> None:
+        """Tombstone the whole namespace (empty manifest), then delete its files"""
+        # A new log generation makes other processes reopen the namespace
+        self._next_tombstone_log()
+        self._log_offset = 0
+        self.commit([])
+        for name in os.listdir(self.directory):
+            if name not in (self.MANIFEST, self.LOCK):
+                self._remove(name)
+        self._remember(*self.TRAINING_FILES)
+
+    def remove_segment(self, seq: int) -> None:
+        """Delete a segment's files"""
+        for suffix in ('vec.npy', 'json', 'txt', 'off.npy', 'codes.npy', 'ivf.npy'):
+            self._remove(os.path.basename(self.path(seq, suffix)))
+
+    def save_array(self, name: str, data) -> None:
+        """Atomically write a side file (.npy array, or .npz from a dict of arrays)"""
+        path = os.path.join(self.directory, name)
+        tmp = path[:-4] + '.tmp' + path[-4:]
+        if name.endswith('.npz'):
+            np.savez(tmp, **data)
+        else:
+            np.save(tmp, data)
+        os.replace(tmp, path)
+        self._remember(name)
+
+    def load_array(self, name: str):
+        """Read a side file written by save_array (None if missing)"""
+        path = os.path.join(self.directory, name)
+        self._remember(name)
+        if not os.path.exists(path):
+            return None
+        if name.endswith('.npz'):
+            with np.load(path) as data:
+                return dict(data)
+        return np.load(path)
+
+    def _next_tombstone_log(self) -> None:
+        generation = int(self.manifest['tombstones'].split('.')[1]) + 1
+        self.manifest['tombstones'] = f"tombstones.{generation}.log"
+
+    def _write_manifest(self) -> None:
+        self._write_json(os.path.join(self.directory, self.MANIFEST), self.manifest)
+        self._remember(self.MANIFEST)
+
+    def _stamp(self, name: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _remember(self, *names: str) -> None:
+        for name in names:
+            self._seen[name] = self._stamp(name)
+
+    def _write_json(self, path: str, data: Any) -> None:
+        """Write JSON through a temporary file and fsync before replacing"""
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _remove(self, name: str) -> None:
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,139 @@
+"""
+Chunk text store
+SQLite store of zlib-compressed chunk texts keyed by (namespace, vector ID), so
+remote vectors carry only compact, filterable metadata and search results are
+hydrated with one bulk lookup
+"""
+
+import os
+import zlib
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# SQLite's default limit on host parameters per statement is 999
+_MAX_PARAMS = 900
+
+
+class ChunkTextStore:
+    """Chunk texts of vectors held in a remote index"""
+
+    def __init__(self, db_path: str = None):
+        """
+        Initialize chunk text store
+
+        Args:
+            db_path: SQLite database path (defaults to CHUNK_TEXT_STORE_PATH)
+        """
+        self.db_path = db_path or os.getenv('CHUNK_TEXT_STORE_PATH', 'storage/chunk_texts.sqlite3')
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            # WAL lets gunicorn workers read while another process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS texts (
+                    namespace TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    text BLOB NOT NULL,
+                    PRIMARY KEY (namespace, vector_id)
+                ) WITHOUT ROWID
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived connection committing on success (safe across threads and forked workers)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put_many(self, namespace: str, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        Store (or replace) chunk texts
+
+        Args:
+            namespace: Namespace of the vectors
+            items: (vector ID, text) pairs
+        """
+        rows = [(namespace, vector_id, zlib.compress(text.encode('utf-8')))
+                for vector_id, text in items]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO texts VALUES (?, ?, ?)", rows)
+
+    def get_many(self, namespace: str, vector_ids: List[str]) -> Dict[str, str]:
+        """
+        Look up chunk texts
+
+        Args:
+            namespace: Namespace of the vectors
+            vector_ids: Vector IDs
+
+        Returns:
+            Dictionary of vector ID to text (IDs without a stored text are missing)
+        """
+        texts = {}
+        with self._connect() as conn:
+            for start in range(0, len(vector_ids), _MAX_PARAMS):
+                batch = vector_ids[start:start + _MAX_PARAMS]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f"SELECT vector_id, text FROM texts WHERE namespace = ? AND vector_id IN ({placeholders})",
+                    [namespace, *batch]
+                )
+                texts.update((vector_id, zlib.decompress(blob).decode('utf-8')) for vector_id, blob in rows)
+        return texts
+
+    def missing(self, namespace: str, vector_ids: List[str]) -> List[str]:
+        """
+        Find vectors without a stored text
+
+        Args:
+            namespace: Namespace of the vectors
+            vector_ids: Vector IDs
+
+        Returns:
+            The IDs that have no text, in the given order
+        """
+        found = set()
+        with self._connect() as conn:
+            for start in range(0, len(vector_ids), _MAX_PARAMS):
+                batch = vector_ids[start:start + _MAX_PARAMS]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f"SELECT vector_id FROM texts WHERE namespace = ? AND vector_id IN ({placeholders})",
+                    [namespace, *batch]
+                )
+                found.update(vector_id for vector_id, in rows)
+        return [vector_id for vector_id in vector_ids if vector_id not in found]
+
+    def iter_namespace(self, namespace: str, batch_size: int = 10000) -> Iterator[Tuple[str, str]]:
+        """Iterate over every (vector ID, text) of a namespace, reading batch_size rows at a time"""
+        last_id = ''
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT vector_id, text FROM texts WHERE namespace = ? AND vector_id > ? "
+                    "ORDER BY vector_id LIMIT ?",
+                    (namespace, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for vector_id, blob in rows:
+                yield vector_id, zlib.decompress(blob).decode('utf-8')
+            last_id = rows[-1][0]
+
+    def delete_many(self, namespace: str, vector_ids: List[str]) -> None:
+        """Forget the texts of deleted vectors"""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM texts WHERE namespace = ? AND vector_id = ?",
+                             [(namespace, vector_id) for vector_id in vector_ids])
+
+    def clear_namespace(self, namespace: str) -> None:
+        """Forget every text of a namespace"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM texts WHERE namespace = ?", (namespace,))
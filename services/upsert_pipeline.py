@@ -0,0 +1,184 @@
+"""
+Upsert pipeline
+Sends vector upserts to a remote index over a bounded number of concurrent
+requests, with payload-size-aware batching and exponential-backoff retries
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Decide whether a failed upsert may succeed when retried
+
+    Args:
+        error: Exception raised by the upsert call
+
+    Returns:
+        True for timeouts, connection failures and 408/429/5xx responses
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, 'status', None) or getattr(error, 'status_code', None)
+    if status is not None:
+        try:
+            return int(status) in TRANSIENT_STATUSES
+        except (TypeError, ValueError):
+            return False
+    # urllib3/requests connection errors do not derive from the builtins above
+    return type(error).__name__ in ('MaxRetryError', 'ProtocolError', 'NewConnectionError',
+                                    'ReadTimeoutError', 'ConnectTimeout', 'ReadTimeout')
+
+
+def estimate_payload_bytes(record: Dict[str, Any]) -> int:
+    """Approximate JSON size of one upsert record (about 10 bytes per float value)"""
+    return (len(record['id']) + 10 * len(record['values'])
+            + len(json.dumps(record.get('metadata', {}), ensure_ascii=False)) + 64)
+
+
+def split_batches(records: Iterable[Dict[str, Any]], max_vectors: int, max_bytes: int) -> Iterable[List[Dict[str, Any]]]:
+    """
+    Group upsert records into batches bounded by count and payload size
+
+    Chunk texts live in the text store, so records are mostly vector values
+    and the count limit usually binds first; the size bound still guards
+    large dimensions and extra metadata fields from overflowing the request
+    size limit.
+
+    Args:
+        records: Upsert records ({'id', 'values', 'metadata'})
+        max_vectors: Maximum records per batch
+        max_bytes: Maximum estimated payload bytes per batch
+
+    Yields:
+        Lists of records
+    """
+    batch, batch_bytes = [], 0
+    for record in records:
+        size = estimate_payload_bytes(record)
+        if batch and (len(batch) >= max_vectors or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+class UpsertPipeline:
+    """Bounded-concurrency upserts with retries; submit() blocks while the window is full"""
+
+    def __init__(self, upsert_fn: Callable[[List[Dict[str, Any]], str], Any],
+                 concurrency: int = None,
+                 max_batch_vectors: int = None,
+                 max_batch_bytes: int = None,
+                 max_retries: int = None,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0):
+        """
+        Initialize upsert pipeline
+
+        Args:
+            upsert_fn: Called as upsert_fn(batch, namespace) to send one batch
+            concurrency: Requests in flight at once (defaults to PINECONE_UPSERT_CONCURRENCY)
+            max_batch_vectors: Records per request (defaults to PINECONE_UPSERT_BATCH_SIZE)
+            max_batch_bytes: Estimated payload bytes per request (defaults to PINECONE_UPSERT_MAX_BYTES)
+            max_retries: Retries of a batch after transient errors (defaults to PINECONE_UPSERT_RETRIES)
+            backoff_base: First retry delay in seconds, doubled on each retry
+            backoff_max: Upper bound on a retry delay in seconds
+        """
+        self.upsert_fn = upsert_fn
+        self.concurrency = max(1, concurrency or int(os.getenv('PINECONE_UPSERT_CONCURRENCY', 4)))
+        self.max_batch_vectors = max_batch_vectors or int(os.getenv('PINECONE_UPSERT_BATCH_SIZE', 100))
+        # Pinecone rejects requests over 2MB; leave headroom for the estimate
+        self.max_batch_bytes = max_batch_bytes or int(os.getenv('PINECONE_UPSERT_MAX_BYTES', 1_500_000))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('PINECONE_UPSERT_RETRIES', 5))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='upsert')
+        self._in_flight: Set[Future] = set()
+        self._lock = threading.Lock()
+        self.batches_sent = 0
+        self.vectors_sent = 0
+        self.retries = 0
+
+    def submit(self, records: Iterable[Dict[str, Any]], namespace: str) -> None:
+        """
+        Queue records for upsert, blocking while the in-flight window is full
+
+        Args:
+            records: Upsert records ({'id', 'values', 'metadata'})
+            namespace: Target namespace
+
+        Raises:
+            Exception: The error of an earlier batch that failed for good
+        """
+        for batch in split_batches(records, self.max_batch_vectors, self.max_batch_bytes):
+            # Backpressure: wait for a request to finish before exceeding the window
+            while len(self._in_flight) >= self.concurrency:
+                done, self._in_flight = wait(self._in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            self._in_flight.add(self._executor.submit(self._send, batch, namespace))
+
+    def flush(self) -> None:
+        """
+        Wait for every queued batch
+
+        Raises:
+            Exception: The error of the first batch that failed for good
+        """
+        done, _ = wait(self._in_flight)
+        self._in_flight = set()
+        error = next((future.exception() for future in done if future.exception() is not None), None)
+        if error is not None:
+            raise error
+
+    def close(self) -> None:
+        """Wait for queued batches and stop the worker threads"""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _send(self, batch: List[Dict[str, Any]], namespace: str) -> None:
+        """Send one batch, retrying transient errors with jittered exponential backoff"""
+        attempt = 0
+        while True:
+            try:
+                self.upsert_fn(batch, namespace)
+                with self._lock:
+                    self.batches_sent += 1
+                    self.vectors_sent += len(batch)
+                return
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Don't mask the caller's error with one from a pending batch
+            try:
+                self.close()
+            except Exception:
+                pass
+            return
+        self.close()
@@ -1,21 +1,205 @@
 """
-Vector store service using Pinecone
-Handles vector storage, retrieval, and management
+Vector store service
+Handles vector storage, retrieval, and management behind a pluggable backend
+(Pinecone or a local in-process index, selected with VECTOR_BACKEND)
 """
 
 import os
-import uuid
-from typing import List, Dict, Any, Optional, Tuple
-from pinecone import Pinecone, ServerlessSpec
+import hashlib
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+import numpy as np
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-class VectorStore:
+from services.manifest import chunk_hash
+from services.upsert_pipeline import UpsertPipeline
+from services.text_store import ChunkTextStore
+
+class BaseVectorStore:
+    """Interface shared by all vector store backends"""
+    
+    def store_vectors(self, chunks: List[Dict[str, Any]], 
+                     embeddings: Union[np.ndarray, List[List[float]]], 
+                     namespace: str = "default",
+                     vector_ids: Optional[List[str]] = None) -> bool:
+        """Store text chunks and their embeddings (vector IDs default to make_vector_ids)"""
+        raise NotImplementedError
+    
+    def store_vector_batches(self, batches: Iterable[Tuple[List[Dict[str, Any]], np.ndarray, List[str]]],
+                             namespace: str = "default") -> bool:
+        """
+        Store a stream of (chunks, embeddings, vector IDs) batches
+        
+        The stream is consumed lazily, so a producer that embeds the next
+        batch on demand overlaps embedding with storage on backends that
+        upsert in the background.
+        
+        Args:
+            batches: Iterable of (chunks, embeddings, vector IDs)
+            namespace: Namespace for organization
+            
+        Returns:
+            True if every batch was stored
+        """
+        return all([self.store_vectors(chunks, embeddings, namespace, vector_ids)
+                    for chunks, embeddings, vector_ids in batches])
+    
+    def search_similar(self, query_embedding: Union[np.ndarray, List[float]], 
+                      top_k: int = 8, 
+                      namespace: str = "default",
+                      filter_dict: Dict[str, Any] = None,
+                      include_values: bool = False) -> List[Dict[str, Any]]:
+        """Search for similar vectors using query embedding (include_values adds each vector as 'values')"""
+        raise NotImplementedError
+    
+    def search_many(self, query_embeddings: Union[np.ndarray, List[List[float]]], 
+                    top_k: int = 8, 
+                    namespace: str = "default",
+                    filter_dict: Dict[str, Any] = None) -> List[List[Dict[str, Any]]]:
+        """Search for several (m, dim) query vectors, returning one result list per query"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        return [self.search_similar(query, top_k, namespace, filter_dict) for query in queries]
+    
+    def get_vector_count(self, namespace: str = "default") -> int:
+        """Get total number of vectors in namespace"""
+        raise NotImplementedError
+    
+    def clear_namespace(self, namespace: str = "default") -> bool:
+        """Clear all vectors from a namespace"""
+        raise NotImplementedError
+    
+    def delete_vectors(self, vector_ids: List[str], namespace: str = "default") -> bool:
+        """Delete specific vectors by ID"""
+        raise NotImplementedError
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]], namespace: str = "default") -> bool:
+        """Merge new metadata fields into stored vectors by ID, without re-embedding them"""
+        raise NotImplementedError
+    
+    def iter_vectors(self, namespace: str = "default") -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over (vector ID, metadata) of every vector in a namespace"""
+        raise NotImplementedError
+    
+    def iter_texts(self, namespace: str = "default") -> Iterator[Tuple[str, str]]:
+        """Iterate over (vector ID, chunk text) of every vector in a namespace"""
+        for vector_id, metadata in self.iter_vectors(namespace):
+            yield vector_id, metadata.get('text', '')
+    
+    def get_vectors(self, vector_ids: List[str], namespace: str = "default",
+                    include_values: bool = False) -> List[Dict[str, Any]]:
+        """Get stored vectors by ID in the search result format (score 0.0, unknown IDs skipped)"""
+        raise NotImplementedError
+    
+    def missing_texts(self, vector_ids: List[str], namespace: str = "default") -> List[str]:
+        """IDs of stored vectors whose chunk text is lost (backends keeping texts with the vectors have none)"""
+        return []
+    
+    def get_index_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        raise NotImplementedError
+    
+    def search_by_metadata(self, filter_dict: Dict[str, Any], 
+                          top_k: int = 10, 
+                          namespace: str = "default") -> List[Dict[str, Any]]:
+        """Search vectors by metadata filter"""
+        raise NotImplementedError
+    
+    @staticmethod
+    def build_vector_metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the compact, filterable metadata stored alongside a chunk's vector
+        
+        The chunk text is kept out of it (backends store texts separately), as
+        are the 'source'/'chunk_id'/'token_count' copies in chunk['metadata'].
+        
+        Args:
+            chunk: Chunk dictionary from TextChunker
+            
+        Returns:
+            Metadata dictionary
+        """
+        extra = {key: value for key, value in chunk.get('metadata', {}).items()
+                 if key not in ('source', 'chunk_id', 'token_count', 'text')}
+        return {
+            'filename': chunk['filename'],
+            'chunk_id': chunk['chunk_id'],
+            'token_count': chunk['token_count'],
+            **extra
+        }
+    
+    @staticmethod
+    def make_vector_id(chunk: Dict[str, Any], namespace: str = "default", occurrence: int = 0) -> str:
+        """
+        Build the deterministic ID a chunk's vector is stored under
+        
+        The ID depends only on the namespace, filename and chunk text, so
+        storing the same chunk again overwrites its vector instead of adding
+        a duplicate.
+        
+        Args:
+            chunk: Chunk dictionary from TextChunker
+            namespace: Namespace the vector is stored in
+            occurrence: How many earlier chunks of the file have the same text
+            
+        Returns:
+            Vector ID
+        """
+        key = f"{namespace}\0{chunk['filename']}\0{chunk_hash(chunk['text'])}\0{occurrence}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    
+    @classmethod
+    def make_vector_ids(cls, chunks: List[Dict[str, Any]], namespace: str = "default") -> List[str]:
+        """Build the IDs of a file's chunks, numbering repeated chunk texts in order"""
+        seen: Dict[Tuple[str, str], int] = {}
+        vector_ids = []
+        for chunk in chunks:
+            key = (chunk['filename'], chunk['text'])
+            occurrence = seen.get(key, 0)
+            seen[key] = occurrence + 1
+            vector_ids.append(cls.make_vector_id(chunk, namespace, occurrence))
+        return vector_ids
+    
+    @staticmethod
+    def format_match(vector_id: str, score: float, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a stored vector into the search result format
+        
+        Args:
+            vector_id: Vector ID
+            score: Similarity score
+            metadata: Stored metadata
+            
+        Returns:
+            Result dictionary
+        """
+        return {
+            'id': vector_id,
+            'score': score,
+            'text': metadata.get('text', ''),
+            'filename': metadata.get('filename', ''),
+            'chunk_id': metadata.get('chunk_id', 0),
+            'metadata': metadata
+        }
+
+class PineconeVectorStore(BaseVectorStore):
     """Handles vector operations with Pinecone"""
     
-    def __init__(self):
-        """Initialize Pinecone vector store"""
+    def __init__(self, text_store: Optional[ChunkTextStore] = None):
+        """
+        Initialize Pinecone vector store
+        
+        Args:
+            text_store: Store of chunk texts (defaults to CHUNK_TEXT_STORE_PATH)
+        """
         self.api_key = os.getenv('PINECONE_API_KEY')
         self.index_name = os.getenv('PINECONE_INDEX', 'career-rag-index')
+        # Data-plane host of an existing index (skips index lookup/creation),
+        # e.g. http://localhost:5081 for guide/fake_pinecone.py
+        self.host = os.getenv('PINECONE_HOST')
+        # Chunk texts live here rather than in Pinecone metadata
+        self.text_store = text_store or ChunkTextStore()
         self.pc = None
         self.index = None
         
@@ -27,9 +211,16 @@ class VectorStore:
     def _initialize_pinecone(self):
         """Initialize Pinecone client and index"""
         try:
+            from pinecone import Pinecone, ServerlessSpec
+            
             # Initialize Pinecone
             self.pc = Pinecone(api_key=self.api_key)
             
+            if self.host:
+                self.index = self.pc.Index(host=self.host)
+                print(f"Connected to Pinecone index at {self.host}")
+                return
+            
             # Check if index exists, create if not
             if self.index_name not in self.pc.list_indexes().names():
                 print(f"Creating Pinecone index: {self.index_name}")
@@ -56,71 +247,24 @@ class VectorStore:
             print(f"Error initializing Pinecone: {e}")
             raise
 
-    def get_processed_filenames_in_namespace(self, namespace: str = "default") -> set[str]:
-        """
-        Retrieves a set of filenames that have already been processed and stored in the given namespace.
-        This is done by querying Pinecone for all unique 'filename' metadata values.
-        """
-        try:
-            # Fetch all unique filenames in the namespace
-            # Pinecone's describe_index_stats includes namespace stats with filter info
-            # However, direct fetching of all unique metadata values in a performant way
-            # requires a bit of a workaround or specific client methods not directly exposed
-            # to simplify, we'll perform a dummy query to get existing metadata if needed
-
-            # A more robust solution might involve storing this list separately
-            # or using Pinecone's list_objects with filter for production
-
-            # For now, we'll try to get metadata from existing vectors
-            # This can be slow for very large namespaces without specific metadata indexing
-            # but works for smaller to medium scale. For production, consider client.list_vectors
-            # or a separate database to track processed files.
-            
-            # For a simple check, we can list the first few vectors and extract filenames
-            # or iterate if necessary. A more direct method is desirable.
-
-            # As a pragmatic approach for avoiding re-ingestion, we'll use a cached list
-            # or assume a file is processed if its name exists in the index after a query
-            # For a truly accurate list, you might need to query the index.
-
-            # Let's use a small query to check for existing filenames if the index is not empty
-            stats = self.index.describe_index_stats()
-            namespace_stats = stats.namespaces.get(namespace)
-
-            if namespace_stats and namespace_stats.vector_count > 0:
-                # Query with a dummy vector and filter to get some metadata, then extract filenames
-                # This is a heuristic, not a comprehensive list for huge indices
-                response = self.index.query(
-                    vector=[0.0]*384, # Dummy vector for metadata-only retrieval
-                    top_k=1000, # Retrieve a reasonable number of vectors
-                    namespace=namespace,
-                    include_metadata=True,
-                    filter={'filename': {'$ne': ''}} # Filter for entries that have a filename
-                )
-                filenames = {match.metadata['filename'] for match in response.matches if 'filename' in match.metadata}
-                return filenames
-            return set()
-
-        except Exception as e:
-            print(f"Error getting processed filenames in namespace {namespace}: {e}")
-            return set()
-    
     def store_vectors(self, chunks: List[Dict[str, Any]], 
-                     embeddings: List[List[float]], 
-                     namespace: str = "default") -> bool:
+                     embeddings: Union[np.ndarray, List[List[float]]], 
+                     namespace: str = "default",
+                     vector_ids: Optional[List[str]] = None) -> bool:
         """
         Store text chunks and their embeddings in Pinecone
         
         Args:
             chunks: List of chunk dictionaries with metadata
-            embeddings: List of embedding vectors
+            embeddings: (n, dim) float32 array (or list) of embedding vectors
             namespace: Pinecone namespace for organization
+            vector_ids: Optional vector ID per chunk (generated if omitted)
             
         Returns:
             True if successful, False otherwise
         """
         try:
-            if not chunks or not embeddings:
+            if not chunks or len(embeddings) == 0:
                 print("No chunks or embeddings to store")
                 return False
             
@@ -128,43 +272,112 @@ class VectorStore:
                 print(f"Mismatch: {len(chunks)} chunks vs {len(embeddings)} embeddings")
                 return False
             
-            # Prepare vectors for Pinecone
-            vectors_to_upsert = []
+            if vector_ids is None:
+                vector_ids = self.make_vector_ids(chunks, namespace)
+            # Texts first, so a vector is never searchable without its text
+            self.text_store.put_many(namespace, zip(vector_ids, (chunk['text'] for chunk in chunks)))
+            with UpsertPipeline(self._upsert_batch) as pipeline:
+                pipeline.submit(self._upsert_records(chunks, embeddings, vector_ids), namespace)
             
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                vector_id = f"{chunk['id']}_{uuid.uuid4().hex[:8]}"
-                
-                vector_data = {
-                    'id': vector_id,
-                    'values': embedding,
-                    'metadata': {
-                        'text': chunk['text'],
-                        'filename': chunk['filename'],
-                        'chunk_id': chunk['chunk_id'],
-                        'token_count': chunk['token_count'],
-                        **chunk.get('metadata', {})
-                    }
-                }
-                vectors_to_upsert.append(vector_data)
-            
-            # Upsert vectors in batches
-            batch_size = 100
-            for i in range(0, len(vectors_to_upsert), batch_size):
-                batch = vectors_to_upsert[i:i + batch_size]
-                self.index.upsert(vectors=batch, namespace=namespace)
-                print(f"Upserted batch {i//batch_size + 1}/{(len(vectors_to_upsert) + batch_size - 1)//batch_size}")
-            
-            print(f"Successfully stored {len(vectors_to_upsert)} vectors in namespace '{namespace}'")
+            print(f"Successfully stored {len(chunks)} vectors in namespace '{namespace}' "
+                  f"({pipeline.batches_sent} requests, {pipeline.retries} retries)")
             return True
             
         except Exception as e:
             print(f"Error storing vectors: {e}")
             return False
     
-    def search_similar(self, query_embedding: List[float], 
+    def store_vector_batches(self, batches: Iterable[Tuple[List[Dict[str, Any]], np.ndarray, List[str]]],
+                             namespace: str = "default") -> bool:
+        """
+        Store a stream of (chunks, embeddings, vector IDs) batches
+        
+        Upserts of one batch run in the background while the next batch is
+        pulled from the stream (and embedded, if the producer is lazy).
+        
+        Args:
+            batches: Iterable of (chunks, embeddings, vector IDs)
+            namespace: Pinecone namespace for organization
+            
+        Returns:
+            True if every batch was stored
+        """
+        try:
+            total = 0
+            with UpsertPipeline(self._upsert_batch) as pipeline:
+                for chunks, embeddings, vector_ids in batches:
+                    self.text_store.put_many(namespace, zip(vector_ids, (chunk['text'] for chunk in chunks)))
+                    pipeline.submit(self._upsert_records(chunks, embeddings, vector_ids), namespace)
+                    total += len(chunks)
+            
+            print(f"Successfully stored {total} vectors in namespace '{namespace}' "
+                  f"({pipeline.batches_sent} requests, {pipeline.retries} retries)")
+            return True
+            
+        except Exception as e:
+            print(f"Error storing vectors: {e}")
+            return False
+    
+    def _upsert_records(self, chunks: List[Dict[str, Any]],
+                        embeddings: Union[np.ndarray, List[List[float]]],
+                        vector_ids: List[str]) -> Iterator[Dict[str, Any]]:
+        """Build upsert records lazily so only the batches in flight hold JSON-able lists"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for vector_id, chunk, embedding in zip(vector_ids, chunks, embeddings):
+            yield {
+                'id': vector_id,
+                'values': embedding.tolist(),
+                'metadata': self.build_vector_metadata(chunk)
+            }
+    
+    def _upsert_batch(self, batch: List[Dict[str, Any]], namespace: str) -> None:
+        """Send one upsert request"""
+        self.index.upsert(vectors=batch, namespace=namespace)
+    
+    def _hydrate(self, matches, namespace: str, include_values: bool = False) -> List[Dict[str, Any]]:
+        """Format query matches, filling in chunk texts with one text store lookup"""
+        return self._hydrate_many([matches], namespace, include_values)[0]
+    
+    def _hydrate_many(self, match_lists, namespace: str,
+                      include_values: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        Format the matches of several queries with a single text store lookup
+        
+        Matches whose text is in neither their metadata nor the text store (it
+        was deleted, or lives on another host) are skipped and logged rather
+        than returned as empty sources.
+        """
+        # Vectors stored before the text store still carry their text in metadata
+        missing = list({match.id for matches in match_lists for match in matches
+                        if 'text' not in (match.metadata or {})})
+        texts = self.text_store.get_many(namespace, missing) if missing else {}
+        results = []
+        skipped = set()
+        for matches in match_lists:
+            formatted = []
+            for match in matches:
+                metadata = dict(match.metadata or {})
+                if match.id in texts:
+                    metadata['text'] = texts[match.id]
+                elif 'text' not in metadata:
+                    skipped.add(match.id)
+                    continue
+                result = self.format_match(match.id, match.score, metadata)
+                if include_values:
+                    result['values'] = np.asarray(match.values, dtype=np.float32)
+                formatted.append(result)
+            results.append(formatted)
+        if skipped:
+            print(f"Skipped {len(skipped)} matches in namespace '{namespace}' whose chunk text is "
+                  f"missing from {self.text_store.db_path}; restart to re-ingest their PDFs from storage, "
+                  f"or clear the namespace and upload them again")
+        return results
+    
+    def search_similar(self, query_embedding: Union[np.ndarray, List[float]], 
                       top_k: int = 8, 
                       namespace: str = "default",
-                      filter_dict: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+                      filter_dict: Dict[str, Any] = None,
+                      include_values: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar vectors using query embedding
         
@@ -173,37 +386,73 @@ class VectorStore:
             top_k: Number of similar vectors to return
             namespace: Pinecone namespace to search in
             filter_dict: Optional metadata filter
+            include_values: Add each stored vector as a float32 array under 'values'
             
         Returns:
             List of similar vectors with metadata
         """
         try:
             search_response = self.index.query(
-                vector=query_embedding,
+                vector=np.asarray(query_embedding, dtype=np.float32).tolist(),
                 top_k=top_k,
                 include_metadata=True,
+                include_values=include_values,
                 namespace=namespace,
                 filter=filter_dict
             )
             
-            results = []
-            for match in search_response.matches:
-                result = {
-                    'id': match.id,
-                    'score': match.score,
-                    'text': match.metadata.get('text', ''),
-                    'filename': match.metadata.get('filename', ''),
-                    'chunk_id': match.metadata.get('chunk_id', 0),
-                    'metadata': match.metadata
-                }
-                results.append(result)
-            
-            return results
+            return self._hydrate(search_response.matches, namespace, include_values)
             
         except Exception as e:
             print(f"Error searching vectors: {e}")
             return []
     
+    def search_many(self, query_embeddings: Union[np.ndarray, List[List[float]]], 
+                    top_k: int = 8, 
+                    namespace: str = "default",
+                    filter_dict: Dict[str, Any] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar vectors for several queries at once
+        
+        Pinecone has no multi-vector query, so the queries run concurrently
+        (PINECONE_QUERY_CONCURRENCY at a time) and all results are hydrated
+        with one text store lookup.
+        
+        Args:
+            query_embeddings: (m, dim) matrix of query vectors
+            top_k: Number of similar vectors to return per query
+            namespace: Pinecone namespace to search in
+            filter_dict: Optional metadata filter applied to every query
+            
+        Returns:
+            One result list per query, best first (empty for a failed query)
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if len(queries) == 0:
+            return []
+        
+        def run(query: np.ndarray):
+            try:
+                return self.index.query(vector=query.tolist(), top_k=top_k, include_metadata=True,
+                                        namespace=namespace, filter=filter_dict).matches
+            except Exception as e:
+                print(f"Error searching vectors: {e}")
+                return []
+        
+        concurrency = min(len(queries), int(os.getenv('PINECONE_QUERY_CONCURRENCY', 8)))
+        if concurrency <= 1:
+            match_lists = [run(query) for query in queries]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                match_lists = list(executor.map(run, queries))
+        try:
+            return self._hydrate_many(match_lists, namespace)
+        except Exception as e:
+            print(f"Error loading chunk texts: {e}")
+            return [[] for _ in match_lists]
+    
     def get_vector_count(self, namespace: str = "default") -> int:
         """
         Get total number of vectors in namespace
@@ -233,6 +482,7 @@ class VectorStore:
         """
         try:
             self.index.delete(delete_all=True, namespace=namespace)
+            self.text_store.clear_namespace(namespace)
             print(f"Cleared all vectors from namespace '{namespace}'")
             return True
         except Exception as e:
@@ -243,6 +493,10 @@ class VectorStore:
         """
         Delete specific vectors by ID
         
+        Pinecone accepts at most 1000 IDs per delete request, so larger lists
+        are deleted in batches; each batch's texts are forgotten once its
+        vectors are gone.
+        
         Args:
             vector_ids: List of vector IDs to delete
             namespace: Namespace containing the vectors
@@ -251,13 +505,144 @@ class VectorStore:
             True if successful, False otherwise
         """
         try:
-            self.index.delete(ids=vector_ids, namespace=namespace)
+            batch_size = 1000
+            for start in range(0, len(vector_ids), batch_size):
+                batch = vector_ids[start:start + batch_size]
+                self.index.delete(ids=batch, namespace=namespace)
+                self.text_store.delete_many(namespace, batch)
             print(f"Deleted {len(vector_ids)} vectors from namespace '{namespace}'")
             return True
         except Exception as e:
             print(f"Error deleting vectors: {e}")
             return False
     
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]], namespace: str = "default") -> bool:
+        """
+        Merge new metadata fields into stored vectors by ID
+        
+        Pinecone updates one vector per request, so the updates go through
+        the upsert pipeline for its bounded concurrency and retries.
+        
+        Args:
+            updates: Vector ID -> metadata fields to set
+            namespace: Namespace containing the vectors
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not updates:
+            return True
+        try:
+            records = ({'id': vector_id, 'values': [], 'metadata': metadata}
+                       for vector_id, metadata in updates.items())
+            with UpsertPipeline(self._update_batch, max_batch_vectors=1) as pipeline:
+                pipeline.submit(records, namespace)
+            print(f"Updated metadata of {len(updates)} vectors in namespace '{namespace}'")
+            return True
+        except Exception as e:
+            print(f"Error updating metadata: {e}")
+            return False
+    
+    def _update_batch(self, batch: List[Dict[str, Any]], namespace: str) -> None:
+        """Send the metadata update of each record in a batch"""
+        for record in batch:
+            self.index.update(id=record['id'], set_metadata=record['metadata'], namespace=namespace)
+    
+    def iter_vectors(self, namespace: str = "default") -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Iterate over every vector in a namespace
+        
+        Pages through the namespace's IDs with list() and fetches each page's
+        metadata, so it works for namespaces of any size (serverless indexes).
+        
+        Args:
+            namespace: Namespace to scan
+            
+        Yields:
+            (vector ID, metadata) tuples
+        """
+        for id_page in self.index.list(namespace=namespace):
+            fetched = self.index.fetch(ids=list(id_page), namespace=namespace)
+            texts = self.text_store.get_many(namespace, list(fetched.vectors))
+            for vector_id, vector in fetched.vectors.items():
+                metadata = dict(vector.metadata or {})
+                if vector_id in texts:
+                    metadata['text'] = texts[vector_id]
+                yield vector_id, metadata
+    
+    def iter_texts(self, namespace: str = "default") -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over the chunk texts of a namespace from the local text store
+        
+        Args:
+            namespace: Namespace to scan
+            
+        Yields:
+            (vector ID, chunk text) tuples
+        """
+        yield from self.text_store.iter_namespace(namespace)
+    
+    def missing_texts(self, vector_ids: List[str], namespace: str = "default") -> List[str]:
+        """
+        Find vectors whose chunk text is not in the local text store
+        
+        The text store lives on local disk, so a host that lost it (or never
+        had it) still sees the vectors in Pinecone. Vectors stored before the
+        text store, with the text in their metadata, are reported as well.
+        
+        Args:
+            vector_ids: Vector IDs
+            namespace: Namespace containing the vectors
+            
+        Returns:
+            The IDs without a stored text, in the given order
+        """
+        return self.text_store.missing(namespace, vector_ids) if vector_ids else []
+    
+    def get_vectors(self, vector_ids: List[str], namespace: str = "default",
+                    include_values: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get stored vectors by ID
+        
+        Args:
+            vector_ids: Vector IDs
+            namespace: Namespace containing the vectors
+            include_values: Add each stored vector as a float32 array under 'values'
+            
+        Returns:
+            Results in the search result format (score 0.0), in the order of
+            vector_ids; unknown IDs and vectors without a stored text are skipped
+        """
+        if not vector_ids:
+            return []
+        try:
+            fetched = self.index.fetch(ids=list(vector_ids), namespace=namespace).vectors
+            texts = self.text_store.get_many(namespace, [vector_id for vector_id in vector_ids
+                                                         if vector_id in fetched])
+            results = []
+            skipped = 0
+            for vector_id in vector_ids:
+                vector = fetched.get(vector_id)
+                if vector is None:
+                    continue
+                metadata = dict(vector.metadata or {})
+                if vector_id in texts:
+                    metadata['text'] = texts[vector_id]
+                elif 'text' not in metadata:
+                    skipped += 1
+                    continue
+                result = self.format_match(vector_id, 0.0, metadata)
+                if include_values:
+                    result['values'] = np.asarray(vector.values, dtype=np.float32)
+                results.append(result)
+            if skipped:
+                print(f"Skipped {skipped} vectors in namespace '{namespace}' whose chunk text is "
+                      f"missing from {self.text_store.db_path}")
+            return results
+        except Exception as e:
+            print(f"Error fetching vectors: {e}")
+            return []
+    
     def get_index_stats(self) -> Dict[str, Any]:
         """
         Get index statistics
@@ -304,20 +689,30 @@ class VectorStore:
                 filter=filter_dict
             )
             
-            results = []
-            for match in search_response.matches:
-                result = {
-                    'id': match.id,
-                    'score': match.score,
-                    'text': match.metadata.get('text', ''),
-                    'filename': match.metadata.get('filename', ''),
-                    'chunk_id': match.metadata.get('chunk_id', 0),
-                    'metadata': match.metadata
-                }
-                results.append(result)
-            
-            return results
+            return self._hydrate(search_response.matches, namespace)
             
         except Exception as e:
             print(f"Error searching by metadata: {e}")
             return []
+
+
+# Backwards compatible name for the Pinecone backend
+VectorStore = PineconeVectorStore
+
+def create_vector_store(backend: str = None) -> BaseVectorStore:
+    """
+    Create the vector store backend selected by VECTOR_BACKEND
+    
+    Args:
+        backend: 'pinecone' (default) or 'local'
+        
+    Returns:
+        Vector store instance
+    """
+    backend = (backend or os.getenv('VECTOR_BACKEND', 'pinecone')).lower()
+    if backend == 'local':
+        from services.local_vector_store import LocalVectorStore
+        return LocalVectorStore()
+    if backend == 'pinecone':
+        return PineconeVectorStore()
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
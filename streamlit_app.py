@@ -6,7 +6,8 @@ Provides user interface for PDF upload, chat, and medical guidance
 import streamlit as st
 import requests
 import os
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Iterator, Tuple
 import time
 
 # Page configuration
@@ -76,6 +77,41 @@ class MedicalChatbotUI:
         except Exception as e:
             return {'error': f'Chat failed: {str(e)}'}
     
+    def stream_chat_message(self, message: str, persona: str, namespace: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Send chat message to backend, yielding its server-sent (event, data) pairs as they arrive"""
+        try:
+            payload = {
+                'query': message,
+                'persona': persona,
+                'namespace': namespace,
+                'stream': True
+            }
+            with requests.post(
+                f"{self.backend_url}/chat",
+                json=payload,
+                stream=True,
+                timeout=(5, 30)
+            ) as response:
+                if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+                    # Validation errors come back as plain JSON
+                    yield 'error', response.json()
+                    return
+                event, data_lines = 'message', []
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if line:
+                        field, _, value = line.partition(':')
+                        if field == 'event':
+                            event = value.strip()
+                        elif field == 'data':
+                            data_lines.append(value.strip())
+                        continue
+                    # A blank line ends an event
+                    if data_lines:
+                        yield event, json.loads('\n'.join(data_lines))
+                    event, data_lines = 'message', []
+        except Exception as e:
+            yield 'error', {'error': f'Chat failed: {str(e)}'}
+    
     def clear_namespace(self, namespace: str) -> Dict[str, Any]:
         """Clear vectors from namespace"""
         try:
@@ -268,20 +304,30 @@ def main():
             with st.chat_message("user"):
                 st.write(user_input)
             
-            # Get AI response
+            # Get AI response, rendering the answer as it streams in
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    response = ui.send_chat_message(
+                response = {}
+                
+                def answer_tokens():
+                    events = ui.stream_chat_message(
                         user_input, 
                         st.session_state.selected_persona,
                         st.session_state.namespace
                     )
+                    for event, data in events:
+                        if event == 'token':
+                            yield data.get('text', '')
+                        else:
+                            # 'done' carries sources and metadata; 'error' the failure
+                            response.update(data)
+                
+                streamed = st.write_stream(answer_tokens())
                 
                 if 'error' in response:
                     st.error(f"❌ {response['error']}")
                     ai_message = f"I apologize, but I encountered an error: {response['error']}"
                 else:
-                    ai_message = response.get('answer', 'I apologize, but I could not generate a response.')
+                    ai_message = response.get('answer') or streamed or 'I apologize, but I could not generate a response.'
                     
                     # Display sources if available
                     if 'sources' in response and response['sources']:
@@ -289,8 +335,6 @@ def main():
                             for source in response['sources']:
                                 st.write(f"**{source['filename']}** (Relevance: {source['relevance_score']:.2f})")
                                 st.write(f"*{source['text_preview']}*")
-                
-                st.write(ai_message)
             
             # Add AI response to history
             st.session_state.chat_history.append({